@@ -1,6 +1,6 @@
 import streamlit as st
 
-from main import evaluate_prompt
+from main import evaluate_turn, new_conversation
 
 st.set_page_config(page_title="Judge Guardrail", page_icon="🧑‍⚖️")
 st.title("🧑‍⚖️ Judge - Prompt Guardrail")
@@ -19,6 +19,8 @@ if "messages" not in st.session_state:
     st.session_state.messages = []
 if "latest_evals" not in st.session_state:
     st.session_state.latest_evals = {k: None for k in policy_names}
+if "conversation" not in st.session_state:
+    st.session_state.conversation = new_conversation()
 
 
 # Sidebar evaluation boxes
@@ -45,7 +47,7 @@ if prompt := st.chat_input("Enter your prompt here..."):
         st.markdown(prompt)
 
     with st.spinner("Thinking..."):      
-        _, results = evaluate_prompt(prompt)
+        _, results = evaluate_turn(st.session_state.conversation, prompt)
         st.session_state.messages.append({"role": "user", "content": prompt})
         st.session_state.latest_evals = results
 
@@ -7,50 +7,109 @@ Demonstrates unified policy evaluation across:
 """
 
 import streamlit as st
-import asyncio
-import os
 from dotenv import load_dotenv
-from google import genai
 
+from core.cache import SingleFlight, VerdictCache
+from core.client_pool import client_from_env
 from core.engine import EvaluationEngine
-from core.policy import Policy
+from core.limiter import is_rate_limit_error, limiter_for
+from core.local_evaluator import SQL_INJECTION_PATTERNS, AllowListEvaluator, CascadeEvaluator, PatternEvaluator
+from core.plan import PlanCache
+from core.registry import PolicyRegistry
+from core.runner import JudgeRunner
 from core.slm_wrapper import SLMWrapper
 
 load_dotenv()
 
-# Initialize client and model
-client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
 MODEL = "gemma-3-12b-it"
 
-# Load all policies
-policies = Policy.config_with_json("policy.json")
 
-# Global event loop for async execution
-_loop = None
+@st.cache_resource
+def get_client():
+    return client_from_env()
+
+
+@st.cache_resource
+def get_verdict_cache():
+    return VerdictCache(maxsize=4096, ttl=600)
+
+
+@st.cache_resource
+def get_single_flight():
+    """Shared by every session, so the same quick-test prompt clicked twice is sent once."""
+    return SingleFlight()
+
+
+@st.cache_resource
+def get_registry():
+    """Loaded once and watched on the runner's loop, instead of re-read on every rerun."""
+    registry = PolicyRegistry("policy.json", cache=get_verdict_cache())
+    get_runner().submit(registry.watch())
+    return registry
+
+
+AGENT_TOOLS = {
+    "customer_service": {
+        "allowed": ["search_orders", "update_ticket", "send_email", "search_knowledge_base", "create_ticket"],
+        "forbidden": ["refund_order", "access_database", "modify_user", "delete_data", "query_database"]
+    },
+    "data_analyst": {
+        "allowed": ["query_database", "generate_report", "export_csv", "create_visualization", "aggregate_data"],
+        "forbidden": ["delete_records", "modify_schema", "grant_access", "update_user", "send_email"]
+    }
+}
+KNOWN_TOOLS = {tool for tools in AGENT_TOOLS.values() for names in tools.values() for tool in names}
+
+# In-process rules that settle obvious cases before the SLM is called
+LOCAL_RULES = {
+    "SafeQuery": lambda: [PatternEvaluator("sql_injection_rules", SQL_INJECTION_PATTERNS)],
+    "IsAllowedTool": lambda: [AllowListEvaluator("tool_allow_list", KNOWN_TOOLS, context_key="allowed_tools")],
+}
+
+
+@st.cache_resource
+def get_slms(names: tuple):
+    """SLM wrappers are cached across reruns so compiled plans can be reused."""
+    limiter = limiter_for(MODEL, max_concurrency=8)
+    slms = {
+        alias: SLMWrapper(name, get_client(), MODEL, cache=get_verdict_cache(), limiter=limiter,
+                          single_flight=get_single_flight())
+        for alias, name in names
+    }
+    for alias, rules in LOCAL_RULES.items():
+        if alias in slms:
+            slms[alias] = CascadeEvaluator(rules(), slms[alias])
+    return slms
+
+
+@st.cache_resource
+def get_engine():
+    return EvaluationEngine(), PlanCache()
 
-def evaluate_with_context(user_input, policy_statement, slm_dict, context=None):
-    """Evaluate user input against policy statement with optional context"""
-    global _loop
 
-    engine = EvaluationEngine()
-    engine.construct_tree_from_statement(policy_statement, policies, slm_dict)
+@st.cache_resource
+def get_runner():
+    """One background event loop for the whole app, shared by every session."""
+    engine, _ = get_engine()
+    return JudgeRunner(engine)
 
-    async def run():
-        return await engine.evaluate(user_input, context=context)
 
-    if _loop is None or _loop.is_closed():
-        _loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(_loop)
+engine, plans = get_engine()
+runner = get_runner()
+registry = get_registry()
+
+def evaluate_with_context(user_input, policy_statement, slm_dict, context=None):
+    """Evaluate user input against policy statement with optional context"""
+    plan = plans.get(policy_statement, registry.policies, slm_dict)
 
     try:
-        result = _loop.run_until_complete(run())
-        return result
+        return runner.evaluate(plan, user_input, context=context).as_tuple()
     except Exception as e:
         # Handle API errors gracefully
         import logging
-        logging.error(f"Evaluation error: {str(e)}")
+        logging.error("Evaluation error: %s", e)
         # Return error result
-        error_msg = "API quota exceeded" if "429" in str(e) or "RESOURCE_EXHAUSTED" in str(e) else "Evaluation error"
+        error_msg = "API quota exceeded" if is_rate_limit_error(e) else "Evaluation error"
         return ("error", {k: "error" for k in slm_dict.keys()})
 
 
@@ -93,13 +152,13 @@ with tab1:
     """)
 
     # Initialize SLMs for safety policies
-    safety_slms = {
-        "NSFW": SLMWrapper("nsfw", client, MODEL),
-        "Jailbreak": SLMWrapper("jailbreak", client, MODEL),
-        "HateSpeech": SLMWrapper("hate", client, MODEL),
-        "MaliciousExploitation": SLMWrapper("exploit", client, MODEL),
-        "OffTopic": SLMWrapper("offtopic", client, MODEL)
-    }
+    safety_slms = get_slms((
+        ("NSFW", "nsfw"),
+        ("Jailbreak", "jailbreak"),
+        ("HateSpeech", "hate"),
+        ("MaliciousExploitation", "exploit"),
+        ("OffTopic", "offtopic")
+    ))
 
     safety_policy_names = ["nsfw", "jailbreak", "hate", "exploit", "offtopic"]
     safety_statement = "(NSFW AND Jailbreak) AND (HateSpeech AND MaliciousExploitation) AND OffTopic"
@@ -181,11 +240,11 @@ with tab2:
     """)
 
     # Initialize SLMs for RBAC policies
-    rbac_slms = {
-        "IsAuthorized": SLMWrapper("authorization", client, MODEL),
-        "SafeQuery": SLMWrapper("sql_injection", client, MODEL),
-        "NoPrivilegeEscalation": SLMWrapper("privilege_escalation", client, MODEL)
-    }
+    rbac_slms = get_slms((
+        ("IsAuthorized", "authorization"),
+        ("SafeQuery", "sql_injection"),
+        ("NoPrivilegeEscalation", "privilege_escalation")
+    ))
 
     rbac_policy_names = ["authorization", "sql_injection", "privilege_escalation"]
     rbac_statement = "(IsAuthorized AND SafeQuery) AND NoPrivilegeEscalation"
@@ -320,10 +379,10 @@ with tab3:
     """)
 
     # Initialize SLMs for tool control policies
-    tool_slms = {
-        "IsAllowedTool": SLMWrapper("tool_authorization", client, MODEL),
-        "NoToolChaining": SLMWrapper("tool_chaining", client, MODEL)
-    }
+    tool_slms = get_slms((
+        ("IsAllowedTool", "tool_authorization"),
+        ("NoToolChaining", "tool_chaining")
+    ))
 
     tool_policy_names = ["tool_authorization", "tool_chaining"]
     tool_statement = "IsAllowedTool AND NoToolChaining"
@@ -348,16 +407,7 @@ with tab3:
         )
         st.session_state.agent_type = agent_type
 
-        agent_tools = {
-            "customer_service": {
-                "allowed": ["search_orders", "update_ticket", "send_email", "search_knowledge_base", "create_ticket"],
-                "forbidden": ["refund_order", "access_database", "modify_user", "delete_data", "query_database"]
-            },
-            "data_analyst": {
-                "allowed": ["query_database", "generate_report", "export_csv", "create_visualization", "aggregate_data"],
-                "forbidden": ["delete_records", "modify_schema", "grant_access", "update_user", "send_email"]
-            }
-        }
+        agent_tools = AGENT_TOOLS
 
         st.markdown(f"""
         **Agent:** `{agent_type}`
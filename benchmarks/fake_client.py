@@ -0,0 +1,181 @@
+"""
+Simulated stand-in for `genai.Client`, for benchmarking without API quota.
+
+Only the surface Judge uses is implemented: `client.aio.models.generate_content`,
+`client.aio.models.generate_content_stream` and `client.aio.caches.create`.
+Verdicts are deterministic per (policy, input), so every engine mode sees the
+same answers. Policies are recognised by a `[[policy:<name>]]` marker in their
+instruction (see `make_policies` in run_bench.py).
+"""
+
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+from typing import Callable, Optional
+
+POLICY_MARKER = re.compile(r"\[\[policy:(\w+)\]\]")
+SINGLE_TEXT = re.compile(r'\*\*Input/Output Text:\*\*\n"(.*?)"\n', re.DOTALL)
+BATCH_TEXT = re.compile(r'\*\*Input/Output Text (\d+):\*\*\n"(.*?)"\n', re.DOTALL)
+
+
+class FakeAPIError(Exception):
+    def __init__(self, code: int, message: str):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+def constant(seconds: float) -> Callable[[], float]:
+    return lambda: seconds
+
+
+def uniform(low: float, high: float) -> Callable[[], float]:
+    return lambda: random.uniform(low, high)
+
+
+def lognormal(median: float, sigma: float = 0.5) -> Callable[[], float]:
+    """Long-tailed latency, the usual shape of hosted model calls."""
+    mu = math.log(median)
+    return lambda: random.lognormvariate(mu, sigma)
+
+
+LATENCIES = {
+    "constant": lambda: constant(0.3),
+    "uniform": lambda: uniform(0.1, 0.5),
+    "lognormal": lambda: lognormal(0.3, 0.6),
+}
+
+
+# rough characters per output token
+CHARS_PER_TOKEN = 4
+# output tokens of a full single-policy answer from `respond`; `latency` draws the time for one of those
+REFERENCE_TOKENS = 25
+# share of that time spent before the first output token, whatever the answer's length
+FIRST_TOKEN_SHARE = 0.3
+
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _CachedContent:
+    def __init__(self, name: str):
+        self.name = name
+
+
+class FakeModels:
+    def __init__(self, client: "FakeClient"):
+        self._client = client
+
+    async def generate_content(self, model: str, contents: list, config: Optional[dict] = None) -> _Response:
+        prompt = "".join(str(part) for part in contents)
+        text = self._client.answer(prompt, config)
+        await self._client._simulate(model, self._client.output_seconds(text))
+        return _Response(text)
+
+    async def generate_content_stream(self, model: str, contents: list, config: Optional[dict] = None):
+        prompt = "".join(str(part) for part in contents)
+        text = self._client.answer(prompt, config)
+        seconds = self._client.output_seconds(text)
+        # the request waits for the first token; the rest arrives chunk by chunk
+        await self._client._simulate(model, seconds * FIRST_TOKEN_SHARE)
+
+        async def chunks():
+            step = max(1, len(text) // 10)
+            count = math.ceil(len(text) / step)
+            for i in range(0, len(text), step):
+                await asyncio.sleep(seconds * (1 - FIRST_TOKEN_SHARE) / count)
+                yield _Response(text[i:i + step])
+        return chunks()
+
+
+class FakeCaches:
+    def __init__(self, client: "FakeClient"):
+        self._client = client
+
+    async def create(self, model: str, config: dict) -> _CachedContent:
+        raise FakeAPIError(400, f"Context caching is not supported for {model}")
+
+
+class _Aio:
+    def __init__(self, client: "FakeClient"):
+        self.models = FakeModels(client)
+        self.caches = FakeCaches(client)
+
+
+class FakeClient:
+    """
+    `latency` draws the simulated seconds of a call that returns a typical
+    full single-policy answer. Part of it is fixed time to first token and
+    the rest scales with the length of the answer actually produced, so
+    short verdict-only answers finish sooner and long multi-policy or batch
+    answers later; `max_output_tokens` in the config cuts the answer short.
+    `error_rate` and `rate_limit_rate` are the chances a call fails with a
+    500 or a 429.
+    `violation_rate` is the share of (policy, input) pairs answered as
+    violations.
+    """
+    def __init__(self, latency: Optional[Callable[[], float]] = None, error_rate: float = 0.0,
+                 rate_limit_rate: float = 0.0, violation_rate: float = 0.2, seed: Optional[int] = None):
+        self.latency = latency or lognormal(0.3, 0.6)
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.violation_rate = violation_rate
+        self.calls = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.aio = _Aio(self)
+        if seed is not None:
+            random.seed(seed)
+
+    def answer(self, prompt: str, config: Optional[dict] = None) -> str:
+        text = self.respond(prompt)
+        limit = (config or {}).get("max_output_tokens")
+        return text[:limit * CHARS_PER_TOKEN] if limit else text
+
+    def output_seconds(self, text: str) -> float:
+        tokens = len(text) / CHARS_PER_TOKEN
+        return self.latency() * (FIRST_TOKEN_SHARE + (1 - FIRST_TOKEN_SHARE) * tokens / REFERENCE_TOKENS)
+
+    async def _simulate(self, model: str, seconds: float):
+        self.calls += 1
+        await asyncio.sleep(seconds)
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            self.rate_limited += 1
+            raise FakeAPIError(429, "RESOURCE_EXHAUSTED")
+        if roll < self.rate_limit_rate + self.error_rate:
+            self.errors += 1
+            raise FakeAPIError(500, "INTERNAL")
+
+    def is_violation(self, policy: str, text: str) -> bool:
+        digest = hashlib.sha256(f"{policy}\0{text}".encode("utf8")).digest()
+        return digest[0] / 256 < self.violation_rate
+
+    def _entry(self, policy_name: str, text: str, **extra) -> dict:
+        violation = self.is_violation(policy_name, text)
+        return {
+            **extra,
+            "compliant": "false" if violation else "true",
+            "violation_reason": f"{policy_name} flagged the text" if violation else None,
+            "highlighted_text": text[:20] if violation else None,
+        }
+
+    def respond(self, prompt: str) -> str:
+        policies = POLICY_MARKER.findall(prompt)
+        batch = BATCH_TEXT.findall(prompt)
+        if batch:
+            payload = [self._entry(policies[0], text, index=int(index)) for index, text in batch]
+        else:
+            match = SINGLE_TEXT.search(prompt)
+            text = match.group(1) if match else ""
+            if len(policies) > 1:
+                payload = [self._entry(policy, text, policy=policy) for policy in policies]
+            elif "no reasoning and no markdown" in prompt:
+                return json.dumps({"compliant": self._entry(policies[0], text)["compliant"]})
+            else:
+                payload = self._entry(policies[0] if policies else "", text)
+        return "```json\n" + json.dumps(payload, indent=2) + "\n```"
@@ -0,0 +1,81 @@
+"""
+Bulk evaluation of a JSONL corpus.
+
+    python bulk.py redteam.jsonl
+    python bulk.py redteam.jsonl --statement rbac --concurrency 64 --order input -o rbac.verdicts.jsonl
+    python bulk.py redteam.jsonl --statements safety rbac tools
+
+Every input line is a JSON object with an "input" string and optionally a
+"context" object and an "id". Each result row carries the input's line
+number and id, its verdicts, or an "error"; the first line records the
+statement and policy versions. Rerunning the same command after a crash or
+Ctrl-C skips the rows already in the output. If the statement or a policy
+has changed since, the run is refused; `--fresh` starts over.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+
+from core.bulk import evaluate_file
+from server import DEFAULT_STATEMENT, build_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate a JSONL file of inputs with Judge")
+    parser.add_argument("input", help="JSONL file of {\"input\": ..., \"context\": {...}, \"id\": ...} rows")
+    parser.add_argument("-o", "--output", help="results file (default: <input>.verdicts.jsonl)")
+    parser.add_argument("--statement", default=DEFAULT_STATEMENT, help="named statement or an expression")
+    parser.add_argument("--statements", nargs="+", help="several statements, evaluated together with a verdict each")
+    parser.add_argument("--concurrency", type=int, default=16, help="rows evaluated at once")
+    parser.add_argument("--order", choices=("completion", "input"), default="completion",
+                        help="write results as they finish or in input order")
+    parser.add_argument("--timeout", type=float, help="seconds allowed per row")
+    parser.add_argument("--checkpoint-every", type=int, default=100, help="rows between fsyncs of the output")
+    parser.add_argument("--retry-errors", action="store_true", help="on resume, evaluate rows that failed again")
+    parser.add_argument("--fresh", action="store_true", help="discard existing results instead of resuming")
+    parser.add_argument("--explain", action="store_true", help="fetch the reasoning for violations")
+    parser.add_argument("--input-field", default="input")
+    parser.add_argument("--context-field", default="context")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log every leaf, not just progress")
+    args = parser.parse_args()
+
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+    output = args.output or os.path.splitext(args.input)[0] + ".verdicts.jsonl"
+    if args.fresh and os.path.exists(output):
+        os.remove(output)
+
+    service = build_service()
+    try:
+        if args.statements:
+            statements = {name: service.statements.get(name, name) for name in args.statements}
+            plan = service.plans.get_many(statements, service.policies, service.slms)
+        else:
+            statement = service.statements.get(args.statement, args.statement)
+            plan = service.plans.get(statement, service.policies, service.slms)
+    except ValueError as e:
+        parser.error(f"invalid statement: {e}")
+
+    if not args.verbose:
+        # per-leaf logs drown the progress lines on large corpora
+        logging.getLogger("myapp").setLevel(logging.WARNING)
+        logging.getLogger("myapp.bulk").setLevel(logging.INFO)
+    try:
+        summary = asyncio.run(evaluate_file(
+            service.engine, plan, args.input, output,
+            concurrency=args.concurrency, ordered=args.order == "input", retry_errors=args.retry_errors,
+            checkpoint_every=args.checkpoint_every,
+            input_field=args.input_field, context_field=args.context_field, id_field=args.id_field,
+            timeout=args.timeout, explain=args.explain,
+        ))
+    except ValueError as e:
+        parser.exit(1, f"{e} (pass --fresh to discard it)\n")
+    print(json.dumps({"output": output, **summary}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
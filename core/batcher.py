@@ -0,0 +1,144 @@
+import asyncio
+import json
+import logging
+
+from core.cache import context_fingerprint
+from core.policy import Policy, render_context
+from core.prompt import BATCH_INPUTS_ENTRY, BATCH_INPUTS_PROMPT
+from core.slm_wrapper import SLMWrapper, strip_json, to_verdict
+
+logger = logging.getLogger("myapp")
+
+
+class MicroBatcher:
+    """
+    Collects concurrent calls for the same policy and scores them in one SLM
+    request.
+
+    Calls are held for at most `window` seconds or until `max_batch` distinct
+    inputs are waiting, whichever comes first. Inputs are grouped by policy
+    and context; identical inputs within a window share one slot. Inputs the
+    batched response doesn't cover are retried through the wrapped
+    `SLMWrapper` one by one.
+
+    Drop-in replacement for the wrapped evaluator in an `slm_map`.
+    """
+    def __init__(self, slm: SLMWrapper, window: float = 0.01, max_batch: int = 8):
+        self.slm = slm
+        self.name = slm.name
+        self.model = slm.model
+        self.window = window
+        self.max_batch = max_batch
+        self._batches: dict[tuple, dict[str, list[asyncio.Future]]] = {}
+        self._timers: dict[tuple, asyncio.TimerHandle] = {}
+        self._inflight: set[asyncio.Task] = set()
+
+    async def evaluate_policy(self, policy: Policy, user_input: str, context: dict = None) -> tuple[str, str]:
+        cache = self.slm.cache
+        if cache is not None:
+            cached = cache.get(cache.make_key(self.model, policy, user_input, context))
+            if cached is not None:
+                return policy.name, cached
+
+        loop = asyncio.get_running_loop()
+        key = (policy.name, policy.instruction_hash, context_fingerprint(context))
+        future = loop.create_future()
+
+        batch = self._batches.setdefault(key, {})
+        batch.setdefault(user_input, []).append(future)
+        if len(batch) >= self.max_batch:
+            self._flush(key, policy, context)
+        elif key not in self._timers:
+            self._timers[key] = loop.call_later(self.window, self._flush, key, policy, context)
+
+        return policy.name, await future
+
+    def _flush(self, key: tuple, policy: Policy, context: dict):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._batches.pop(key, None)
+        if not batch:
+            return
+
+        # waiters may have been cancelled while the window was open
+        batch = {text: futures for text, futures in batch.items() if not all(f.done() for f in futures)}
+        if not batch:
+            return
+
+        task = asyncio.ensure_future(self._send(policy, context, batch))
+        self._inflight.add(task)
+        task.add_done_callback(self._inflight.discard)
+
+    async def _send(self, policy: Policy, context: dict, batch: dict[str, list[asyncio.Future]]):
+        texts = list(batch)
+        try:
+            if len(texts) == 1:
+                verdicts = {0: (await self.slm.evaluate_policy(policy, texts[0], context=context))[1]}
+            else:
+                logger.info("%s --> batching %d inputs in one request", self.name, len(texts))
+                verdicts = await self._evaluate_batch(policy, texts, context)
+
+            missing = [i for i in range(len(texts)) if i not in verdicts]
+            if missing:
+                logger.warning("%s --> batch response missed %d inputs, falling back to single calls", self.name, len(missing))
+                fallback = await asyncio.gather(*(
+                    self.slm.evaluate_policy(policy, texts[i], context=context) for i in missing
+                ))
+                verdicts.update({i: verdict for i, (_, verdict) in zip(missing, fallback)})
+        except Exception as e:
+            for futures in batch.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+
+        for i, text in enumerate(texts):
+            for future in batch[text]:
+                if not future.done():
+                    future.set_result(verdicts[i])
+
+    async def _evaluate_batch(self, policy: Policy, texts: list[str], context: dict) -> dict[int, str]:
+        entries = "\n".join(
+            BATCH_INPUTS_ENTRY.format(index=i, text_to_check=text) for i, text in enumerate(texts)
+        )
+        prompt = BATCH_INPUTS_PROMPT.format(
+            policy_instruction=policy.instruction,
+            texts_to_check=entries
+        ) + render_context(context)
+
+        response = await self.slm.request([prompt])
+        verdicts = self._parse_batch_response(response.text, len(texts))
+
+        cache = self.slm.cache
+        if cache is not None:
+            for i, verdict in verdicts.items():
+                cache.set(cache.make_key(self.model, policy, texts[i], context), verdict)
+        return verdicts
+
+    def _parse_batch_response(self, response: str, size: int) -> dict[int, str]:
+        try:
+            items = json.loads(strip_json(response, "[", "]"))
+        except (json.JSONDecodeError, AttributeError, TypeError):
+            return {}
+        if not isinstance(items, list):
+            return {}
+
+        verdicts = {}
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            try:
+                index = int(item.get("index"))
+            except (TypeError, ValueError):
+                continue
+            verdict = to_verdict(item.get("compliant"))
+            if 0 <= index < size and verdict != "unknown":
+                verdicts[index] = verdict
+        return verdicts
+
+    async def explain(self, policy: Policy, user_input: str, context: dict = None) -> dict:
+        return await self.slm.explain(policy, user_input, context=context)
+
+    async def __call__(self, policy: Policy, user_input: str, context: dict = None) -> tuple[str, str]:
+        return await self.evaluate_policy(policy, user_input, context=context)
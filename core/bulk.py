@@ -0,0 +1,240 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter, deque
+from typing import Iterator, Optional
+
+from core.engine import EvaluationEngine
+from core.plan import EvaluationPlan
+
+# a child logger, so progress still shows when per-leaf logging is turned down
+logger = logging.getLogger("myapp.bulk")
+
+
+def run_header(plan: EvaluationPlan) -> dict:
+    """
+    What a results file was produced with: the statement, and the
+    instruction hash and model of every policy it calls. Rows evaluated
+    under a different header are not comparable, so resuming across one is
+    refused.
+    """
+    return {
+        "statement": plan.statement,
+        "policies": {
+            leaf.policy.name: {"instruction": leaf.policy.instruction_hash, "model": getattr(leaf.value, "model", None)}
+            for leaf in sorted(plan.leaves, key=lambda leaf: leaf.policy.name)
+        },
+    }
+
+
+def finished_rows(path: str, retry_errors: bool = False, header: Optional[dict] = None) -> set[int]:
+    """
+    Input line numbers already written to the output at `path`. A torn last
+    row left by a crash is cut off; with `retry_errors`, rows that failed
+    are dropped from the file so they are evaluated again.
+
+    With `header`, raises `ValueError` unless the file starts with that
+    same header (see `run_header`), so results from another statement or an
+    edited policy are never mixed into one file.
+    """
+    if not os.path.exists(path):
+        return set()
+    done = set()
+    kept = []
+    found = None
+    rewrite = False
+    with open(path, "rb") as file:
+        for raw in file:
+            try:
+                row = json.loads(raw) if raw.endswith(b"\n") else None
+            except json.JSONDecodeError:
+                row = None
+            if not kept and isinstance(row, dict) and isinstance(row.get("run"), dict):
+                found = row["run"]
+                kept.append(raw)
+                continue
+            if not isinstance(row, dict) or not isinstance(row.get("line"), int):
+                logger.warning("Dropping unreadable row from %s: %r", path, raw[:80])
+                rewrite = True
+                continue
+            if retry_errors and "error" in row:
+                rewrite = True
+                continue
+            done.add(row["line"])
+            kept.append(raw)
+    if header is not None and kept and found != header:
+        raise ValueError(f"{path} holds results for a different statement or policy version; "
+                         "start over with a fresh output file")
+    if rewrite:
+        with open(path + ".tmp", "wb") as file:
+            file.writelines(kept)
+        os.replace(path + ".tmp", path)
+    return done
+
+
+def read_rows(path: str, skip: set[int]) -> Iterator[tuple[int, Optional[dict], Optional[str]]]:
+    """
+    Yields `(line, row, error)` for every non-blank input line not in
+    `skip`, lazily, so the input is never held in memory.
+    """
+    with open(path, encoding="utf8") as file:
+        for line, text in enumerate(file, start=1):
+            if line in skip or not text.strip():
+                continue
+            try:
+                row = json.loads(text)
+            except json.JSONDecodeError as e:
+                yield line, None, f"invalid JSON: {e}"
+                continue
+            if not isinstance(row, dict):
+                yield line, None, "expected a JSON object"
+                continue
+            yield line, row, None
+
+
+class ResultWriter:
+    """
+    Appends result rows to a JSONL file, flushing and fsyncing every
+    `checkpoint_every` rows so a crash loses at most that many. A `header`
+    is written first when the file is new or empty.
+
+    With `ordered`, rows are written in input order: a row that finishes
+    early waits in `pending` until every row submitted before it is written.
+    """
+    def __init__(self, path: str, ordered: bool = False, checkpoint_every: int = 100,
+                 header: Optional[dict] = None):
+        self.ordered = ordered
+        self.checkpoint_every = checkpoint_every
+        self.written = 0
+        self.pending: dict[int, dict] = {}
+        self._submitted: deque[int] = deque()
+        self._unsynced = 0
+        self._file = open(path, "a", encoding="utf8")
+        if header is not None and self._file.tell() == 0:
+            self._file.write(json.dumps({"run": header}, ensure_ascii=False) + "\n")
+
+    @property
+    def backlog(self) -> int:
+        return len(self.pending)
+
+    def expect(self, line: int):
+        if self.ordered:
+            self._submitted.append(line)
+
+    def add(self, row: dict):
+        if not self.ordered:
+            self._write(row)
+            return
+        self.pending[row["line"]] = row
+        while self._submitted and self._submitted[0] in self.pending:
+            self._write(self.pending.pop(self._submitted.popleft()))
+
+    def _write(self, row: dict):
+        self._file.write(json.dumps(row, ensure_ascii=False) + "\n")
+        self.written += 1
+        self._unsynced += 1
+        if self._unsynced >= self.checkpoint_every:
+            self.checkpoint()
+
+    def checkpoint(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def close(self):
+        self.checkpoint()
+        self._file.close()
+
+
+async def evaluate_row(engine: EvaluationEngine, plan: EvaluationPlan, line: int, row: dict,
+                       input_field: str = "input", context_field: str = "context", id_field: str = "id",
+                       timeout: Optional[float] = None, explain: bool = False) -> dict:
+    result_row = {"line": line}
+    if id_field in row:
+        result_row["id"] = row[id_field]
+    user_input = row.get(input_field)
+    context = row.get(context_field)
+    if not isinstance(user_input, str):
+        return {**result_row, "error": f"'{input_field}' must be a string"}
+    if context is not None and not isinstance(context, dict):
+        return {**result_row, "error": f"'{context_field}' must be an object"}
+    try:
+        result = await asyncio.wait_for(engine.run(plan, user_input, context=context, explain=explain), timeout)
+    except asyncio.TimeoutError:
+        return {**result_row, "error": "timed out"}
+    except Exception as e:
+        return {**result_row, "error": f"{type(e).__name__}: {e}"}
+    return {**result_row, **result.as_dict()}
+
+
+async def evaluate_file(engine: EvaluationEngine, plan: EvaluationPlan, input_path: str, output_path: str,
+                        concurrency: int = 16, ordered: bool = False, retry_errors: bool = False,
+                        checkpoint_every: int = 100, progress_every: float = 10.0, **row_options) -> dict:
+    """
+    Streams a JSONL file of `{"input": ..., "context": {...}, "id": ...}`
+    rows through `plan`, at most `concurrency` at a time, and appends one
+    result row per input line to `output_path`, tagged with its line
+    number. Lines already in the output are skipped, so rerunning after a
+    crash picks up where the last checkpoint left off; an output written for
+    another statement or policy version raises `ValueError` instead.
+    `row_options` go to `evaluate_row`.
+    """
+    header = run_header(plan)
+    done = finished_rows(output_path, retry_errors=retry_errors, header=header)
+    if done:
+        logger.info("Resuming: %d rows of %s already evaluated", len(done), input_path)
+    rows = read_rows(input_path, done)
+    writer = ResultWriter(output_path, ordered=ordered, checkpoint_every=checkpoint_every, header=header)
+    verdicts = Counter()
+    tasks: dict[asyncio.Task, int] = {}
+    exhausted = False
+    started = last_report = time.perf_counter()
+
+    def record(row: dict):
+        verdicts[row.get("verdict", "error")] += 1
+        writer.add(row)
+
+    try:
+        while True:
+            # rows held back for ordering count against the window too
+            while not exhausted and len(tasks) < concurrency and writer.backlog < 4 * concurrency:
+                entry = next(rows, None)
+                if entry is None:
+                    exhausted = True
+                    break
+                line, row, error = entry
+                writer.expect(line)
+                if error is not None:
+                    record({"line": line, "error": error})
+                    continue
+                tasks[asyncio.ensure_future(evaluate_row(engine, plan, line, row, **row_options))] = line
+            if not tasks:
+                break
+
+            finished, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                del tasks[task]
+                record(task.result())
+
+            now = time.perf_counter()
+            if now - last_report >= progress_every:
+                last_report = now
+                total = sum(verdicts.values())
+                logger.info("%d rows evaluated (%.1f rows/s), %d running", total, total / (now - started), len(tasks))
+    finally:
+        for task in tasks:
+            task.cancel()
+        rows.close()
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    total = sum(verdicts.values())
+    return {
+        "evaluated": total,
+        "resumed": len(done),
+        "verdicts": dict(verdicts),
+        "seconds": elapsed,
+        "rows_per_second": total / elapsed if elapsed else None,
+    }
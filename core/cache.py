@@ -0,0 +1,146 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional, TypeVar
+
+from core.policy import Policy
+
+T = TypeVar("T")
+
+
+def normalize_input(user_input: str) -> str:
+    return " ".join(str(user_input).split())
+
+
+def context_fingerprint(context: Optional[dict]) -> str:
+    if not context:
+        return ""
+    return json.dumps(context, sort_keys=True, default=str)
+
+
+class VerdictCache:
+    """
+    Thread-safe LRU cache of leaf verdicts with a per-entry TTL.
+
+    Keys combine the model, the policy name, a hash of the policy
+    instruction, the whitespace-normalized input and the context, so editing
+    an instruction in `policy.json` can never serve a stale verdict: the old
+    entries simply stop matching and age out. `invalidate` drops them eagerly.
+
+    Subclass and override `get`/`set`/`invalidate` to back the cache with an
+    external store.
+    """
+    def __init__(self, maxsize: int = 4096, ttl: Optional[float] = 600.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: OrderedDict[tuple, tuple[str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model: str, policy: Policy, user_input: str, context: Optional[dict] = None) -> tuple:
+        return (model, policy.name, policy.instruction_hash, normalize_input(user_input), context_fingerprint(context))
+
+    def get(self, key: tuple) -> Optional[str]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            verdict, expires_at = entry
+            if expires_at < now:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return verdict
+
+    def set(self, key: tuple, verdict: str):
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else float("inf")
+        with self._lock:
+            self._entries[key] = (verdict, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, policy_name: Optional[str] = None, keep_hash: Optional[str] = None) -> int:
+        """
+        Drops cached verdicts for `policy_name` (every policy if None),
+        keeping those computed against `keep_hash`. Returns the number of
+        entries removed.
+        """
+        with self._lock:
+            stale = [
+                key for key in self._entries
+                if (policy_name is None or key[1] == policy_name) and key[2] != keep_hash
+            ]
+            for key in stale:
+                del self._entries[key]
+        return len(stale)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SingleFlight:
+    """
+    Lets concurrent callers with the same key share one in-flight call
+    instead of each making their own; keys are `VerdictCache.make_key`
+    tuples, so this covers the window before the first answer is cached.
+
+    A caller that is cancelled just stops waiting; the shared call is only
+    cancelled once every caller waiting on it has gone.
+    """
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._flights: dict[tuple, list] = {}
+
+    async def run(self, key: tuple, call: Callable[[], Awaitable[T]]) -> T:
+        # futures belong to one loop, so so do flights
+        flight_key = (id(asyncio.get_running_loop()), key)
+        flight = self._flights.get(flight_key)
+        if flight is None:
+            task = asyncio.ensure_future(call())
+            flight = self._flights[flight_key] = [task, 0]
+            task.add_done_callback(lambda _: self._forget(flight_key, flight))
+            self.calls += 1
+        else:
+            self.coalesced += 1
+
+        task = flight[0]
+        flight[1] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            flight[1] -= 1
+            if not flight[1] and not task.done():
+                self._forget(flight_key, flight)
+                task.cancel()
+
+    def _forget(self, flight_key: tuple, flight: list):
+        if self._flights.get(flight_key) is flight:
+            del self._flights[flight_key]
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "coalesced": self.coalesced, "in_flight": len(self._flights)}
+
+    def __len__(self) -> int:
+        return len(self._flights)
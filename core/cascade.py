@@ -0,0 +1,92 @@
+import logging
+from typing import Callable, Iterable, Optional
+
+from core.policy import Policy
+from core.tracing import current_span
+
+logger = logging.getLogger("myapp")
+
+
+class ModelCascade:
+    """
+    Tries `tiers` (evaluators ordered from cheapest to strongest, usually
+    `SLMWrapper`s on different models) in turn and settles the leaf with the
+    first verdict that does not need escalating.
+
+    A verdict is escalated when it is in `rules[policy.name]` (default
+    `escalate_on`, i.e. "unknown", which also covers unparseable answers), or
+    when `uncertain(policy, user_input, verdict)` says so. A tier that fails
+    is escalated past as well; only the last tier's answer or error is final.
+    `settled` counts, per policy, how often each tier had the final word.
+    """
+    def __init__(self, tiers: list, escalate_on: Iterable[str] = ("unknown",),
+                 rules: Optional[dict[str, Iterable[str]]] = None,
+                 uncertain: Optional[Callable[[Policy, str, str], bool]] = None, name: Optional[str] = None):
+        if not tiers:
+            raise ValueError("ModelCascade needs at least one tier")
+        self.tiers = tiers
+        self.escalate_on = frozenset(escalate_on)
+        self.rules = {policy: frozenset(verdicts) for policy, verdicts in (rules or {}).items()}
+        self.uncertain = uncertain
+        self.name = name or tiers[0].name
+        self.settled: dict[str, dict[str, int]] = {}
+        self.escalations = 0
+
+    @staticmethod
+    def _tier_name(tier) -> str:
+        return getattr(tier, "model", None) or tier.name
+
+    def needs_escalation(self, policy: Policy, user_input: str, verdict: str) -> bool:
+        if verdict in self.rules.get(policy.name, self.escalate_on):
+            return True
+        return self.uncertain is not None and self.uncertain(policy, user_input, verdict)
+
+    def _settle(self, policy: Policy, tier):
+        tier_name = self._tier_name(tier)
+        counts = self.settled.setdefault(policy.name, {})
+        counts[tier_name] = counts.get(tier_name, 0) + 1
+        span = current_span()
+        if span is not None:
+            # label the leaf with the model that decided it, not the first one tried
+            span.model = getattr(tier, "model", span.model)
+
+    async def evaluate_policy(self, policy: Policy, user_input: str, context: dict = None) -> tuple[str, str]:
+        last = len(self.tiers) - 1
+        for i, tier in enumerate(self.tiers):
+            if i == last:
+                policy_name, verdict = await tier(policy, user_input, context=context)
+                self._settle(policy, tier)
+                return policy_name, verdict
+            try:
+                policy_name, verdict = await tier(policy, user_input, context=context)
+            except Exception as e:
+                logger.info("%s --> %s failed, escalating: %s", self.name, self._tier_name(tier), e)
+            else:
+                if not self.needs_escalation(policy, user_input, verdict):
+                    self._settle(policy, tier)
+                    return policy_name, verdict
+                logger.info("%s --> %s answered %s, escalating", self.name, self._tier_name(tier), verdict)
+            self.escalations += 1
+
+    async def explain(self, policy: Policy, user_input: str, context: dict = None) -> dict:
+        # the strongest tier gives the most reliable reasoning
+        for tier in reversed(self.tiers):
+            if hasattr(tier, "explain"):
+                return await tier.explain(policy, user_input, context=context)
+        return {}
+
+    def stats(self) -> dict:
+        """
+        Per policy: evaluations, and the share of them each tier settled.
+        """
+        stats = {}
+        for policy, counts in self.settled.items():
+            total = sum(counts.values())
+            stats[policy] = {
+                "evaluations": total,
+                "settled_by": {tier: {"count": count, "share": count / total} for tier, count in counts.items()},
+            }
+        return stats
+
+    async def __call__(self, policy: Policy, user_input: str, context: dict = None) -> tuple[str, str]:
+        return await self.evaluate_policy(policy, user_input, context=context)
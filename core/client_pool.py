@@ -0,0 +1,195 @@
+import logging
+import os
+import random
+import time
+from typing import Optional
+
+from google import genai
+
+from core.limiter import is_rate_limit_error
+
+logger = logging.getLogger("myapp")
+
+STRATEGIES = ("least_outstanding", "weighted")
+
+
+class PoolMember:
+    def __init__(self, name: str, client, weight: float = 1.0):
+        self.name = name
+        self.client = client
+        self.weight = weight
+        self.outstanding = 0
+        self.calls = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.strikes = 0
+        self.cooling_until = 0.0
+
+    def stats(self, now: float) -> dict:
+        return {
+            "name": self.name,
+            "weight": self.weight,
+            "outstanding": self.outstanding,
+            "calls": self.calls,
+            "rate_limited": self.rate_limited,
+            "errors": self.errors,
+            "cooling_for": max(0.0, self.cooling_until - now),
+        }
+
+
+class ClientPool:
+    """
+    Spreads SDK calls over several clients (API keys or endpoints), each
+    created once and reused so its connections stay warm.
+
+    It exposes the part of `genai.Client` Judge uses (`aio.models` and
+    `aio.caches`), so it can be passed to `SLMWrapper` in place of a client.
+    Each call goes to the member with the fewest outstanding requests per
+    unit of weight, or to a weighted random pick. A member that answers
+    429 is taken out of rotation for `cooldown` seconds, doubling up to
+    `max_cooldown` while it keeps failing, and the call moves on to the next
+    member. The 429 is raised to the caller's limiter only once every member
+    is cooling down. Calls that use cached content stay on the member that
+    created it, since caches are scoped to one key.
+    """
+    def __init__(self, clients: list, strategy: str = "least_outstanding", cooldown: float = 30.0,
+                 max_cooldown: float = 300.0):
+        """
+        `clients` holds clients or `(name, client, weight)` tuples.
+        """
+        if not clients:
+            raise ValueError("ClientPool needs at least one client")
+        if strategy not in STRATEGIES:
+            raise ValueError(f"strategy must be one of {', '.join(STRATEGIES)}")
+        self.members = [
+            PoolMember(*entry) if isinstance(entry, tuple) else PoolMember(f"client-{i}", entry)
+            for i, entry in enumerate(clients)
+        ]
+        self.strategy = strategy
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self._cache_owners: dict[str, PoolMember] = {}
+        self.aio = _PoolAio(self)
+
+    @classmethod
+    def from_keys(cls, api_keys: list[str], **kwargs) -> "ClientPool":
+        return cls([(f"key-...{key[-4:]}", genai.Client(api_key=key), 1.0) for key in api_keys], **kwargs)
+
+    def pick(self, exclude: tuple = ()) -> Optional[PoolMember]:
+        now = time.monotonic()
+        available = [m for m in self.members if m not in exclude and m.cooling_until <= now]
+        if not available:
+            return None
+        if self.strategy == "weighted":
+            return random.choices(available, weights=[m.weight for m in available])[0]
+        return min(available, key=lambda m: (m.outstanding / m.weight, m.calls / m.weight))
+
+    def _cool(self, member: PoolMember):
+        member.rate_limited += 1
+        member.strikes += 1
+        seconds = min(self.max_cooldown, self.cooldown * 2 ** (member.strikes - 1))
+        member.cooling_until = time.monotonic() + seconds
+        logger.warning("Client %s rate limited, out of rotation for %.1fs", member.name, seconds)
+
+    async def call(self, path: tuple[str, ...], *args, pinned: Optional[PoolMember] = None, **kwargs):
+        """
+        Calls `client.<path>(*args, **kwargs)` on a member, moving on to the
+        next one on a 429. Returns `(member, result)`.
+        """
+        tried = []
+        last_error = None
+        while True:
+            member = pinned or self.pick(exclude=tuple(tried))
+            if member is None:
+                if last_error is not None:
+                    raise last_error
+                # every member is cooling down; use whichever is back first
+                member = min(self.members, key=lambda m: m.cooling_until)
+            fn = member.client
+            for attribute in path:
+                fn = getattr(fn, attribute)
+            member.outstanding += 1
+            member.calls += 1
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    member.errors += 1
+                    raise
+                self._cool(member)
+                if pinned is not None:
+                    raise
+                tried.append(member)
+                last_error = e
+                continue
+            finally:
+                member.outstanding -= 1
+            member.strikes = 0
+            return member, result
+
+    def stats(self) -> list[dict]:
+        now = time.monotonic()
+        return [member.stats(now) for member in self.members]
+
+
+class _PoolModels:
+    def __init__(self, pool: ClientPool):
+        self._pool = pool
+
+    def _owner(self, config: Optional[dict]) -> Optional[PoolMember]:
+        name = (config or {}).get("cached_content")
+        return self._pool._cache_owners.get(name) if name else None
+
+    async def generate_content(self, model: str, contents: list, config: Optional[dict] = None, **kwargs):
+        if config is not None:
+            kwargs["config"] = config
+        _, response = await self._pool.call(
+            ("aio", "models", "generate_content"), model=model, contents=contents,
+            pinned=self._owner(config), **kwargs,
+        )
+        return response
+
+    async def generate_content_stream(self, model: str, contents: list, config: Optional[dict] = None, **kwargs):
+        if config is not None:
+            kwargs["config"] = config
+        member, stream = await self._pool.call(
+            ("aio", "models", "generate_content_stream"), model=model, contents=contents,
+            pinned=self._owner(config), **kwargs,
+        )
+        # a stream stays outstanding on its member until it is consumed
+        member.outstanding += 1
+
+        async def chunks():
+            try:
+                async for chunk in stream:
+                    yield chunk
+            finally:
+                member.outstanding -= 1
+        return chunks()
+
+
+class _PoolCaches:
+    def __init__(self, pool: ClientPool):
+        self._pool = pool
+
+    async def create(self, model: str, config: dict, **kwargs):
+        member, cached = await self._pool.call(("aio", "caches", "create"), model=model, config=config, **kwargs)
+        self._pool._cache_owners[cached.name] = member
+        return cached
+
+
+class _PoolAio:
+    def __init__(self, pool: ClientPool):
+        self.models = _PoolModels(pool)
+        self.caches = _PoolCaches(pool)
+
+
+def client_from_env():
+    """
+    A `ClientPool` over the comma-separated keys in `GOOGLE_API_KEYS`, or a
+    plain client for `GOOGLE_API_KEY` when only one key is configured.
+    """
+    keys = [key.strip() for key in os.getenv("GOOGLE_API_KEYS", "").split(",") if key.strip()]
+    if len(keys) > 1:
+        return ClientPool.from_keys(keys)
+    return genai.Client(api_key=keys[0] if keys else os.getenv("GOOGLE_API_KEY"))
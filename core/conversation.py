@@ -0,0 +1,120 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+
+from core.engine import EvaluationEngine
+from core.plan import EvaluationPlan, EvaluationResult
+
+logger = logging.getLogger("myapp")
+
+
+@dataclass
+class Turn:
+    role: str
+    text: str
+    verdict: Optional[str] = None
+    results: dict[str, str] = field(default_factory=dict)
+
+
+def excerpt(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+async def flagged_summary(summary: str, index: int, turn: Turn, limit: int) -> str:
+    """
+    Default rolling summary: one line per turn that left the window with a
+    violation, keeping only the newest lines that fit in `limit` characters.
+    """
+    if turn.verdict != "violation":
+        return summary
+    violated = ", ".join(name for name, verdict in turn.results.items() if verdict == "violation")
+    line = f"turn {index + 1} ({turn.role}) violated {violated or 'the policy'}: {excerpt(turn.text, 120)}"
+    lines = (summary.splitlines() if summary else []) + [line]
+    while len(lines) > 1 and len("\n".join(lines)) > limit:
+        lines.pop(0)
+    return "\n".join(lines)[-limit:]
+
+
+class ConversationSession:
+    """
+    Evaluates a multi-turn conversation one turn at a time.
+
+    Only the new turn is sent as the text to check. The last `window` turns
+    (each cut to `turn_chars`) and a rolling summary of older turns (at most
+    `summary_chars`) are passed as context, so the prompt, and with it the
+    per-turn cost, stays bounded however long the conversation gets.
+
+    `summarizer(summary, index, turn, limit)` folds a turn leaving the
+    window into the summary; the default keeps a line per violating turn.
+    Swap in an SLM-backed one for free-form summaries.
+    """
+    def __init__(self, engine: EvaluationEngine, plan: EvaluationPlan, window: int = 4, turn_chars: int = 300,
+                 summary_chars: int = 1000, context: Optional[dict] = None,
+                 summarizer: Optional[Callable[[str, int, Turn, int], Awaitable[str]]] = None):
+        self.engine = engine
+        self.plan = plan
+        self.window = window
+        self.turn_chars = turn_chars
+        self.summary_chars = summary_chars
+        self.context = context or {}
+        self.summarizer = summarizer or flagged_summary
+        self.turns: list[Turn] = []
+        self.summary = ""
+        self._summarized = 0
+        self._lock = asyncio.Lock()
+
+    def history_context(self) -> dict:
+        recent = self.turns[-self.window:] if self.window else []
+        context = {}
+        if self.summary:
+            context["conversation_summary"] = self.summary
+        if recent:
+            context["previous_turns"] = "".join(
+                f"\n  [{turn.role}] {excerpt(turn.text, self.turn_chars)}" for turn in recent
+            )
+        return context
+
+    async def _roll_summary(self):
+        while self._summarized < len(self.turns) - self.window:
+            index = self._summarized
+            try:
+                self.summary = await self.summarizer(self.summary, index, self.turns[index], self.summary_chars)
+            except Exception as e:
+                logger.warning("Could not summarize turn %d: %s", index + 1, e)
+            self._summarized += 1
+
+    async def add_turn(self, text: str, role: str = "user", context: Optional[dict] = None,
+                       explain: bool = False, plan: Optional[EvaluationPlan] = None) -> EvaluationResult:
+        """
+        Evaluates `text` as the next turn, with the recent window and the
+        summary as context, and appends it to the conversation. `plan`
+        replaces the session's plan from this turn on (e.g. after a policy
+        reload).
+        """
+        async with self._lock:
+            if plan is not None:
+                self.plan = plan
+            merged = {**self.context, **(context or {}), **self.history_context()}
+            result = await self.engine.run(self.plan, text, context=merged, explain=explain)
+            self.turns.append(Turn(role, text, result.verdict, dict(result.results)))
+            await self._roll_summary()
+            return result
+
+    async def record(self, text: str, role: str = "assistant"):
+        """
+        Appends a turn without evaluating it (e.g. the model's own replies),
+        so later turns are judged with it in view.
+        """
+        async with self._lock:
+            self.turns.append(Turn(role, text))
+            await self._roll_summary()
+
+    @property
+    def verdicts(self) -> list[Optional[str]]:
+        return [turn.verdict for turn in self.turns]
+
+    @property
+    def flagged(self) -> list[int]:
+        return [i for i, turn in enumerate(self.turns) if turn.verdict == "violation"]
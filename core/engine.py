@@ -1,128 +1,377 @@
 import asyncio
 import logging
-import re
-from typing import Optional, Union
+from typing import Optional
 
+from core.hedging import Hedger
+from core.plan import EvaluationNode, EvaluationPlan, EvaluationResult, compile_statement
 from core.policy import Policy
-from core.slm_wrapper import SLMWrapper
+from core.slm_wrapper import MultiPolicySLMWrapper, SLMWrapper, collect_reasons, stop_collecting
+from core.tracing import Metrics, Trace, activate, deactivate
 
 logger = logging.getLogger("myapp")
 
-class EvaluationNode:
-    def __init__(self, value: Union[str, SLMWrapper], policy: Optional[Policy] = None):
-        self.value = value
-        self.policy = policy
-        self.left: Optional["EvaluationNode"] = None
-        self.right: Optional["EvaluationNode"] = None
-        self.result: Optional[str] = None
 
-    def is_leaf(self) -> bool:
-        return isinstance(self.value, SLMWrapper)
+def settles(logic: str, child_result: Optional[str]) -> Optional[str]:
+    """
+    Returns the operator's verdict if a single child result already decides
+    it, else None.
+    """
+    if logic == "AND" and child_result == "violation":
+        return "violation"
+    if logic == "OR" and child_result != "violation":
+        return "compliant"
+    if logic == "NOT":
+        return "compliant" if child_result == "violation" else "violation"
+    return None
+
+
+def exhausted(logic: str) -> str:
+    """
+    Verdict of an operator once every child has reported without settling it.
+    """
+    if logic == "AND":
+        return "compliant"
+    if logic == "OR":
+        return "violation"
+    return "unknown"
+
+
+def combine(logic: str, child_results: list[Optional[str]]) -> str:
+    for child_result in child_results:
+        verdict = settles(logic, child_result)
+        if verdict is not None:
+            return verdict
+    return exhausted(logic)
 
 
 class EvaluationEngine:
-    def __init__(self):
-        self.root: Optional[EvaluationNode] = None
-        self.result_map: dict[str, str] = {}
+    """
+    Evaluates compiled plans. The engine keeps no per-evaluation state, so a
+    single instance can run any number of plans concurrently via `run`.
+
+    `construct_tree_from_statement` + `evaluate` are kept for callers that
+    bind one statement to one engine.
+
+    Every leaf call is launched up front and operators are settled from a
+    single `asyncio.wait` loop: as each leaf reports, only its ancestors are
+    updated. With `short_circuit` set, the engine returns as soon as the root
+    is settled and cancels the leaves nobody needs any more (including those
+    under an already-settled subtree). Setting `collect_remaining` as well
+    lets those calls finish in the background instead;
+    `EvaluationResult.audit` completes once every leaf has reported.
+
+    Given a `multi_policy` wrapper, plain `SLMWrapper` leaves on the same
+    model are scored together in one request; leaves whose verdict can't be
+    parsed out of the combined response fall back to their own evaluator.
+
+    `leaf_timeout` bounds each evaluator call and `budget` the whole
+    evaluation; a leaf that runs out of time takes its policy's
+    `timeout_verdict` (fail-open or fail-closed). A `hedger` duplicates leaf
+    calls that run past their learned latency percentile.
+
+    Given `metrics`, every evaluation is traced (`EvaluationResult.trace`)
+    with a span per leaf and per settled operator, and the finished trace is
+    fed to `metrics`.
+    """
+    def __init__(self, short_circuit: bool = False, collect_remaining: bool = False,
+                 multi_policy: Optional[MultiPolicySLMWrapper] = None,
+                 leaf_timeout: Optional[float] = None, budget: Optional[float] = None,
+                 hedger: Optional[Hedger] = None, metrics: Optional[Metrics] = None):
+        self.plan: Optional[EvaluationPlan] = None
+        self.short_circuit = short_circuit
+        self.collect_remaining = collect_remaining
+        self.multi_policy = multi_policy
+        self.leaf_timeout = leaf_timeout
+        self.budget = budget
+        self.hedger = hedger
+        self.metrics = metrics
+
+    @property
+    def root(self) -> Optional[EvaluationNode]:
+        return self.plan.root if self.plan else None
 
     def construct_tree_from_statement(self, statement: str, policy_map: dict[str, Policy], slm_map: dict[str, SLMWrapper]):
         """
         Parses a logical statement and constructs the evaluation tree.
         """
-        def tokenize(expr: str):
-            return re.findall(r'\(|\)|AND|OR|NOT|[a-zA-Z_]+', expr)
-
-        def precedence(op: str) -> int:
-            return {"OR": 1, "AND": 2, "NOT": 3}.get(op, 0)
-
-        def build_expression_tree(tokens):
-            values = []
-            ops = []
-
-            def apply_op():
-                op = ops.pop()
-                if op == "NOT":
-                    right = values.pop()
-                    node = EvaluationNode("NOT")
-                    node.left = right
-                    values.append(node)
-                else:
-                    right = values.pop()
-                    left = values.pop()
-                    node = EvaluationNode(op)
-                    node.left = left
-                    node.right = right
-                    values.append(node)
-
-            i = 0
-            while i < len(tokens):
-                token = tokens[i]
-                if token == '(':
-                    ops.append(token)
-                elif token == ')':
-                    while ops and ops[-1] != '(':
-                        apply_op()
-                    ops.pop()  # remove '('
-                elif token.upper() in ("AND", "OR", "NOT"):
-                    while (ops and precedence(ops[-1]) >= precedence(token.upper())):
-                        apply_op()
-                    ops.append(token.upper())
-                else:
-                    alias = token
-                    policy = policy_map[alias]
-                    slm = slm_map[alias]
-                    values.append(EvaluationNode(slm, policy))
-                i += 1
-
-            while ops:
-                apply_op()
-
-            return values[-1] if values else None
-
-        tokens = tokenize(statement)
-        self.root = build_expression_tree(tokens)
+        self.plan = compile_statement(statement, policy_map, slm_map)
         logger.info("Evaluation tree constructed from logical statement.")
 
-    async def _evaluate_node(self, node: EvaluationNode, user_input, context: dict = None) -> str:
-        if node is None:
-            return "unknown"
+    def _timed_out(self, node: EvaluationNode, result: EvaluationResult) -> str:
+        logger.warning("SLM '%s' ran out of time, using %s verdict", node.value.name, node.policy.on_timeout)
+        if result.trace is not None:
+            result.trace.leaf(node.value.name, node.policy.name).finish(node.policy.timeout_verdict, "timed_out")
+        result.timed_out.append(node.value.name)
+        result.results[node.value.name] = node.policy.timeout_verdict
+        return node.policy.timeout_verdict
 
-        if node.is_leaf():
-            logger.info(f"Evaluating SLM node: {node.value.name} for policy '{node.policy.name}'")
-            policy_name, result = await node.value(node.policy, user_input, context=context)
-            node.result = result
-            self.result_map[node.value.name] = result
+    async def _call_leaf(self, node: EvaluationNode, user_input, context: dict) -> tuple[str, str]:
+        def call():
+            return node.value(node.policy, user_input, context=context)
 
-            logger.info(f"Result from SLM '{node.value.name}': {result}")
-            return result
+        if self.hedger is None:
+            return await call()
+        return await self.hedger.run(node.value.name, call)
 
-        logger.info(f"Evaluating operator node: '{node.value}'")
+    async def _evaluate_leaf(self, node: EvaluationNode, user_input, context: dict, result: EvaluationResult) -> str:
+        logger.info("Evaluating SLM node: %s for policy '%s'", node.value.name, node.policy.name)
+        span = token = None
+        if result.trace is not None:
+            span = result.trace.leaf(node.value.name, node.policy.name, getattr(node.value, "model", None))
+            token = activate(span)
+        try:
+            policy_name, leaf_result = await asyncio.wait_for(self._call_leaf(node, user_input, context), self.leaf_timeout)
+        except asyncio.TimeoutError:
+            return self._timed_out(node, result)
+        except asyncio.CancelledError:
+            if span is not None:
+                span.finish(status="cancelled")
+            raise
+        except Exception:
+            if span is not None:
+                span.finish(status="error")
+            raise
+        finally:
+            if token is not None:
+                deactivate(token)
+        result.results[node.value.name] = leaf_result
+        if span is not None:
+            span.finish(leaf_result)
 
-        left_task = asyncio.create_task(self._evaluate_node(node.left, user_input, context)) if node.left else None
-        right_task = asyncio.create_task(self._evaluate_node(node.right, user_input, context)) if node.right else None
+        logger.info("Result from SLM '%s': %s", node.value.name, leaf_result)
+        return leaf_result
 
-        left_result = await left_task if left_task else None
-        right_result = await right_task if right_task else None
+    async def _evaluate_group(self, plan: EvaluationPlan, indices: tuple[int, ...], user_input, context: dict, result: EvaluationResult) -> list[tuple[int, str]]:
+        # every position of a shared leaf is in the same group; call it once
+        distinct = [i for i in indices if plan.canonical[i] == i]
+        verdicts = await self._evaluate_distinct(plan, distinct, user_input, context, result)
+        return [(i, verdicts[plan.canonical[i]]) for i in indices]
 
-        logic = node.value.upper()
-        logger.info(f"Combining results: {left_result} {logic} {right_result}")
+    async def _evaluate_distinct(self, plan: EvaluationPlan, indices: list[int], user_input, context: dict, result: EvaluationResult) -> dict[int, str]:
+        nodes = [plan.nodes[i] for i in indices]
+        if len(nodes) == 1:
+            return {indices[0]: await self._evaluate_leaf(nodes[0], user_input, context, result)}
 
-        if logic == "OR":
-            node.result = "violation" if left_result == "violation" and right_result == "violation" else "compliant"
-        elif logic == "AND":
-            node.result = "violation" if left_result == "violation" or right_result == "violation" else "compliant"
-        elif logic == "NOT":
-            node.result = "compliant" if left_result == "violation" else "violation"
-        else:
-            node.result = "unknown"
+        logger.info("Evaluating %d policies in one request via '%s'", len(nodes), self.multi_policy.name)
+        span = token = None
+        if result.trace is not None:
+            span = result.trace.group(self.multi_policy.name, self.multi_policy.model)
+            token = activate(span)
+        try:
+            verdicts = await asyncio.wait_for(
+                self.multi_policy.evaluate_policies([node.policy for node in nodes], user_input, context=context),
+                self.leaf_timeout,
+            )
+        except asyncio.TimeoutError:
+            return {index: self._timed_out(node, result) for index, node in zip(indices, nodes)}
+        except Exception as e:
+            # one bad combined request should cost a round of single calls, not the evaluation
+            logger.warning("Combined request via '%s' failed, falling back to per-policy calls: %s",
+                           self.multi_policy.name, e)
+            if span is not None:
+                span.status = "error"
+            verdicts = {}
+        finally:
+            if token is not None:
+                deactivate(token)
+                span.finish()
+
+        settled = {}
+        fallback = []
+        for index, node in zip(indices, nodes):
+            if node.policy.name in verdicts:
+                result.results[node.value.name] = verdicts[node.policy.name]
+                if span is not None:
+                    leaf = result.trace.leaf(node.value.name, node.policy.name, span.model)
+                    leaf.start = span.start
+                    leaf.finish(verdicts[node.policy.name])
+                settled[index] = verdicts[node.policy.name]
+            else:
+                fallback.append(index)
+
+        leaf_results = await asyncio.gather(*(
+            self._evaluate_leaf(plan.nodes[i], user_input, context, result) for i in fallback
+        ))
+        settled.update(zip(fallback, leaf_results))
+        return settled
+
+    def _group_leaves(self, plan: EvaluationPlan) -> list[tuple[int, ...]]:
+        positions: dict[int, list[int]] = {}
+        for i in plan.leaf_indices:
+            positions.setdefault(plan.canonical[i], []).append(i)
+        if self.multi_policy is None:
+            return [tuple(indices) for indices in positions.values()]
+
+        grouped = []
+        groups = []
+        for first, indices in positions.items():
+            evaluator = plan.nodes[first].value
+            if type(evaluator) is SLMWrapper and evaluator.model == self.multi_policy.model:
+                grouped.extend(indices)
+            else:
+                groups.append(tuple(indices))
+        if grouped:
+            groups.append(tuple(grouped))
+        return groups
 
-        logger.info(f"Result of node '{logic}': {node.result}")
-        return node.result
+    def _settle(self, plan: EvaluationPlan, index: int, value: str, verdicts: list, remaining: list,
+                trace: Optional[Trace] = None) -> list[int]:
+        """
+        Records `value` for node `index` and walks up its ancestors, settling
+        each one the new value decides. Returns the indices of the operator
+        nodes that were settled before all their children reported.
+        """
+        verdicts[index] = value
+        early = []
+        parent = plan.parents[index]
+        while parent != -1 and verdicts[parent] is None:
+            logic = plan.nodes[parent].value
+            remaining[parent] -= 1
+            verdict = settles(logic, value)
+            if verdict is None:
+                if remaining[parent]:
+                    break
+                verdict = exhausted(logic)
+            elif remaining[parent]:
+                early.append(parent)
+
+            logger.info("Result of node '%s': %s", logic, verdict)
+            if trace is not None:
+                trace.operator(logic, verdict, early=bool(remaining[parent]), index=parent)
+            verdicts[parent] = verdict
+            value = verdict
+            parent = plan.parents[parent]
+        return early
+
+    def _release(self, plan: EvaluationPlan, tasks: dict[asyncio.Task, tuple[int, ...]], released: set, result: EvaluationResult):
+        for task in released:
+            if self.collect_remaining:
+                result.background.add(task)
+            else:
+                task.cancel()
+                result.skipped.extend(dict.fromkeys(plan.nodes[i].value.name for i in tasks[task]))
+            if result.trace is not None:
+                for i in tasks[task]:
+                    span = result.trace.leaf(plan.nodes[i].value.name, plan.nodes[i].policy.name)
+                    if self.collect_remaining:
+                        span.status = "background"
+                    else:
+                        span.finish(status="skipped")
 
-    async def evaluate(self, user_input, context: dict = None) -> str:
-        if not self.root:
+    def _record(self, result: EvaluationResult, verdict: str):
+        if result.trace is None:
+            return
+        result.trace.finish(verdict)
+        if self.metrics is not None:
+            self.metrics.record(result.trace)
+
+    async def _explain(self, plan: EvaluationPlan, user_input, context: dict, result: EvaluationResult,
+                       reasons: dict):
+        to_ask = {}
+        for node in plan.leaves:
+            name = node.value.name
+            if result.results.get(name) != "violation":
+                continue
+            if node.policy.name in reasons:
+                # the answer that decided the verdict already gave its reasons
+                result.explanations[name] = reasons[node.policy.name]
+            elif hasattr(node.value, "explain"):
+                to_ask[name] = node
+        explanations = await asyncio.gather(*(
+            node.value.explain(node.policy, user_input, context=context) for node in to_ask.values()
+        ), return_exceptions=True)
+        for name, explanation in zip(to_ask, explanations):
+            if isinstance(explanation, Exception):
+                logger.warning("Could not explain '%s': %s", name, explanation)
+                continue
+            result.explanations[name] = explanation
+
+    async def run(self, plan: EvaluationPlan, user_input, context: dict = None, explain: bool = False,
+                  trace: bool = False) -> EvaluationResult:
+        """
+        With `explain`, leaves that came back as violations report their
+        reasoning: the reason from the answer that decided the leaf, or, for
+        answers without one (`verdict_only`, cached verdicts), a follow-up
+        `SLMWrapper.explain` call once the verdict is known.
+        `trace` records `EvaluationResult.trace` even without `metrics`.
+        """
+        if not plan.root:
             raise ValueError("Evaluation tree not initialized.")
         logger.info("Starting evaluation of the tree...")
-        result = await self._evaluate_node(self.root, user_input, context)
-        logger.info(f"Final decision: {result.upper()}")
-        return result, self.result_map 
+        result = EvaluationResult("unknown", trace=Trace() if trace or self.metrics is not None else None)
+
+        verdicts: list[Optional[str]] = [None] * len(plan.nodes)
+        remaining = [len(node.children) for node in plan.nodes]
+        reasons = {}
+        # leaf tasks copy the context they are created in, so only their creation needs to see the collector
+        collecting = collect_reasons(reasons) if explain else None
+        try:
+            tasks = {
+                asyncio.create_task(self._evaluate_group(plan, indices, user_input, context, result)): indices
+                for indices in self._group_leaves(plan)
+            }
+        finally:
+            if collecting is not None:
+                stop_collecting(collecting)
+        pending = set(tasks)
+        early = []
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.budget if self.budget is not None else None
+
+        try:
+            while pending and not (self.short_circuit and verdicts[0] is not None):
+                timeout = max(0.0, deadline - loop.time()) if deadline is not None else None
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # evaluation budget spent: every leaf still running times out
+                    for task in pending:
+                        task.cancel()
+                        timeout_verdicts = {
+                            first: self._timed_out(plan.nodes[first], result)
+                            for first in dict.fromkeys(plan.canonical[i] for i in tasks[task])
+                        }
+                        for index in tasks[task]:
+                            self._settle(plan, index, timeout_verdicts[plan.canonical[index]], verdicts, remaining, result.trace)
+                    pending = set()
+                    break
+                settled_early = len(early)
+                for task in done:
+                    for index, leaf_result in task.result():
+                        early += self._settle(plan, index, leaf_result, verdicts, remaining, result.trace)
+                if self.short_circuit and len(early) > settled_early:
+                    unneeded = {
+                        t for t in pending
+                        if all(any(i < leaf < plan.ends[i] for i in early) for leaf in tasks[t])
+                    }
+                    pending -= unneeded
+                    self._release(plan, tasks, unneeded, result)
+        except BaseException as e:
+            for task in pending:
+                task.cancel()
+            for task in tasks:
+                # other leaves may have failed in the same round; their errors are superseded by this one
+                if task.done() and not task.cancelled():
+                    task.exception()
+            self._record(result, "cancelled" if isinstance(e, asyncio.CancelledError) else "error")
+            raise
+
+        self._release(plan, tasks, pending, result)
+        if result.background:
+            result.audit = asyncio.ensure_future(asyncio.gather(*result.background, return_exceptions=True))
+
+        if plan.roots:
+            result.statements = {name: verdicts[index] or "unknown" for name, index in plan.roots}
+            result.verdict = combine("AND", list(result.statements.values()))
+        else:
+            result.verdict = verdicts[0] or "unknown"
+        logger.info("Final decision: %s", result.verdict.upper())
+        self._record(result, result.verdict)
+        if explain:
+            await self._explain(plan, user_input, context, result, reasons)
+        return result
+
+    async def evaluate(self, user_input, context: dict = None) -> tuple[str, dict[str, str]]:
+        if not self.plan:
+            raise ValueError("Evaluation tree not initialized.")
+        result = await self.run(self.plan, user_input, context)
+        return result.as_tuple()
@@ -0,0 +1,208 @@
+from collections import Counter
+from typing import Optional
+
+from core.engine import EvaluationEngine, settles
+from core.plan import ALL, EvaluationNode, EvaluationPlan, EvaluationResult
+from core.tracing import policy_stats
+
+
+def normalize(node: Optional[EvaluationNode]) -> str:
+    """
+    Renders a compiled (flattened) tree back into a statement, one pair of
+    parentheses per n-ary operator.
+    """
+    if node is None:
+        return ""
+    if node.is_leaf():
+        return node.policy.alias
+    if node.value == "NOT":
+        return f"NOT {normalize(node.children[0])}"
+    if node.value == ALL:
+        return "; ".join(normalize(child) for child in node.children)
+    return "(" + f" {node.value} ".join(normalize(child) for child in node.children) + ")"
+
+
+def _leaf_label(node: EvaluationNode) -> str:
+    model = getattr(node.value, "model", None)
+    return f"{node.policy.alias} [{node.value.name}{' / ' + model if model else ''}]"
+
+
+def leaf_estimate(stats: Optional[dict], policy: str) -> dict:
+    """
+    Expected latency, SLM calls and cache hit rate of one leaf per
+    evaluation, from a `Metrics.snapshot()`. Leaves with no history are
+    assumed to make one call of unknown latency.
+    """
+    history = policy_stats(stats, policy)
+    if history is None:
+        return {"samples": 0, "latency_ms": None, "calls": 1.0, "cache_hit_rate": None, "violation_rate": None}
+    return history
+
+
+def _render_tree(plan: EvaluationPlan, annotate) -> list[str]:
+    lines = []
+    depth = [0] * len(plan.nodes)
+    for i, node in enumerate(plan.nodes):
+        if plan.parents[i] != -1:
+            depth[i] = depth[plan.parents[i]] + 1
+        label = _leaf_label(node) if node.is_leaf() else node.value
+        note = annotate(i, node)
+        lines.append(f"{'  ' * depth[i]}{label}{'  ' + note if note else ''}")
+    return lines
+
+
+def explain(plan: EvaluationPlan, stats: Optional[dict] = None) -> str:
+    """
+    EXPLAIN: the compiled plan with its normalized operators, unique leaves,
+    and the calls and latency to expect, estimated from `stats` (a
+    `Metrics.snapshot()`). Every leaf is launched up front, so the expected
+    latency is that of the slowest leaf.
+    """
+    estimates = {node.policy.name: leaf_estimate(stats, node.policy.name) for node in plan.leaves}
+    uses = Counter(node.value.name for node in plan.leaves)
+    calls_made = Counter(plan.nodes[i].value.name for i in set(plan.canonical[i] for i in plan.leaf_indices))
+
+    def annotate(i, node):
+        if not node.is_leaf():
+            return f"({len(node.children)} children)"
+        estimate = estimates[node.policy.name]
+        latency = f"{estimate['latency_ms']:.0f} ms" if estimate["latency_ms"] is not None else "? ms"
+        note = f"est {latency}, {estimate['calls']:.2f} calls"
+        if estimate["cache_hit_rate"] is not None:
+            note += f", {estimate['cache_hit_rate']:.0%} cached"
+        return note
+
+    latencies = [e["latency_ms"] for e in estimates.values() if e["latency_ms"] is not None]
+    # a leaf's history already covers every place it appears in the statement
+    calls = sum(estimate["calls"] for estimate in estimates.values())
+    duplicates = {name: count for name, count in calls_made.items() if count > 1}
+    shared = [name for name, count in uses.items() if count > 1 and calls_made[name] == 1]
+
+    lines = [f"EXPLAIN {plan.statement}", f"Normalized: {normalize(plan.root)}", ""]
+    lines += _render_tree(plan, annotate)
+    lines += [
+        "",
+        f"Leaves: {len(plan.leaves)} ({len(uses)} unique)",
+        f"Estimated calls: {calls:.2f}",
+        f"Estimated latency: {max(latencies):.0f} ms" if latencies else "Estimated latency: unknown (no history)",
+    ]
+    if shared:
+        lines.append("Shared (evaluated once): " + ", ".join(shared))
+    if duplicates:
+        lines.append("Evaluated more than once: " + ", ".join(f"{name} (x{count})" for name, count in duplicates.items()))
+    return "\n".join(lines)
+
+
+def _children(plan: EvaluationPlan) -> list[list[int]]:
+    children = [[] for _ in plan.nodes]
+    for i, parent in enumerate(plan.parents):
+        if parent != -1:
+            children[parent].append(i)
+    return children
+
+
+def needed_leaves(plan: EvaluationPlan, verdicts: list[Optional[str]], finished: list[Optional[float]],
+                  start: int = 0) -> set[int]:
+    """
+    Indices of the leaves the verdict of node `start` (by default the final
+    verdict) actually depended on. An
+    operator settled by one child only needs the earliest such child; one
+    settled by exhaustion needs all of them. The `ALL` root of a
+    multi-statement plan is read as the AND of its statements, as its
+    verdict is.
+    """
+    children = _children(plan)
+
+    def visit(i: int) -> set[int]:
+        node = plan.nodes[i]
+        if node.is_leaf():
+            return {i}
+        if verdicts[i] is None:
+            return set()
+        logic = "AND" if node.value == ALL else node.value
+        deciding = [c for c in children[i] if settles(logic, verdicts[c]) == verdicts[i]]
+        if deciding:
+            first = min(deciding, key=lambda c: finished[c] if finished[c] is not None else float("inf"))
+            return visit(first)
+        return set().union(*(visit(c) for c in children[i]))
+
+    return visit(start)
+
+
+async def analyze(engine: EvaluationEngine, plan: EvaluationPlan, user_input, context: dict = None) -> tuple[EvaluationResult, str]:
+    """
+    EXPLAIN ANALYZE: runs one traced evaluation and annotates every node
+    with its actual verdict and latency, the leaf that decided the outcome
+    and the calls that turned out to be unnecessary.
+    """
+    result = await engine.run(plan, user_input, context=context, trace=True)
+    trace = result.trace
+
+    verdicts: list[Optional[str]] = [None] * len(plan.nodes)
+    finished: list[Optional[float]] = [None] * len(plan.nodes)
+    spans = {}
+    for span in trace.operators:
+        verdicts[span.index] = span.verdict
+        finished[span.index] = span.end
+    if plan.roots:
+        # the ALL root only collects statements; its verdict is computed by the engine
+        verdicts[0] = result.verdict
+    for i in plan.leaf_indices:
+        span = trace.leaves.get(plan.nodes[i].value.name)
+        if span is not None:
+            spans[i] = span
+            verdicts[i] = span.verdict
+            finished[i] = span.end
+
+    needed = needed_leaves(plan, verdicts, finished)
+    decider = max(needed, key=lambda i: finished[i] if finished[i] is not None else float("-inf"), default=None)
+    # every statement's verdict is reported, so a leaf is only wasted if none of them needed it
+    useful = set().union(*(needed_leaves(plan, verdicts, finished, start) for _, start in plan.roots)) or needed
+    # a leaf repeated in the statement shares one span, so count calls per span
+    unique = {id(span): span for span in spans.values()}
+    useful_spans = {id(spans[i]) for i in useful if i in spans}
+    wasted = {i for i in spans if id(spans[i]) not in useful_spans and spans[i].calls}
+
+    def ms(seconds):
+        return f"{seconds * 1000:.1f} ms"
+
+    early = {span.index for span in trace.operators if span.early}
+
+    def annotate(i, node):
+        if not node.is_leaf():
+            if verdicts[i] is None:
+                return "-> not settled"
+            return f"-> {verdicts[i]} at {ms(finished[i] - trace.start)}{' (early)' if i in early else ''}"
+        span = spans.get(i)
+        if span is None:
+            return "-> not started"
+        parts = [f"-> {span.verdict or span.status}"]
+        if span.duration is not None:
+            parts.append(f"in {ms(span.duration)}")
+        if span.verdict and span.status != "ok":
+            parts.append(f"({span.status})")
+        if span.cache_hit:
+            parts.append("cache hit")
+        if span.calls:
+            parts.append(f"(queue {ms(span.queue_wait)}, slm {ms(span.slm_latency)}, parse {ms(span.parse_time)})")
+        if i == decider:
+            parts.append("<- decided")
+        elif i in wasted:
+            parts.append("<- wasted")
+        return " ".join(parts)
+
+    calls = sum(span.calls for span in unique.values()) + sum(span.calls for span in trace.groups)
+    lines = [f"EXPLAIN ANALYZE {plan.statement}", f"Normalized: {normalize(plan.root)}", ""]
+    lines += _render_tree(plan, annotate)
+    lines += [
+        "",
+        f"Verdict: {result.verdict} in {ms(trace.duration)}",
+        *(["Statements: " + ", ".join(f"{name}={verdict}" for name, verdict in result.statements.items())]
+          if result.statements else []),
+        f"Decided by: {_leaf_label(plan.nodes[decider])}" if decider is not None else "Decided by: -",
+        f"Calls: {calls} made, {sum({id(spans[i]): spans[i].calls for i in wasted}.values())} wasted, "
+        f"{sum(span.cache_hit for span in unique.values())} cache hits",
+    ]
+    if trace.groups:
+        lines.append("Combined requests: " + ", ".join(f"{span.name} in {ms(span.duration)}" for span in trace.groups))
+    return result, "\n".join(lines)
@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Optional, TypeVar
+
+logger = logging.getLogger("myapp")
+
+T = TypeVar("T")
+
+_hedge_attempt: ContextVar[bool] = ContextVar("judge_hedge_attempt", default=False)
+
+
+def is_hedge() -> bool:
+    """
+    Whether the running call is a hedged duplicate, which must really be
+    sent rather than joined to the call it is racing.
+    """
+    return _hedge_attempt.get()
+
+
+class LatencyTracker:
+    """
+    Rolling window of successful call latencies per key (usually the
+    evaluator name).
+    """
+    def __init__(self, window: int = 200):
+        self.window = window
+        self._samples: dict[str, deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def count(self, key: str) -> int:
+        return len(self._samples.get(key, ()))
+
+    def percentile(self, key: str, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+class Hedger:
+    """
+    Sends a duplicate of a call that is still running past the learned
+    `percentile` latency for its key and keeps whichever finishes first.
+    No hedging happens until `min_samples` latencies have been seen.
+    """
+    def __init__(self, percentile: float = 0.95, min_samples: int = 20, tracker: Optional[LatencyTracker] = None):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.tracker = tracker or LatencyTracker()
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    def delay_for(self, key: str) -> Optional[float]:
+        if self.tracker.count(key) < self.min_samples:
+            return None
+        return self.tracker.percentile(key, self.percentile)
+
+    @staticmethod
+    async def _hedge(call: Callable[[], Awaitable[T]]) -> T:
+        # runs in its own task, so the flag stays in this attempt's context
+        _hedge_attempt.set(True)
+        return await call()
+
+    async def run(self, key: str, call: Callable[[], Awaitable[T]]) -> T:
+        start = time.monotonic()
+        delay = self.delay_for(key)
+        primary = asyncio.ensure_future(call())
+        attempts = {primary}
+
+        try:
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if not done:
+                logger.info("Hedging '%s' after %.2fs", key, delay)
+                self.hedged += 1
+                attempts.add(asyncio.ensure_future(self._hedge(call)))
+
+            while True:
+                done, pending = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+                if winner is not None:
+                    break
+                if not pending:
+                    # every attempt failed; surface the last error
+                    return done.pop().result()
+                attempts = pending
+        finally:
+            for task in attempts:
+                if not task.done():
+                    task.cancel()
+
+        if winner is not primary:
+            self.hedge_wins += 1
+        self.tracker.record(key, time.monotonic() - start)
+        return winner.result()
@@ -0,0 +1,193 @@
+import asyncio
+import logging
+import random
+import re
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+logger = logging.getLogger("myapp")
+
+T = TypeVar("T")
+
+
+# last resort for errors without a status code: a 429 only counts when its reason phrase comes with it
+_RATE_LIMIT_MESSAGE = re.compile(r"\bRESOURCE_EXHAUSTED\b|\b429\b\W+too many requests\b", re.IGNORECASE)
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    """
+    Whether `error` is a 429 / RESOURCE_EXHAUSTED response. The status code
+    decides when the error carries one; the message is only read when it
+    carries neither a code nor a status.
+    """
+    for attribute in ("code", "status_code"):
+        code = getattr(error, attribute, None)
+        if isinstance(code, int):
+            return code == 429
+    status = getattr(error, "status", None)
+    if isinstance(status, str):
+        return status == "RESOURCE_EXHAUSTED"
+    return _RATE_LIMIT_MESSAGE.search(str(error)) is not None
+
+
+class RateLimiter:
+    """
+    Bounds the calls made against one model: at most `max_concurrency` in
+    flight, started no faster than a token bucket allows.
+
+    A 429 / RESOURCE_EXHAUSTED response halves the bucket's rate and the call
+    is retried after a jittered exponential backoff; every success nudges the
+    rate back up towards `max_rate`. The 429s of one burst arrive together,
+    so the rate is halved at most once per `decrease_cooldown` seconds. When
+    no rate is configured the bucket stays open until the first 429, then
+    starts from half the completions per second over the last `window`
+    seconds (at least one).
+    """
+    def __init__(self, max_concurrency: int = 8, rate: Optional[float] = None, burst: int = 1,
+                 max_rate: Optional[float] = None, min_rate: float = 0.1,
+                 max_retries: int = 4, base_delay: float = 0.5, max_delay: float = 20.0,
+                 decrease_cooldown: float = 1.0, window: float = 5.0):
+        self.max_concurrency = max_concurrency
+        self.rate = rate
+        self.max_rate = max_rate or rate
+        self.min_rate = min_rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.decrease_cooldown = decrease_cooldown
+        self.window = max(1.0, window)
+
+        self.waiting = 0
+        self.in_flight = 0
+        self.rate_limited = 0
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+        self._started_at = self._updated_at
+        self._decreased_at: Optional[float] = None
+        self._recent: deque[float] = deque()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._bucket_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def queue_depth(self) -> int:
+        return self.waiting
+
+    def _primitives(self) -> tuple[asyncio.Semaphore, asyncio.Lock]:
+        # asyncio primitives are bound to the loop they are first used on
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._bucket_lock = asyncio.Lock()
+        return self._semaphore, self._bucket_lock
+
+    async def _take_token(self, bucket_lock: asyncio.Lock):
+        async with bucket_lock:
+            while self.rate is not None:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def _on_success(self):
+        if self.rate is None:
+            now = time.monotonic()
+            self._recent.append(now)
+            while self._recent[0] < now - self.window:
+                self._recent.popleft()
+        elif self.max_rate is not None and self.rate < self.max_rate:
+            self.rate = min(self.max_rate, self.rate + 0.05 * self.max_rate)
+
+    def _observed_rate(self, now: float) -> float:
+        while self._recent and self._recent[0] < now - self.window:
+            self._recent.popleft()
+        if not self._recent:
+            return float(self.max_concurrency)
+        # a young limiter has not seen a whole window yet; never divide by under a second
+        span = max(1.0, min(self.window, now - self._started_at))
+        return len(self._recent) / span
+
+    def _on_rate_limited(self):
+        self.rate_limited += 1
+        now = time.monotonic()
+        if self._decreased_at is not None and now - self._decreased_at < self.decrease_cooldown:
+            return
+        self._decreased_at = now
+        if self.rate is None:
+            observed = self._observed_rate(now)
+            self._recent.clear()
+            self.max_rate = observed
+            self.rate = observed
+            self._tokens = 0.0
+            self._updated_at = now
+        self.rate = max(self.min_rate, self.rate / 2)
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def call(self, fn: Callable[..., Awaitable[T]], *args, **kwargs) -> T:
+        semaphore, bucket_lock = self._primitives()
+        attempt = 0
+        while True:
+            self.waiting += 1
+            try:
+                await semaphore.acquire()
+            finally:
+                self.waiting -= 1
+            try:
+                await self._take_token(bucket_lock)
+                self.in_flight += 1
+                try:
+                    response = await fn(*args, **kwargs)
+                finally:
+                    self.in_flight -= 1
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= self.max_retries:
+                    raise
+                self._on_rate_limited()
+                delay = self._backoff(attempt)
+                logger.warning("Rate limited, retrying in %.2fs (rate now %.2f/s)", delay, self.rate)
+            else:
+                self._on_success()
+                return response
+            finally:
+                semaphore.release()
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.waiting,
+            "in_flight": self.in_flight,
+            "rate": self.rate,
+            "rate_limited": self.rate_limited,
+        }
+
+
+_limiters: dict[str, tuple[RateLimiter, dict]] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(model: str, **kwargs) -> RateLimiter:
+    """
+    Returns the process-wide limiter for `model`, creating it with `kwargs`
+    on first use. Later calls may repeat those settings or pass none; asking
+    for different ones raises `ValueError`, since only one limiter per model
+    can exist.
+    """
+    with _limiters_lock:
+        if model not in _limiters:
+            _limiters[model] = (RateLimiter(**kwargs), kwargs)
+        limiter, settings = _limiters[model]
+        conflicts = {key: value for key, value in kwargs.items() if key not in settings or settings[key] != value}
+        if conflicts:
+            raise ValueError(f"limiter for {model} already exists with {settings}, cannot apply {conflicts}")
+        return limiter
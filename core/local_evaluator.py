@@ -0,0 +1,130 @@
+import logging
+import re
+from abc import ABC, abstractmethod
+from typing import Iterable, Optional
+
+from core.policy import Policy
+
+logger = logging.getLogger("myapp")
+
+SQL_INJECTION_PATTERNS = [
+    r"\bor\s+1\s*=\s*1\b",
+    r"'\s*or\s*'[^']*'\s*=\s*'",
+    r"\bunion\s+(?:all\s+)?select\b",
+    r";\s*(?:drop|truncate|alter)\s+table\b",
+    # a quote closed straight into a comment; a bare "--" is ordinary punctuation
+    r"'\s*(?:\)\s*)*;?\s*--",
+    r"\bxp_cmdshell\b",
+    r"\bsleep\s*\(\s*\d+\s*\)",
+]
+
+TOOL_NAME_PATTERN = r"\b[a-z][a-z0-9]*(?:_[a-z0-9]+)+\b"
+
+
+class LocalEvaluator(ABC):
+    """
+    Base for evaluators that decide a leaf in-process, without an SLM call.
+
+    `evaluate_local` returns a verdict when the rule is confident and None
+    otherwise. Called directly, an unconfident local evaluator reports
+    "unknown"; wrap it in a `CascadeEvaluator` to fall through to an SLM.
+    """
+    def __init__(self, name: str):
+        self.name = name
+
+    @abstractmethod
+    def evaluate_local(self, policy: Policy, user_input: str, context: dict = None) -> Optional[str]:
+        ...
+
+    async def evaluate_policy(self, policy: Policy, user_input: str, context: dict = None) -> tuple[str, str]:
+        verdict = self.evaluate_local(policy, user_input, context=context)
+        return policy.name, verdict or "unknown"
+
+    async def __call__(self, policy: Policy, user_input: str, context: dict = None) -> tuple[str, str]:
+        return await self.evaluate_policy(policy, user_input, context=context)
+
+
+class PatternEvaluator(LocalEvaluator):
+    """
+    Flags a violation when any of `patterns` matches the input. All patterns
+    are compiled into a single alternation, so the input is scanned once
+    however many patterns there are. A miss is never treated as confident.
+    """
+    def __init__(self, name: str, patterns: Iterable[str], flags: int = re.IGNORECASE | re.MULTILINE):
+        super().__init__(name)
+        self.patterns = list(patterns)
+        self._regex = re.compile("|".join(f"(?:{pattern})" for pattern in self.patterns), flags)
+
+    @classmethod
+    def from_keywords(cls, name: str, keywords: Iterable[str], **kwargs) -> "PatternEvaluator":
+        return cls(name, [rf"\b{re.escape(keyword)}\b" for keyword in keywords], **kwargs)
+
+    def evaluate_local(self, policy: Policy, user_input: str, context: dict = None) -> Optional[str]:
+        match = self._regex.search(user_input)
+        if match:
+            logger.info("%s --> matched '%s'", self.name, match.group(0))
+            return "violation"
+        return None
+
+
+class AllowListEvaluator(LocalEvaluator):
+    """
+    Checks the names mentioned in the input (tool names by default) against
+    the allow-list found under `context[context_key]`.
+
+    Only names in `known` (every tool the agents could have, allowed or not)
+    count as mentions, since `pattern` alone matches any snake_case word. A
+    known name outside the allow-list is a confident violation. When
+    everything mentioned is allowed the result is only confident if
+    `trust_allowed` is set, since the SLM may still object to how the tools
+    are combined. Without an allow-list in the context the rule abstains.
+    """
+    def __init__(self, name: str, known: Iterable[str], context_key: str = "allowed_tools",
+                 pattern: str = TOOL_NAME_PATTERN, trust_allowed: bool = False):
+        super().__init__(name)
+        self.context_key = context_key
+        self.known = set(known)
+        self.trust_allowed = trust_allowed
+        self._regex = re.compile(pattern)
+
+    def evaluate_local(self, policy: Policy, user_input: str, context: dict = None) -> Optional[str]:
+        if not context or self.context_key not in context:
+            return None
+
+        mentioned = set(self._regex.findall(user_input)) & self.known
+        if not mentioned:
+            return None
+
+        denied = mentioned - set(context[self.context_key])
+        if denied:
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("%s --> not in %s: %s", self.name, self.context_key, sorted(denied))
+            return "violation"
+        return "compliant" if self.trust_allowed else None
+
+
+class CascadeEvaluator:
+    """
+    Runs local rules in order and settles the leaf with the first confident
+    verdict; only when every rule abstains is `fallback` (usually an
+    `SLMWrapper`) called.
+    """
+    def __init__(self, rules: list[LocalEvaluator], fallback, name: Optional[str] = None):
+        self.rules = rules
+        self.fallback = fallback
+        self.name = name or fallback.name
+        self.local_hits = 0
+        self.fallback_calls = 0
+
+    async def evaluate_policy(self, policy: Policy, user_input: str, context: dict = None) -> tuple[str, str]:
+        for rule in self.rules:
+            verdict = rule.evaluate_local(policy, user_input, context=context)
+            if verdict is not None:
+                self.local_hits += 1
+                return policy.name, verdict
+
+        self.fallback_calls += 1
+        return await self.fallback(policy, user_input, context=context)
+
+    async def __call__(self, policy: Policy, user_input: str, context: dict = None) -> tuple[str, str]:
+        return await self.evaluate_policy(policy, user_input, context=context)
@@ -0,0 +1,459 @@
+import asyncio
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from typing import Callable, Optional, Union
+
+from core.local_evaluator import LocalEvaluator
+from core.policy import Policy
+from core.slm_wrapper import SLMWrapper
+from core.tracing import Trace, policy_stats
+
+OPERATORS = ("AND", "OR", "NOT")
+
+# root of a multi-statement plan: never settles early, so every statement gets its verdict
+ALL = "ALL"
+
+# deepest tree a statement may parse to
+MAX_DEPTH = 100
+
+# assumed cost of a leaf with no latency history, roughly one hosted SLM call
+DEFAULT_LEAF_COST_MS = 300.0
+
+
+@dataclass(frozen=True)
+class EvaluationNode:
+    value: Union[str, SLMWrapper]
+    policy: Optional[Policy] = None
+    children: tuple["EvaluationNode", ...] = ()
+
+    def is_leaf(self) -> bool:
+        return self.policy is not None
+
+
+@dataclass(frozen=True)
+class EvaluationPlan:
+    """
+    Compiled, immutable form of a logical statement. A plan holds no
+    per-evaluation state, so one instance can be shared by any number of
+    concurrent evaluations.
+
+    `nodes` lists the tree in pre-order, so the subtree rooted at `nodes[i]`
+    is `nodes[i:ends[i]]`. `parents[i]` is the index of its parent (-1 for
+    the root) and `leaf_indices` the positions of the policy leaves.
+
+    A leaf shared by several positions (see `optimize`) is evaluated once;
+    `canonical[i]` is the first position of the leaf at `i`.
+
+    Plans compiled from several named statements (`compile_statements`)
+    hang each statement under an `ALL` root; `roots` maps every statement
+    name to the index of its own root node.
+    """
+    statement: str
+    root: Optional[EvaluationNode]
+    leaves: tuple[EvaluationNode, ...]
+    nodes: tuple[EvaluationNode, ...] = ()
+    parents: tuple[int, ...] = ()
+    ends: tuple[int, ...] = ()
+    leaf_indices: tuple[int, ...] = ()
+    canonical: tuple[int, ...] = ()
+    roots: tuple[tuple[str, int], ...] = ()
+
+
+@dataclass
+class EvaluationResult:
+    verdict: str
+    results: dict[str, str] = field(default_factory=dict)
+    skipped: list[str] = field(default_factory=list)
+    timed_out: list[str] = field(default_factory=list)
+    explanations: dict[str, dict] = field(default_factory=dict)
+    background: set = field(default_factory=set, repr=False)
+    audit: Optional[asyncio.Future] = field(default=None, repr=False)
+    trace: Optional[Trace] = field(default=None, repr=False)
+    statements: dict[str, str] = field(default_factory=dict)
+
+    def as_tuple(self) -> tuple[str, dict[str, str]]:
+        return self.verdict, self.results
+
+    def as_dict(self) -> dict:
+        payload = {
+            "verdict": self.verdict,
+            "results": self.results,
+            "skipped": self.skipped,
+            "timed_out": self.timed_out,
+            "explanations": self.explanations,
+        }
+        if self.statements:
+            payload["statements"] = self.statements
+        return payload
+
+
+def tokenize(expr: str) -> list[str]:
+    return re.findall(r'\(|\)|AND|OR|NOT|[a-zA-Z_]+', expr)
+
+
+def precedence(op: str) -> int:
+    return {"OR": 1, "AND": 2, "NOT": 3}.get(op, 0)
+
+
+def build_expression_tree(tokens: list[str], policy_map: dict[str, Policy], slm_map: dict[str, SLMWrapper]) -> EvaluationNode:
+    """
+    Shunting-yard parse of a token list into an evaluation tree. Raises
+    `ValueError` for an empty or malformed statement, an unknown alias, or
+    a tree deeper than `MAX_DEPTH`.
+    """
+    if not tokens:
+        raise ValueError("statement is empty")
+    # finished nodes, or an open `[op, children]` chain that later operands of
+    # the same operator are appended to; a chain is frozen into a node once
+    values = []
+    depths = []
+    ops = []
+
+    def freeze(value) -> EvaluationNode:
+        if isinstance(value, list):
+            return EvaluationNode(value[0], children=tuple(value[1]))
+        return value
+
+    def apply_op():
+        op = ops.pop()
+        if op == "NOT":
+            value = EvaluationNode(op, children=(freeze(values.pop()),))
+            depth = depths.pop() + 1
+        else:
+            right, right_depth = values.pop(), depths.pop()
+            left, left_depth = values.pop(), depths.pop()
+            if isinstance(left, list) and left[0] == op:
+                # extend a chain like `A AND B AND C` in place rather than nesting it
+                left[1].append(freeze(right))
+                value = left
+                depth = max(left_depth, right_depth + 1)
+            else:
+                value = [op, [freeze(left), freeze(right)]]
+                depth = max(left_depth, right_depth) + 1
+        # the later passes recurse over the tree, so its depth is capped here
+        if depth > MAX_DEPTH:
+            raise ValueError(f"statement nests more than {MAX_DEPTH} levels deep")
+        values.append(value)
+        depths.append(depth)
+
+    expect_operand = True
+    for token in tokens:
+        if token == '(':
+            if not expect_operand:
+                raise ValueError("missing operator before '('")
+            ops.append(token)
+        elif token == ')':
+            if expect_operand:
+                raise ValueError("missing operand before ')'")
+            while ops and ops[-1] != '(':
+                apply_op()
+            if not ops:
+                raise ValueError("unbalanced ')'")
+            ops.pop()  # remove '('
+        elif token.upper() == "NOT":
+            if not expect_operand:
+                raise ValueError("missing operator before NOT")
+            # prefix operator: it has no left operand to reduce, so `NOT NOT A` nests
+            ops.append("NOT")
+        elif token.upper() in OPERATORS:
+            if expect_operand:
+                raise ValueError(f"missing operand before {token.upper()}")
+            while (ops and precedence(ops[-1]) >= precedence(token.upper())):
+                apply_op()
+            ops.append(token.upper())
+            expect_operand = True
+        else:
+            alias = token
+            if not expect_operand:
+                raise ValueError(f"missing operator before '{alias}'")
+            if alias not in policy_map or alias not in slm_map:
+                raise ValueError(f"unknown policy '{alias}'")
+            values.append(EvaluationNode(slm_map[alias], policy_map[alias]))
+            depths.append(1)
+            expect_operand = False
+
+    if expect_operand:
+        raise ValueError("statement ends with an operator")
+    while ops:
+        if ops[-1] == '(':
+            raise ValueError("unbalanced '('")
+        apply_op()
+
+    return freeze(values[-1])
+
+
+def flatten(node: Optional[EvaluationNode]) -> Optional[EvaluationNode]:
+    """
+    Merges nested chains of the same associative operator into one n-ary
+    node, so `(A AND B) AND C` and `A AND (B AND C)` compile identically.
+    """
+    if node is None or node.is_leaf():
+        return node
+
+    children = []
+    for child in node.children:
+        child = flatten(child)
+        if node.value != "NOT" and not child.is_leaf() and child.value == node.value:
+            children.extend(child.children)
+        else:
+            children.append(child)
+    return EvaluationNode(node.value, children=tuple(children))
+
+
+def push_down_not(node: Optional[EvaluationNode], negate: bool = False) -> Optional[EvaluationNode]:
+    """
+    Moves every NOT down onto a leaf with De Morgan's laws and drops double
+    negations, so `NOT (A OR B)` becomes `NOT A AND NOT B` and can be
+    flattened into the surrounding AND.
+    """
+    if node is None:
+        return None
+    if node.is_leaf():
+        return EvaluationNode("NOT", children=(node,)) if negate else node
+    if node.value == "NOT":
+        return push_down_not(node.children[0], not negate)
+    value = {"AND": "OR", "OR": "AND"}[node.value] if negate else node.value
+    return EvaluationNode(value, children=tuple(push_down_not(child, negate) for child in node.children))
+
+
+def leaf_key(node: EvaluationNode) -> tuple:
+    """
+    Leaves with the same key are interchangeable: the same policy text
+    checked by the same kind of evaluator on the same model, even if the
+    evaluator objects were built separately (e.g. one per statement).
+    """
+    evaluator = node.value
+    return (
+        type(evaluator), evaluator.name, getattr(evaluator, "model", None),
+        node.policy.name, node.policy.instruction_hash,
+    )
+
+
+def share(node: Optional[EvaluationNode], interned: dict) -> Optional[EvaluationNode]:
+    """
+    Replaces structurally identical subtrees with one shared object and
+    drops repeated operands of AND/OR, so `(A AND B) OR (A AND C)` holds a
+    single `A` leaf and `A AND A` is just `A`.
+    """
+    if node is None:
+        return None
+    if node.is_leaf():
+        key = leaf_key(node)
+    else:
+        children = tuple({id(child): child for child in (share(c, interned) for c in node.children)}.values())
+        if len(children) == 1 and node.value != "NOT":
+            return children[0]
+        node = EvaluationNode(node.value, children=children)
+        key = (node.value, tuple(id(child) for child in children))
+    return interned.setdefault(key, node)
+
+
+def violation_rate(node: EvaluationNode, stats: Optional[dict]) -> float:
+    if node.is_leaf():
+        history = policy_stats(stats, node.policy.name)
+        return history["violation_rate"] if history else 0.5
+    rates = [violation_rate(child, stats) for child in node.children]
+    if node.value == "NOT":
+        return 1 - rates[0]
+    product = 1.0
+    if node.value == "AND":
+        for rate in rates:
+            product *= 1 - rate
+        return 1 - product
+    for rate in rates:
+        product *= rate
+    return product
+
+
+def expected_cost(node: EvaluationNode, stats: Optional[dict]) -> float:
+    """
+    Expected milliseconds of SLM time a subtree costs; in-process
+    evaluators are close to free.
+    """
+    if node.is_leaf():
+        if isinstance(node.value, LocalEvaluator):
+            return 0.01
+        history = policy_stats(stats, node.policy.name)
+        return history["latency_ms"] if history and history["latency_ms"] else DEFAULT_LEAF_COST_MS
+    return sum(expected_cost(child, stats) for child in node.children)
+
+
+def order_operands(node: Optional[EvaluationNode], stats: Optional[dict] = None) -> Optional[EvaluationNode]:
+    """
+    Sorts the operands of every AND/OR by how likely they are to settle it
+    per unit of cost: likely violations first under AND, likely compliant
+    operands first under OR. Leaves are launched in this order, so the
+    decisive ones get limiter slots first. Without history the order is
+    only changed where the tree shape makes one operand more decisive.
+    """
+    if node is None or node.is_leaf():
+        return node
+    children = [order_operands(child, stats) for child in node.children]
+    if node.value in ("AND", "OR"):
+        def decisiveness(child):
+            rate = violation_rate(child, stats)
+            return (rate if node.value == "AND" else 1 - rate) / expected_cost(child, stats)
+        children.sort(key=decisiveness, reverse=True)
+    return EvaluationNode(node.value, children=tuple(children))
+
+
+def optimize(root: Optional[EvaluationNode], stats: Optional[dict] = None,
+             interned: Optional[dict] = None) -> Optional[EvaluationNode]:
+    """
+    Rewrites a parsed tree into an equivalent one that is cheaper to
+    evaluate: NOTs pushed down and double negations removed, associative
+    chains flattened, identical leaves shared so each policy is called at
+    most once per input, and operands ordered by expected decisiveness
+    (from `stats`, a `Metrics.snapshot()`). Trees optimized with the same
+    `interned` dict share leaves with each other.
+    """
+    optimized = flatten(share(flatten(push_down_not(root)), {} if interned is None else interned))
+    if optimized is not None and optimized.is_leaf() and not root.is_leaf():
+        # a bare leaf would report "unknown" where the operators it replaced said "compliant"
+        optimized = EvaluationNode("AND", children=(optimized,))
+    return order_operands(optimized, stats)
+
+
+def index_tree(root: Optional[EvaluationNode]) -> tuple[tuple, tuple, tuple]:
+    nodes, parents, ends = [], [], []
+
+    def visit(node: EvaluationNode, parent: int):
+        index = len(nodes)
+        nodes.append(node)
+        parents.append(parent)
+        ends.append(None)
+        for child in node.children:
+            visit(child, index)
+        ends[index] = len(nodes)
+
+    if root is not None:
+        visit(root, -1)
+    return tuple(nodes), tuple(parents), tuple(ends)
+
+
+def compile_statement(statement: str, policy_map: dict[str, Policy], slm_map: dict[str, SLMWrapper],
+                      optimize_tree: bool = True, stats: Optional[dict] = None) -> EvaluationPlan:
+    """
+    Parses a logical statement once and returns a reusable evaluation plan.
+    With `optimize_tree` off the tree is only flattened, keeping operands
+    and repeated aliases exactly as written.
+    """
+    root = build_expression_tree(tokenize(statement), policy_map, slm_map)
+    root = optimize(root, stats) if optimize_tree else flatten(root)
+    return build_plan(statement, root)
+
+
+def compile_statements(statements: dict[str, str], policy_map: dict[str, Policy], slm_map: dict[str, SLMWrapper],
+                       optimize_tree: bool = True, stats: Optional[dict] = None) -> EvaluationPlan:
+    """
+    Compiles several named statements into one plan whose leaves are shared
+    across statements, so a policy that appears in more than one of them is
+    still called once per input. `EvaluationResult.statements` holds the
+    verdict of each statement and `verdict` is their AND.
+    """
+    interned = {}
+    roots = []
+    for statement in statements.values():
+        root = build_expression_tree(tokenize(statement), policy_map, slm_map)
+        roots.append(optimize(root, stats, interned) if optimize_tree else flatten(root))
+
+    plan = build_plan("; ".join(f"{name}: {statement}" for name, statement in statements.items()),
+                      EvaluationNode(ALL, children=tuple(roots)))
+    starts = [i for i, parent in enumerate(plan.parents) if parent == 0]
+    return replace(plan, roots=tuple(zip(statements, starts)))
+
+
+def build_plan(statement: str, root: Optional[EvaluationNode]) -> EvaluationPlan:
+    nodes, parents, ends = index_tree(root)
+    leaf_indices = tuple(i for i, node in enumerate(nodes) if node.is_leaf())
+    first_seen = {}
+    canonical = tuple(first_seen.setdefault(id(node), i) if node.is_leaf() else i for i, node in enumerate(nodes))
+    return EvaluationPlan(
+        statement,
+        root,
+        tuple(nodes[i] for i in leaf_indices),
+        nodes=nodes,
+        parents=parents,
+        ends=ends,
+        leaf_indices=leaf_indices,
+        canonical=canonical,
+    )
+
+
+class PlanCache:
+    """
+    Thread-safe LRU cache of compiled plans.
+
+    Plans are keyed on the statement's token stream and on the identity of
+    the policy and evaluator objects bound to each alias it references, so
+    swapping a wrapper or reloading a policy yields a fresh plan.
+
+    With `stats` (a callable returning a `Metrics.snapshot()`, usually
+    `metrics.snapshot`), plans are compiled with the latest history, so
+    operands are ordered by observed decisiveness, and recompiled once they
+    are older than `recompile_after` seconds as that history grows.
+    """
+    def __init__(self, maxsize: int = 128, stats: Optional[Callable[[], dict]] = None,
+                 recompile_after: float = 300.0):
+        self.maxsize = maxsize
+        self.stats = stats
+        self.recompile_after = recompile_after
+        self._plans: OrderedDict[tuple, tuple[EvaluationPlan, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(statement: str, policy_map: dict[str, Policy], slm_map: dict[str, SLMWrapper]) -> tuple:
+        tokens = tuple(tokenize(statement))
+        bindings = tuple(sorted(
+            (token, id(policy_map.get(token)), id(slm_map.get(token)))
+            for token in set(tokens)
+            if token not in ("(", ")") and token.upper() not in OPERATORS
+        ))
+        return tokens, bindings
+
+    def get(self, statement: str, policy_map: dict[str, Policy], slm_map: dict[str, SLMWrapper]) -> EvaluationPlan:
+        return self._lookup(
+            self._key(statement, policy_map, slm_map),
+            lambda stats: compile_statement(statement, policy_map, slm_map, stats=stats),
+        )
+
+    def get_many(self, statements: dict[str, str], policy_map: dict[str, Policy],
+                 slm_map: dict[str, SLMWrapper]) -> EvaluationPlan:
+        """
+        Like `get`, for a plan compiled with `compile_statements`.
+        """
+        return self._lookup(
+            (ALL, tuple((name, self._key(statement, policy_map, slm_map)) for name, statement in statements.items())),
+            lambda stats: compile_statements(statements, policy_map, slm_map, stats=stats),
+        )
+
+    def _lookup(self, key: tuple, compile_plan: Callable[[Optional[dict]], EvaluationPlan]) -> EvaluationPlan:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._plans.get(key)
+            if entry is not None:
+                self._plans.move_to_end(key)
+                plan, compiled_at = entry
+                if self.stats is None or now - compiled_at < self.recompile_after:
+                    return plan
+                # keep serving this plan to other callers while one recompiles it
+                self._plans[key] = (plan, now)
+
+        plan = compile_plan(self.stats() if self.stats is not None else None)
+
+        with self._lock:
+            self._plans[key] = (plan, now)
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.maxsize:
+                self._plans.popitem(last=False)
+        return plan
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+
+    def __len__(self) -> int:
+        return len(self._plans)
@@ -1,34 +1,62 @@
+import hashlib
 import json
 
-from core.prompt import MASTER_PROMPT
+from core.prompt import INPUT_SECTION, MASTER_PROMPT, VERDICT_PROMPT
+
+# verdict a leaf gets when its evaluation runs out of time
+TIMEOUT_VERDICTS = {"fail_closed": "violation", "fail_open": "compliant"}
+
+
+def render_context(context: dict = None) -> str:
+    """
+    The CONTEXT section appended to a prompt, or "" without context. Every
+    prompt renders it here so they all show the model the same layout.
+    """
+    if not context:
+        return ""
+    return "\n\nCONTEXT:\n" + "\n".join([f"- {k}: {v}" for k, v in context.items()])
 
 
 class Policy:
-    def __init__(self, name: str, alias: str, instruction: str):
+    def __init__(self, name: str, alias: str, instruction: str, on_timeout: str = "fail_closed"):
         self.name = name
         self.alias = alias
         self.instruction = instruction
+        self.on_timeout = on_timeout
+        self.timeout_verdict = TIMEOUT_VERDICTS[on_timeout]
+        self.instruction_hash = hashlib.sha256(instruction.encode("utf8")).hexdigest()[:16]
+
+        # static, per-policy part of the prompt, rendered once
+        self.prefix = MASTER_PROMPT.format(policy_instruction=instruction)
+        self.verdict_prefix = VERDICT_PROMPT.format(policy_instruction=instruction)
 
-    def __call__(self, user_input: str, context: dict = None) -> str:
-        context_str = ""
-        if context:
-            context_str = "\n\nCONTEXT:\n" + "\n".join([f"- {k}: {v}" for k, v in context.items()])
+    def prompt_parts(self, user_input: str, context: dict = None, verdict_only: bool = False) -> tuple[str, str]:
+        """
+        Returns the cacheable prefix and the per-request suffix of the prompt.
+        """
+        prefix = self.verdict_prefix if verdict_only else self.prefix
+        return prefix, INPUT_SECTION.format(text_to_check=user_input) + render_context(context)
 
-        return MASTER_PROMPT.format(
-                    policy_instruction=self.instruction,
-                    text_to_check=user_input
-                ) + context_str
+    def __call__(self, user_input: str, context: dict = None, verdict_only: bool = False) -> str:
+        prefix, suffix = self.prompt_parts(user_input, context=context, verdict_only=verdict_only)
+        return prefix + suffix
     
     def __repr__(self):
         return f"Policy: {self.name}"
     
+    def config_from_dict(data: dict) -> dict[str, "Policy"]:
+        return {
+            policy["alias"]: Policy(
+                policy["name"],
+                policy["alias"],
+                policy["policy_instruction"],
+                on_timeout=policy.get("on_timeout", "fail_closed"),
+            )
+            for _, policy in data["policies"].items()
+        }
+
     def config_with_json(filename)-> dict[str, "Policy"]:
         with open(filename,"r+",encoding='utf8') as file:
-            policies = json.load(file)["policies"]
-    
-        config = {
-            policy["alias"]: Policy(policy["name"], policy["alias"], policy["policy_instruction"])
-            for _, policy in policies.items()
-        }
+            data = json.load(file)
 
-        return config
\ No newline at end of file
+        return Policy.config_from_dict(data)
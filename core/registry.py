@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Callable, Optional
+
+from core.cache import VerdictCache
+from core.plan import OPERATORS, tokenize
+from core.policy import TIMEOUT_VERDICTS, Policy
+
+logger = logging.getLogger("myapp")
+
+
+def validate_config(data) -> None:
+    """
+    Raises `ValueError` describing the first problem in a parsed
+    `policy.json`, so a bad edit is rejected instead of half-applied.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get("policies"), dict):
+        raise ValueError("expected an object with a 'policies' object")
+    aliases, names = set(), set()
+    for key, policy in data["policies"].items():
+        if not isinstance(policy, dict):
+            raise ValueError(f"{key}: expected an object")
+        for field in ("name", "alias", "policy_instruction"):
+            if not isinstance(policy.get(field), str) or not policy[field].strip():
+                raise ValueError(f"{key}: '{field}' must be a non-empty string")
+        alias = policy["alias"]
+        # an alias must survive the statement tokenizer as a single token
+        if tokenize(alias) != [alias] or alias.upper() in OPERATORS:
+            raise ValueError(f"{key}: alias '{alias}' must be letters and underscores not starting with AND, OR or NOT")
+        if policy.get("on_timeout", "fail_closed") not in TIMEOUT_VERDICTS:
+            raise ValueError(f"{key}: 'on_timeout' must be one of {', '.join(TIMEOUT_VERDICTS)}")
+        if alias in aliases:
+            raise ValueError(f"{key}: duplicate alias '{alias}'")
+        if policy["name"] in names:
+            raise ValueError(f"{key}: duplicate name '{policy['name']}'")
+        aliases.add(alias)
+        names.add(policy["name"])
+
+
+def _same(a: Policy, b: Policy) -> bool:
+    return (a.name, a.instruction_hash, a.on_timeout) == (b.name, b.instruction_hash, b.on_timeout)
+
+
+class PolicyRegistry:
+    """
+    The current policies of a `policy.json`, reloaded when the file changes.
+
+    A reload parses and validates the whole file, runs the registered checks
+    and only then replaces `policies` with a new dict in one assignment.
+    Callers read `registry.policies` once per evaluation, so evaluations in
+    flight finish on the plans they were compiled with. Unchanged policies
+    keep their `Policy` objects, which keeps the plans that use them in
+    `PlanCache`, and cached verdicts are dropped only for policies whose
+    instruction changed or that were removed.
+
+    `add_check(fn)` registers a validator that raises to reject a reload;
+    `subscribe(fn)` a callback run with the new policies after the swap.
+    """
+    def __init__(self, path: str, cache: Optional[VerdictCache] = None):
+        self.path = path
+        self.cache = cache
+        self.version = 0
+        self.policies: dict[str, Policy] = {}
+        self._checks: list[Callable[[dict[str, Policy]], None]] = []
+        self._listeners: list[Callable[[dict[str, Policy]], None]] = []
+        self._signature: Optional[tuple] = None
+        self._digest: Optional[str] = None
+        self._lock = threading.Lock()
+        self.reload()
+
+    def add_check(self, check: Callable[[dict[str, Policy]], None]):
+        self._checks.append(check)
+
+    def subscribe(self, listener: Callable[[dict[str, Policy]], None]):
+        self._listeners.append(listener)
+
+    def _parse(self, raw: bytes) -> dict[str, Policy]:
+        data = json.loads(raw)
+        validate_config(data)
+        policies = Policy.config_from_dict(data)
+        for alias, policy in policies.items():
+            previous = self.policies.get(alias)
+            if previous is not None and _same(previous, policy):
+                policies[alias] = previous
+        return policies
+
+    def _invalidate(self, previous: dict[str, Policy], policies: dict[str, Policy]) -> int:
+        if self.cache is None:
+            return 0
+        current = {policy.name: policy for policy in policies.values()}
+        removed = 0
+        for policy in previous.values():
+            new = current.get(policy.name)
+            if new is None:
+                removed += self.cache.invalidate(policy.name)
+            elif new.instruction_hash != policy.instruction_hash:
+                removed += self.cache.invalidate(policy.name, keep_hash=new.instruction_hash)
+        return removed
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Re-reads the file if it changed since the last reload and swaps in
+        the new policies. Returns whether anything was swapped; raises if
+        the new file is invalid, leaving the current policies in place.
+        """
+        with self._lock:
+            stat = os.stat(self.path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+            if not force and signature == self._signature:
+                return False
+            with open(self.path, "rb") as file:
+                raw = file.read()
+            self._signature = signature
+            digest = hashlib.sha256(raw).hexdigest()
+            if not force and digest == self._digest:
+                return False
+
+            policies = self._parse(raw)
+            for check in self._checks:
+                check(policies)
+
+            previous = self.policies
+            self.policies = policies
+            self._digest = digest
+            self.version += 1
+            removed = self._invalidate(previous, policies)
+
+        changed = [alias for alias, policy in policies.items() if previous.get(alias) is not policy]
+        dropped = [alias for alias in previous if alias not in policies]
+        logger.info(
+            "Loaded %s version %d: %d changed, %d removed, %d cached verdicts invalidated",
+            self.path, self.version, len(changed), len(dropped), removed,
+        )
+        for listener in self._listeners:
+            try:
+                listener(policies)
+            except Exception as e:
+                logger.warning("Policy reload listener %r failed: %s", listener, e)
+        return True
+
+    async def watch(self, interval: float = 2.0):
+        """
+        Polls the file every `interval` seconds and reloads it when it
+        changes. Run it as a task on the evaluation loop; cancel it to stop.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.reload()
+            except Exception as e:
+                logger.warning("Keeping policy version %s, could not reload %s: %s", self.version, self.path, e)
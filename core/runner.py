@@ -0,0 +1,89 @@
+import asyncio
+import concurrent.futures
+import logging
+import threading
+from typing import Awaitable, Optional, TypeVar
+
+from core.engine import EvaluationEngine
+from core.plan import EvaluationPlan, EvaluationResult
+
+logger = logging.getLogger("myapp")
+
+T = TypeVar("T")
+
+
+class JudgeRunner:
+    """
+    Synchronous facade over an event loop running on a dedicated background
+    thread.
+
+    Any number of threads (Streamlit sessions, WSGI workers) can call
+    `evaluate` at once: each call is scheduled onto the shared loop with
+    `run_coroutine_threadsafe` and blocks only its own caller, so concurrent
+    evaluations overlap on one loop instead of serializing.
+    """
+    def __init__(self, engine: Optional[EvaluationEngine] = None, default_timeout: Optional[float] = None):
+        self.engine = engine or EvaluationEngine()
+        self.default_timeout = default_timeout
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, name="judge-loop", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.call_soon(self._ready.set)
+        try:
+            self._loop.run_forever()
+        finally:
+            pending = asyncio.all_tasks(self._loop)
+            for task in pending:
+                task.cancel()
+            if pending:
+                self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._loop.run_until_complete(self._loop.shutdown_asyncgens())
+            self._loop.close()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    @property
+    def closed(self) -> bool:
+        return not self._thread.is_alive()
+
+    def submit(self, coro: Awaitable[T]) -> concurrent.futures.Future:
+        if self.closed:
+            raise RuntimeError("JudgeRunner is closed")
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def run(self, coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+        """
+        Runs `coro` on the runner's loop and blocks until it finishes. On
+        timeout the coroutine is cancelled and `TimeoutError` is raised.
+        """
+        future = self.submit(coro)
+        try:
+            return future.result(timeout if timeout is not None else self.default_timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError("Evaluation timed out")
+
+    def evaluate(self, plan: EvaluationPlan, user_input, context: dict = None, timeout: Optional[float] = None,
+                 explain: bool = False) -> EvaluationResult:
+        return self.run(self.engine.run(plan, user_input, context=context, explain=explain), timeout=timeout)
+
+    def close(self, timeout: float = 5.0):
+        if self.closed:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning("Judge event loop did not stop in time")
+
+    def __enter__(self) -> "JudgeRunner":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -1,65 +1,333 @@
+import asyncio
+import hashlib
 import json
 import logging
+import time
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Optional
 
 from google import genai
 from pydantic import BaseModel
 
-from core.policy import Policy
+from core.cache import SingleFlight, VerdictCache
+from core.hedging import is_hedge
+from core.limiter import RateLimiter, is_rate_limit_error
+from core.policy import Policy, render_context
+from core.prompt import MULTI_POLICY_ENTRY, MULTI_POLICY_PROMPT
+from core.tracing import add_time, current_span, mark_cache_hit
 
 logger = logging.getLogger("myapp")
 
+_reasons: ContextVar[Optional[dict]] = ContextVar("judge_reasons", default=None)
+
+
+def collect_reasons(reasons: dict):
+    """
+    Has full answers parsed in this task, and in the tasks it spawns, keep
+    their reasoning in `reasons` by policy name. Returns the token for
+    `stop_collecting`.
+    """
+    return _reasons.set(reasons)
+
+
+def stop_collecting(token):
+    _reasons.reset(token)
+
+
+def record_reason(policy_name: str, parsed: dict):
+    reasons = _reasons.get()
+    if reasons is not None:
+        reasons[policy_name] = parsed
+
 
 class Compliance(BaseModel):
     compliance: bool
     violation_reason: str
     highlighted_text: str
 
+def to_verdict(compliant_value) -> str:
+    # Handle both string ("true"/"false") and boolean (True/False) responses
+    compliant_str = str(compliant_value).lower()
+
+    if compliant_str == "true":
+        return "compliant"
+    elif compliant_str == "false":
+        return "violation"
+    else:
+        return "unknown"
+
+
+def strip_json(response: str, opening: str, closing: str) -> str:
+    """
+    Cuts a JSON value out of a model response, dropping markdown fences or
+    chatter around it.
+    """
+    start = response.find(opening)
+    end = response.rfind(closing)
+    if start == -1 or end < start:
+        raise json.JSONDecodeError("No JSON value in response", response, 0)
+    return response[start:end + 1]
+
+
 class SLMWrapper:
-    def __init__(self, name: str, client:genai.Client, model:str):
+    """
+    With `verdict_only` set, leaves ask for the bare `compliant` field under
+    a `max_output_tokens` cap; `explain` fetches the full reasoning later for
+    the leaves that need it. Full answers already carry their reasoning,
+    which is handed to whoever is collecting it (see `collect_reasons`).
+
+    With `context_cache` set, each policy's static prompt prefix is
+    registered once as provider-side cached content and later calls send only
+    the per-request suffix. Until a prefix is cached, calls send the whole
+    prompt; a failed attempt to cache it (e.g. a model without caching
+    support) is retried after `context_cache_retry` seconds.
+
+    Given a `single_flight`, concurrent identical calls (same model, policy,
+    input and context) share one request; hedged duplicates bypass it.
+    """
+    def __init__(self, name: str, client:genai.Client, model:str, cache: Optional[VerdictCache] = None,
+                 limiter: Optional[RateLimiter] = None, verdict_only: bool = False, max_output_tokens: int = 16,
+                 context_cache: bool = False, context_cache_ttl: int = 3600, context_cache_retry: float = 60.0,
+                 single_flight: Optional[SingleFlight] = None):
         self.name = name
         self.client = client  # this can be the SDK instance
         self.model = model
+        self.cache = cache
+        self.limiter = limiter
+        self.verdict_only = verdict_only
+        self.max_output_tokens = max_output_tokens
+        self.context_cache = context_cache
+        self.context_cache_ttl = context_cache_ttl
+        self.context_cache_retry = context_cache_retry
+        self.single_flight = single_flight
+        self._prefix_caches: dict[str, asyncio.Future] = {}
+        self._prefix_retry_at: dict[str, float] = {}
+
+    async def limited(self, fn, *args, **kwargs):
+        """
+        Single point through which every wrapper reaches the SDK, so the
+        model's limiter sees all of its traffic.
+        """
+        span = current_span()
+        if span is not None:
+            span.model = span.model or self.model
+            fn = span.timed(fn)
+        if self.limiter is None:
+            return await fn(*args, **kwargs)
+        return await self.limiter.call(fn, *args, **kwargs)
+
+    async def request(self, contents: list, **kwargs):
+        return await self.limited(self.client.aio.models.generate_content, model=self.model, contents=contents, **kwargs)
+
+    async def _create_prefix_cache(self, key: str, prefix: str) -> Optional[str]:
+        try:
+            cached = await self.limited(
+                self.client.aio.caches.create,
+                model=self.model,
+                config={"contents": [prefix], "ttl": f"{self.context_cache_ttl}s"},
+            )
+        except Exception as e:
+            # a failure may be transient, so it only holds off new attempts for a while
+            logger.info("%s --> context caching unavailable for %s, retrying in %ss: %s",
+                        self.name, self.model, self.context_cache_retry, e)
+            self._prefix_caches.pop(key, None)
+            self._prefix_retry_at[key] = time.monotonic() + self.context_cache_retry
+            return None
+        return cached.name
+
+    async def _prefix_cache(self, key: str, prefix: str) -> Optional[str]:
+        task = self._prefix_caches.get(key)
+        if task is None:
+            if time.monotonic() < self._prefix_retry_at.get(key, 0.0):
+                return None
+            task = self._prefix_caches[key] = asyncio.ensure_future(self._create_prefix_cache(key, prefix))
+        return await asyncio.shield(task)
+
+    async def request_policy(self, policy: Policy, user_input: str, context: dict = None,
+                             verdict_only: bool = False, config: Optional[dict] = None,
+                             send: Optional[Callable[..., Awaitable]] = None):
+        """
+        Sends `policy`'s prompt for `user_input`, referring to the cached
+        prefix instead of re-sending it when context caching is on. `send`
+        replaces `request` for callers that read the answer differently,
+        e.g. as a stream.
+        """
+        send = send or self.request
+        prefix, suffix = policy.prompt_parts(user_input, context=context, verdict_only=verdict_only)
+        kwargs = {"config": config} if config else {}
+        if not self.context_cache:
+            return await send([prefix + suffix], **kwargs)
+
+        key = hashlib.sha256(prefix.encode("utf8")).hexdigest()
+        cached_name = await self._prefix_cache(key, prefix)
+        if cached_name is None:
+            return await send([prefix + suffix], **kwargs)
+        try:
+            return await send([suffix], config={**(config or {}), "cached_content": cached_name})
+        except Exception as e:
+            if is_rate_limit_error(e):
+                raise
+            # the cached prefix may have expired server-side; rebuild it next time
+            logger.info("%s --> cached prefix rejected, sending full prompt: %s", self.name, e)
+            self._prefix_caches.pop(key, None)
+            return await send([prefix + suffix], **kwargs)
 
     async def evaluate_policy(self, policy: Policy, user_input: str, context: dict = None) -> str:
-        prompt = policy(user_input, context=context)
-        response = await self.client.aio.models.generate_content(
-            model=self.model,
-            contents=[prompt],
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key(self.model, policy, user_input, context)
+            cached = self.cache.get(key)
+            if cached is not None:
+                mark_cache_hit(self.model)
+                return policy.name, cached
+
+        if self.single_flight is None or is_hedge():
+            return await self._evaluate_uncached(policy, user_input, context, key)
+        return await self.single_flight.run(
+            key or VerdictCache.make_key(self.model, policy, user_input, context),
+            lambda: self._evaluate_uncached(policy, user_input, context, key),
+        )
+
+    async def _evaluate_uncached(self, policy: Policy, user_input: str, context: Optional[dict],
+                                 key: Optional[tuple]) -> tuple[str, str]:
+        policy_name, result = await self._generate(policy, user_input, context)
+
+        # "unknown" usually means a malformed response; retry it next time
+        if key is not None and result != "unknown":
+            self.cache.set(key, result)
+        return policy_name, result
+
+    async def _generate(self, policy: Policy, user_input: str, context: dict = None) -> str:
+        if self.verdict_only:
+            response = await self.request_policy(
+                policy, user_input, context=context, verdict_only=True,
+                config={"max_output_tokens": self.max_output_tokens},
+            )
+            parse_started = time.perf_counter()
+            verdict = self._parse_verdict(response.text)
+            add_time("parse_time", parse_started)
+            return policy.name, verdict
+
+        response = await self.request_policy(
+            policy, user_input, context=context,
             # config={
             #     "response_mime_type": "application/json",
             #     "response_schema": Compliance,
             # }
         )
 
-        return policy.name, self._parse_response(response.text)
+        parse_started = time.perf_counter()
+        verdict = self._parse_response(response.text, policy.name)
+        add_time("parse_time", parse_started)
+        return policy.name, verdict
 
 
-    def _parse_response(self, response: str) -> str:
+    def _parse_response(self, response: str, policy_name: Optional[str] = None) -> str:
         try:
             response = response[7:-3].strip()
 
             parsed = json.loads(response)
 
-            logger.info(f"{self.name} --> {parsed['compliant']}, reason: {parsed['violation_reason']}")
+            logger.info("%s --> %s, reason: %s", self.name, parsed['compliant'], parsed['violation_reason'])
+            if policy_name is not None:
+                record_reason(policy_name, parsed)
 
-            # Handle both string ("true"/"false") and boolean (True/False) responses
-            compliant_value = parsed.get("compliant")
+            return to_verdict(parsed.get("compliant"))
+        except (json.JSONDecodeError, AttributeError):
+            return "unknown"
 
-            # Convert to lowercase string for comparison
-            if isinstance(compliant_value, bool):
-                compliant_str = str(compliant_value).lower()
-            else:
-                compliant_str = str(compliant_value).lower()
 
-            if compliant_str == "true":
-                return "compliant"
-            elif compliant_str == "false":
-                return "violation"
-            else:
-                return "unknown"
+    def _parse_verdict(self, response: str) -> str:
+        try:
+            parsed = json.loads(strip_json(response, "{", "}"))
+            logger.info("%s --> %s", self.name, parsed.get('compliant'))
+            return to_verdict(parsed.get("compliant"))
         except (json.JSONDecodeError, AttributeError):
             return "unknown"
 
+    async def explain(self, policy: Policy, user_input: str, context: dict = None) -> dict:
+        """
+        Asks for the full verdict with `violation_reason` and
+        `highlighted_text`. Returns an empty dict if the answer can't be parsed.
+        """
+        response = await self.request_policy(policy, user_input, context=context)
+        try:
+            parsed = json.loads(strip_json(response.text, "{", "}"))
+        except (json.JSONDecodeError, AttributeError):
+            return {}
+        return parsed if isinstance(parsed, dict) else {}
 
     async def __call__(self, policy: Policy, user_input: str, context: dict = None) -> str:
-        return await self.evaluate_policy(policy, user_input, context=context)
\ No newline at end of file
+        return await self.evaluate_policy(policy, user_input, context=context)
+
+
+class MultiPolicySLMWrapper(SLMWrapper):
+    """
+    Scores several policies against one input in a single SLM request.
+
+    `evaluate_policies` returns a verdict for every policy it could parse
+    out of the response; callers fall back to per-policy calls for the rest.
+    Cached verdicts are served without being re-sent.
+    """
+
+    def build_prompt(self, policies: list[Policy], user_input: str, context: dict = None) -> str:
+        entries = "\n".join(
+            MULTI_POLICY_ENTRY.format(policy_name=policy.name, policy_instruction=policy.instruction)
+            for policy in policies
+        )
+        return MULTI_POLICY_PROMPT.format(
+            policy_instructions=entries,
+            text_to_check=user_input
+        ) + render_context(context)
+
+    async def evaluate_policies(self, policies: list[Policy], user_input: str, context: dict = None) -> dict[str, str]:
+        verdicts = {}
+        keys = {}
+        to_send = []
+        for policy in {policy.name: policy for policy in policies}.values():
+            if self.cache is not None:
+                keys[policy.name] = self.cache.make_key(self.model, policy, user_input, context)
+                cached = self.cache.get(keys[policy.name])
+                if cached is not None:
+                    mark_cache_hit(self.model)
+                    verdicts[policy.name] = cached
+                    continue
+            to_send.append(policy)
+
+        if not to_send:
+            return verdicts
+
+        response = await self.request([self.build_prompt(to_send, user_input, context)])
+        parse_started = time.perf_counter()
+        parsed = self._parse_multi_response(response.text, {policy.name for policy in to_send})
+        add_time("parse_time", parse_started)
+
+        for policy_name, verdict in parsed.items():
+            verdicts[policy_name] = verdict
+            if policy_name in keys and verdict != "unknown":
+                self.cache.set(keys[policy_name], verdict)
+
+        missing = [policy.name for policy in to_send if policy.name not in parsed]
+        if missing:
+            logger.warning("%s --> no usable verdict for %s, falling back to per-policy calls", self.name, missing)
+        return verdicts
+
+    def _parse_multi_response(self, response: str, expected: set[str]) -> dict[str, str]:
+        try:
+            items = json.loads(strip_json(response, "[", "]"))
+        except (json.JSONDecodeError, AttributeError, TypeError):
+            return {}
+        if not isinstance(items, list):
+            return {}
+
+        verdicts = {}
+        for item in items:
+            if not isinstance(item, dict) or item.get("policy") not in expected:
+                continue
+            verdict = to_verdict(item.get("compliant"))
+            # an "unknown" is treated like a parse failure so the policy is retried on its own
+            if verdict != "unknown":
+                verdicts[item["policy"]] = verdict
+                record_reason(item["policy"], item)
+            logger.info("%s[%s] --> %s, reason: %s", self.name, item['policy'], item.get('compliant'), item.get('violation_reason'))
+        return verdicts
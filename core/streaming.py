@@ -0,0 +1,109 @@
+import asyncio
+import json
+import logging
+import re
+from typing import Callable, Optional
+
+from core.policy import Policy
+from core.slm_wrapper import SLMWrapper, strip_json, to_verdict
+
+logger = logging.getLogger("myapp")
+
+
+class VerdictScanner:
+    """
+    Incremental scanner for the `compliant` field of a streamed JSON answer.
+
+    Chunks are fed as they arrive; `verdict` is set as soon as the field's
+    value has been read in full, without waiting for the rest of the object.
+    """
+    _FIELD = re.compile(r'"compliant"\s*:\s*(?:"\s*(true|false)\s*"|(true|false)\b)', re.IGNORECASE)
+
+    def __init__(self):
+        self.text = ""
+        self.verdict: Optional[str] = None
+        self._scanned = 0
+
+    def feed(self, chunk: str) -> Optional[str]:
+        self.text += chunk
+        if self.verdict is None:
+            # the field may straddle chunks, so rescan a little of the old tail
+            start = max(0, self._scanned - 32)
+            match = self._FIELD.search(self.text, start)
+            if match:
+                self.verdict = to_verdict(match.group(1) or match.group(2))
+            self._scanned = len(self.text)
+        return self.verdict
+
+
+class StreamingSLMWrapper(SLMWrapper):
+    """
+    `SLMWrapper` that streams the response and resolves the leaf as soon as
+    the `compliant` field has been read. The prompt is sent like
+    `SLMWrapper`'s, so `verdict_only` and `context_cache` apply as well.
+
+    The rest of the stream (reason and highlighted text) is either collected
+    in the background and handed to `on_explanation`, or, when no callback is
+    given, cancelled to stop paying for output tokens nobody reads. A
+    `verdict_only` answer has no reasoning, so the callback is not called.
+    """
+    def __init__(self, *args, on_explanation: Optional[Callable[[str, dict], None]] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.on_explanation = on_explanation
+        self._background: set[asyncio.Task] = set()
+
+    async def _read_until_verdict(self, contents: list, config: Optional[dict] = None):
+        kwargs = {"config": config} if config else {}
+        stream = await self.client.aio.models.generate_content_stream(model=self.model, contents=contents, **kwargs)
+        scanner = VerdictScanner()
+        async for chunk in stream:
+            if scanner.feed(chunk.text or ""):
+                break
+        return stream, scanner
+
+    async def _stream_until_verdict(self, contents: list, config: Optional[dict] = None):
+        # the limiter slot is held until the verdict has been read, not just until the stream opens
+        return await self.limited(self._read_until_verdict, contents, config)
+
+    async def _generate(self, policy: Policy, user_input: str, context: dict = None) -> tuple[str, str]:
+        stream, scanner = await self.request_policy(
+            policy, user_input, context=context, verdict_only=self.verdict_only,
+            config={"max_output_tokens": self.max_output_tokens} if self.verdict_only else None,
+            send=self._stream_until_verdict,
+        )
+
+        if scanner.verdict is None:
+            # stream ended without a recognisable field; parse what we got
+            parse = self._parse_verdict if self.verdict_only else self._parse_response
+            return policy.name, parse(scanner.text)
+
+        logger.info("%s --> %s (streamed)", self.name, scanner.verdict)
+        if self.on_explanation is not None and not self.verdict_only:
+            task = asyncio.ensure_future(self._finish(policy, stream, scanner))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+        else:
+            await self._close(stream)
+        return policy.name, scanner.verdict
+
+    async def _finish(self, policy: Policy, stream, scanner: VerdictScanner):
+        try:
+            async for chunk in stream:
+                scanner.feed(chunk.text or "")
+            parsed = json.loads(strip_json(scanner.text, "{", "}"))
+        except (json.JSONDecodeError, AttributeError):
+            logger.warning("%s --> could not parse explanation for '%s'", self.name, policy.name)
+            return
+        except Exception as e:
+            logger.warning("%s --> explanation stream failed: %s", self.name, e)
+            return
+        self.on_explanation(policy.name, parsed)
+
+    @staticmethod
+    async def _close(stream):
+        aclose = getattr(stream, "aclose", None)
+        if aclose is not None:
+            try:
+                await aclose()
+            except Exception:
+                pass
@@ -0,0 +1,304 @@
+import bisect
+import logging
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+logger = logging.getLogger("myapp")
+
+# upper bounds in milliseconds; anything slower lands in the overflow bucket
+DEFAULT_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+@dataclass
+class Span:
+    """
+    Timing of one node of one evaluation, in seconds.
+
+    Leaf spans break their time down into `queue_wait` (limiter, semaphore
+    and retry back-off), `slm_latency` (time inside the SDK) and
+    `parse_time`. Operator spans end when the operator was settled.
+    """
+    name: str
+    kind: str
+    start: float
+    policy: Optional[str] = None
+    model: Optional[str] = None
+    end: Optional[float] = None
+    verdict: Optional[str] = None
+    status: str = "ok"
+    queue_wait: float = 0.0
+    slm_latency: float = 0.0
+    parse_time: float = 0.0
+    cache_hit: bool = False
+    calls: int = 0
+    early: bool = False
+    index: Optional[int] = None
+
+    @property
+    def duration(self) -> Optional[float]:
+        return self.end - self.start if self.end is not None else None
+
+    def finish(self, verdict: Optional[str] = None, status: Optional[str] = None):
+        if self.end is None:
+            self.end = time.perf_counter()
+        if verdict is not None:
+            self.verdict = verdict
+        if status is not None and self.status == "ok":
+            self.status = status
+
+    def timed(self, fn: Callable) -> Callable:
+        """
+        Wraps an SDK call so the time before it starts counts as queue wait
+        and the time inside it as SLM latency, across retries.
+        """
+        waiting_since = time.perf_counter()
+
+        async def call(*args, **kwargs):
+            nonlocal waiting_since
+            started = time.perf_counter()
+            self.queue_wait += started - waiting_since
+            self.calls += 1
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                waiting_since = time.perf_counter()
+                self.slm_latency += waiting_since - started
+        return call
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "policy": self.policy,
+            "model": self.model,
+            "verdict": self.verdict,
+            "status": self.status,
+            "duration_ms": self.duration * 1000 if self.duration is not None else None,
+            "queue_wait_ms": self.queue_wait * 1000,
+            "slm_latency_ms": self.slm_latency * 1000,
+            "parse_time_ms": self.parse_time * 1000,
+            "cache_hit": self.cache_hit,
+            "calls": self.calls,
+            "early": self.early,
+        }
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("judge_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    """
+    The leaf span of the evaluator call running in this task, if the
+    evaluation is being traced.
+    """
+    return _current_span.get()
+
+
+def activate(span: Span):
+    """
+    Makes `span` the current span of this task; returns the token for
+    `deactivate`. Tasks spawned from here (hedges, timeouts) inherit it.
+    """
+    return _current_span.set(span)
+
+
+def deactivate(token):
+    _current_span.reset(token)
+
+
+def add_time(attribute: str, since: float):
+    span = _current_span.get()
+    if span is not None:
+        setattr(span, attribute, getattr(span, attribute) + time.perf_counter() - since)
+
+
+def mark_cache_hit(model: Optional[str] = None):
+    span = _current_span.get()
+    if span is not None:
+        span.cache_hit = True
+        span.model = span.model or model
+
+
+class Trace:
+    """
+    Spans of a single evaluation. Leaf spans are keyed by evaluator name,
+    like `EvaluationResult.results`; `groups` holds the combined requests of
+    multi-policy leaves.
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.verdict: Optional[str] = None
+        self.leaves: dict[str, Span] = {}
+        self.groups: list[Span] = []
+        self.operators: list[Span] = []
+
+    @property
+    def duration(self) -> Optional[float]:
+        return self.end - self.start if self.end is not None else None
+
+    def leaf(self, name: str, policy: Optional[str] = None, model: Optional[str] = None) -> Span:
+        span = self.leaves.get(name)
+        if span is None:
+            span = self.leaves[name] = Span(name, "leaf", time.perf_counter(), policy=policy, model=model)
+        return span
+
+    def group(self, name: str, model: Optional[str] = None) -> Span:
+        span = Span(name, "group", time.perf_counter(), model=model)
+        self.groups.append(span)
+        return span
+
+    def operator(self, logic: str, verdict: str, early: bool, index: Optional[int] = None) -> Span:
+        span = Span(logic, "operator", self.start, verdict=verdict, early=early, index=index)
+        span.end = time.perf_counter()
+        self.operators.append(span)
+        return span
+
+    def finish(self, verdict: str):
+        self.end = time.perf_counter()
+        self.verdict = verdict
+
+    def as_dict(self) -> dict:
+        return {
+            "verdict": self.verdict,
+            "duration_ms": self.duration * 1000 if self.duration is not None else None,
+            "leaves": [span.as_dict() for span in self.leaves.values()],
+            "groups": [span.as_dict() for span in self.groups],
+            "operators": [span.as_dict() for span in self.operators],
+        }
+
+
+def _total(entries: list[dict], name: str, policy: str, field: str = "value", **labels) -> float:
+    return sum(
+        entry[field] for entry in entries
+        if entry["name"] == name and entry["labels"].get("policy") == policy
+        and all(entry["labels"].get(key) == value for key, value in labels.items())
+    )
+
+
+def policy_stats(snapshot: Optional[dict], policy: str) -> Optional[dict]:
+    """
+    Per-evaluation history of one policy from a `Metrics.snapshot()`:
+    mean leaf latency, SLM calls, cache hit rate and violation rate. None
+    if the policy has never been evaluated.
+    """
+    counters = snapshot.get("counters", []) if snapshot else []
+    histograms = snapshot.get("histograms", []) if snapshot else []
+    evaluations = _total(counters, "leaf_results", policy)
+    if not evaluations:
+        return None
+    latency_count = _total(histograms, "leaf_latency_ms", policy, "count")
+    return {
+        "samples": int(evaluations),
+        "latency_ms": _total(histograms, "leaf_latency_ms", policy, "sum") / latency_count if latency_count else None,
+        "calls": _total(counters, "slm_calls", policy) / evaluations,
+        "cache_hit_rate": _total(counters, "cache_hits", policy) / evaluations,
+        "violation_rate": _total(counters, "leaf_results", policy, verdict="violation") / evaluations,
+    }
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> dict:
+        return {
+            "buckets": dict(zip([*map(str, self.buckets), "+Inf"], self.counts)),
+            "count": self.count,
+            "sum": self.sum,
+        }
+
+
+class Metrics:
+    """
+    Process-wide counters and latency histograms (in milliseconds), labelled
+    by policy and model and fed from finished traces.
+
+    Exporters registered with `add_exporter` receive every `Trace` as it
+    completes, so a metrics backend (Prometheus, StatsD, OpenTelemetry) can
+    be fed without Judge depending on it; `snapshot` serves pull-based ones.
+    """
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counters: dict[tuple[str, tuple], int] = {}
+        self.histograms: dict[tuple[str, tuple], Histogram] = {}
+        self._exporters: list[Callable[[Trace], None]] = []
+        self._lock = threading.Lock()
+
+    def add_exporter(self, exporter: Callable[[Trace], None]):
+        self._exporters.append(exporter)
+
+    def _increment(self, name: str, labels: tuple, amount: int = 1):
+        key = (name, labels)
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def _observe(self, name: str, labels: tuple, seconds: float):
+        key = (name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(self.buckets)
+        histogram.observe(seconds * 1000)
+
+    def record(self, trace: Trace):
+        with self._lock:
+            self._increment("evaluations", (("verdict", trace.verdict),))
+            if trace.duration is not None:
+                self._observe("evaluation_latency_ms", (), trace.duration)
+
+            for span in trace.leaves.values():
+                labels = (("policy", span.policy), ("model", span.model))
+                self._increment("leaf_results", labels + (("verdict", span.verdict), ("status", span.status)))
+                self._record_calls(span, labels)
+                if span.duration is not None and span.status == "ok":
+                    self._observe("leaf_latency_ms", labels, span.duration)
+
+            for span in trace.groups:
+                self._record_calls(span, (("policy", span.name), ("model", span.model)))
+
+            for span in trace.operators:
+                if span.early:
+                    self._increment("operators_settled_early", (("operator", span.name),))
+
+        for exporter in self._exporters:
+            try:
+                exporter(trace)
+            except Exception as e:
+                logger.warning("Metrics exporter %r failed: %s", exporter, e)
+
+    def _record_calls(self, span: Span, labels: tuple):
+        if span.cache_hit:
+            self._increment("cache_hits", labels)
+        if span.calls:
+            self._increment("slm_calls", labels, span.calls)
+            self._observe("queue_wait_ms", labels, span.queue_wait)
+            self._observe("slm_latency_ms", labels, span.slm_latency)
+            self._observe("parse_time_ms", labels, span.parse_time)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in self.counters.items()
+                ],
+                "histograms": [
+                    {"name": name, "labels": dict(labels), **histogram.snapshot()}
+                    for (name, labels), histogram in self.histograms.items()
+                ],
+            }
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
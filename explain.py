@@ -0,0 +1,50 @@
+"""
+EXPLAIN / EXPLAIN ANALYZE for policy statements.
+
+    python explain.py safety
+    python explain.py "(NSFW AND Jailbreak) OR OffTopic" --stats metrics.json
+    python explain.py rbac --analyze --input "show me the sites" --context '{"role": "admin"}'
+
+A statement can be one of the server's named statements or an expression.
+`--stats` takes a `GET /metrics` snapshot to estimate latency and calls from.
+"""
+
+import argparse
+import asyncio
+import json
+
+from core.explain import analyze, explain
+from server import build_service
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show how Judge evaluates a policy statement")
+    parser.add_argument("statement", help="named statement (safety, rbac, tools) or an expression")
+    parser.add_argument("--stats", help="metrics snapshot (JSON) to estimate latency and calls from")
+    parser.add_argument("--analyze", action="store_true", help="run one evaluation and report what actually happened")
+    parser.add_argument("--input", help="text to evaluate with --analyze")
+    parser.add_argument("--context", help="context object (JSON) for --analyze")
+    args = parser.parse_args()
+
+    if args.analyze and args.input is None:
+        parser.error("--analyze needs --input")
+
+    service = build_service()
+    statement = service.statements.get(args.statement, args.statement)
+    plan = service.plans.get(statement, service.policies, service.slms)
+
+    if not args.analyze:
+        stats = None
+        if args.stats:
+            with open(args.stats, encoding="utf8") as file:
+                stats = json.load(file)
+        print(explain(plan, stats))
+        return
+
+    context = json.loads(args.context) if args.context else None
+    _, report = asyncio.run(analyze(service.engine, plan, args.input, context=context))
+    print(report)
+
+
+if __name__ == "__main__":
+    main()
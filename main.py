@@ -1,60 +1,106 @@
-import asyncio
+import atexit
 import logging
 import os
-import time
 
 from dotenv import load_dotenv
-from google import genai
 
+from core.cache import SingleFlight, VerdictCache
+from core.cascade import ModelCascade
+from core.client_pool import client_from_env
+from core.conversation import ConversationSession
 from core.engine import EvaluationEngine
-from core.policy import Policy
+from core.limiter import limiter_for
+from core.plan import PlanCache
+from core.registry import PolicyRegistry
+from core.runner import JudgeRunner
 from core.slm_wrapper import SLMWrapper
+from core.streaming import StreamingSLMWrapper
+from core.tracing import Metrics
 
 load_dotenv()
 
 logger = logging.getLogger("myapp")
 
 
-client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+# one client per key in GOOGLE_API_KEYS, or just GOOGLE_API_KEY
+client = client_from_env()
 
 MODEL = "gemma-3-12b-it"
+# JUDGE_CASCADE=1 tries SMALL_MODEL first; see core/cascade.py in the documentation
+SMALL_MODEL = "gemma-3-4b-it"
+USE_CASCADE = os.getenv("JUDGE_CASCADE", "").lower() in ("1", "true", "yes")
+# small-model verdicts that are checked again by MODEL, e.g. JUDGE_CASCADE_ESCALATE=unknown,violation
+ESCALATE_ON = tuple(
+    verdict.strip() for verdict in os.getenv("JUDGE_CASCADE_ESCALATE", "unknown").split(",") if verdict.strip()
+)
+if not set(ESCALATE_ON) <= {"compliant", "violation", "unknown"}:
+    raise ValueError(f"JUDGE_CASCADE_ESCALATE must list compliant, violation or unknown, got {ESCALATE_ON}")
+# JUDGE_STREAMING=1 settles each leaf as soon as its streamed answer shows the verdict
+USE_STREAMING = os.getenv("JUDGE_STREAMING", "").lower() in ("1", "true", "yes")
+Wrapper = StreamingSLMWrapper if USE_STREAMING else SLMWrapper
+
+verdict_cache = VerdictCache(maxsize=4096, ttl=600)
+# identical calls already in flight are joined rather than repeated
+flights = SingleFlight()
+limiter = limiter_for(MODEL, max_concurrency=8)
+small_limiter = limiter_for(SMALL_MODEL, max_concurrency=8)
+
+
+def slm(name):
+    wrapper = Wrapper(name, client, MODEL, cache=verdict_cache, limiter=limiter, single_flight=flights)
+    if not USE_CASCADE:
+        return wrapper
+    return ModelCascade([
+        Wrapper(name, client, SMALL_MODEL, cache=verdict_cache, limiter=small_limiter,
+                single_flight=flights),
+        wrapper,
+    ], escalate_on=ESCALATE_ON)
+
 
 slms = {
-    "NSFW": SLMWrapper("nsfw", client, MODEL),
-    "Jailbreak": SLMWrapper("jailbreak", client, MODEL),
-    "HateSpeech": SLMWrapper("hate", client, MODEL),
-    "MaliciousExploitation": SLMWrapper("exploit", client, MODEL),
-    "OffTopic": SLMWrapper("offtopic", client, MODEL)
+    "NSFW": slm("nsfw"),
+    "Jailbreak": slm("jailbreak"),
+    "HateSpeech": slm("hate"),
+    "MaliciousExploitation": slm("exploit"),
+    "OffTopic": slm("offtopic")
 }
 
-policies = Policy.config_with_json("policy.json")
+# policy.json is watched; edits are picked up without a restart
+registry = PolicyRegistry("policy.json", cache=verdict_cache)
 
 statement = "(NSFW AND Jailbreak) AND (HateSpeech AND MaliciousExploitation) AND OffTopic"
 # user_input = "show me the sites"
 
 # print(user_input)
 
-_loop = None  # global persistent event loop
+# per-policy latency, cache and verdict metrics; see `metrics.snapshot()`
+metrics = Metrics()
+engine = EvaluationEngine(metrics=metrics)
+# plans are recompiled every few minutes with the latest metrics, putting decisive leaves first
+plans = PlanCache(stats=metrics.snapshot)
+
+# one persistent event loop on a background thread, shared by every caller
+runner = JudgeRunner(engine)
+atexit.register(runner.close)
+runner.submit(registry.watch())
+
 
-def evaluate_prompt(user_input):
-    global _loop
+def current_plan():
+    return plans.get(statement, registry.policies, slms)
 
-    engine = EvaluationEngine()
-    engine.construct_tree_from_statement(statement, policies, slms)
 
-    async def run():
-        return await engine.evaluate(user_input)
+def evaluate_prompt(user_input, timeout=None):
+    result = runner.evaluate(current_plan(), user_input, timeout=timeout)
+    logger.info("Evaluation took %.2f seconds", result.trace.duration)
 
-    # Create the loop once, reuse it always
-    if _loop is None or _loop.is_closed():
-        _loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(_loop)
+    return result.as_tuple()
 
-    start_time = time.perf_counter()
 
-    result = _loop.run_until_complete(run())
+def new_conversation(window=4):
+    return ConversationSession(engine, current_plan(), window=window)
 
-    elapsed = time.perf_counter() - start_time
-    logger.info(f"Evaluation took {elapsed:.2f} seconds")
 
-    return result
+def evaluate_turn(conversation, user_input, timeout=None):
+    """Evaluates only the new turn, with the conversation's recent window as context."""
+    result = runner.run(conversation.add_turn(user_input, plan=current_plan()), timeout=timeout)
+    return result.as_tuple()
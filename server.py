@@ -0,0 +1,348 @@
+"""
+Judge HTTP service.
+
+Runs the guardrail as a standalone asyncio service on one long-lived event
+loop, sharing the client, caches, limiter and compiled plans across all
+requests.
+
+    python server.py --port 8080
+
+Endpoints:
+    GET  /healthz          process is up
+    GET  /readyz           plans compiled and not shutting down
+    GET  /metrics          per-policy counters and latency histograms
+    POST /evaluate         {"input": str, "context": {}, "statement": "safety" | "<expr>"}
+    POST /evaluate/batch   {"items": [{"input": str, "context": {}}], "statement": ...}
+
+Either endpoint takes "statements": ["safety", "rbac", ...] instead of
+"statement" to get a verdict per statement, with shared policies called once.
+
+policy.json is watched while the service runs: valid edits are swapped in
+without a restart, and only the changed policies lose their cached verdicts.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+from http import HTTPStatus
+from typing import Optional
+
+from dotenv import load_dotenv
+
+from core.cache import SingleFlight, VerdictCache
+from core.client_pool import client_from_env
+from core.engine import EvaluationEngine
+from core.limiter import is_rate_limit_error, limiter_for
+from core.plan import OPERATORS, EvaluationResult, PlanCache, tokenize
+from core.policy import Policy
+from core.registry import PolicyRegistry
+from core.slm_wrapper import SLMWrapper
+from core.tracing import Metrics
+
+load_dotenv()
+
+logger = logging.getLogger("myapp")
+
+MODEL = "gemma-3-12b-it"
+
+STATEMENTS = {
+    "safety": "(NSFW AND Jailbreak) AND (HateSpeech AND MaliciousExploitation) AND OffTopic",
+    "rbac": "(IsAuthorized AND SafeQuery) AND NoPrivilegeEscalation",
+    "tools": "IsAllowedTool AND NoToolChaining",
+}
+DEFAULT_STATEMENT = "safety"
+
+MAX_BODY = 1 << 20
+MAX_BATCH = 256
+# longest ad-hoc statement accepted; compiling runs on the event loop, so its size is bounded up front
+MAX_STATEMENT_LENGTH = 4096
+# seconds a connection may sit without sending a full request; keeps idle keep-alives from holding up shutdown
+READ_TIMEOUT = 15.0
+
+
+class HTTPError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class JudgeService:
+    def __init__(self, policies: dict[str, Policy], slms: dict[str, SLMWrapper], engine: EvaluationEngine,
+                 statements: dict[str, str], metrics: Optional[Metrics] = None,
+                 registry: Optional[PolicyRegistry] = None):
+        self.policies = policies
+        self.slms = slms
+        self.engine = engine
+        self.statements = statements
+        self.metrics = metrics
+        self.registry = registry
+        self.plans = PlanCache(stats=metrics.snapshot if metrics is not None else None)
+        self.ready = False
+        self.in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        if registry is not None:
+            registry.add_check(self.check_policies)
+            registry.subscribe(self.use_policies)
+
+    def _compile(self):
+        for statement in self.statements.values():
+            self.plans.get(statement, self.policies, self.slms)
+        self.plans.get_many(self.statements, self.policies, self.slms)
+
+    def warm_up(self):
+        self._compile()
+        self.ready = True
+
+    def check_policies(self, policies: dict[str, Policy]):
+        """Rejects a policy reload that drops an alias a configured statement uses."""
+        for name, statement in self.statements.items():
+            missing = {
+                token for token in tokenize(statement)
+                if token not in ("(", ")") and token.upper() not in OPERATORS and token not in policies
+            }
+            if missing:
+                raise ValueError(f"statement '{name}' uses unknown policies: {', '.join(sorted(missing))}")
+
+    def use_policies(self, policies: dict[str, Policy]):
+        """
+        Swaps in reloaded policies and recompiles the configured statements.
+        Requests in flight keep the plans they already hold.
+        """
+        self.policies = policies
+        self._compile()
+
+    def _plan(self, body: dict):
+        names = body.get("statements")
+        if names is not None and (not isinstance(names, list) or not names
+                                  or not all(isinstance(name, str) for name in names)):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'statements' must be a non-empty list of strings")
+        if names is not None:
+            statements = {name: self.statements.get(name, name) for name in names}
+        else:
+            statement = body.get("statement", DEFAULT_STATEMENT)
+            if not isinstance(statement, str):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "'statement' must be a string")
+            statements = {None: self.statements.get(statement, statement)}
+        if any(len(statement) > MAX_STATEMENT_LENGTH for statement in statements.values()):
+            raise HTTPError(HTTPStatus.BAD_REQUEST,
+                            f"Invalid statement: longer than {MAX_STATEMENT_LENGTH} characters")
+        try:
+            if names is not None:
+                return self.plans.get_many(statements, self.policies, self.slms)
+            return self.plans.get(statements[None], self.policies, self.slms)
+        except ValueError as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Invalid statement: {e}")
+
+    @staticmethod
+    def _serialize(result: EvaluationResult) -> dict:
+        return result.as_dict()
+
+    async def _evaluate_one(self, plan, item: dict, explain: bool) -> dict:
+        if not isinstance(item, dict) or not isinstance(item.get("input"), str):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'input' must be a string")
+        context = item.get("context")
+        if context is not None and not isinstance(context, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'context' must be an object")
+        result = await self.engine.run(plan, item["input"], context=context, explain=explain)
+        return self._serialize(result)
+
+    async def evaluate(self, body: dict) -> dict:
+        return await self._evaluate_one(self._plan(body), body, bool(body.get("explain")))
+
+    async def evaluate_batch(self, body: dict) -> dict:
+        items = body.get("items")
+        if not isinstance(items, list) or len(items) > MAX_BATCH:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"'items' must be a list of at most {MAX_BATCH} entries")
+        plan = self._plan(body)
+        explain = bool(body.get("explain"))
+        outcomes = await asyncio.gather(
+            *(self._evaluate_one(plan, item, explain) for item in items),
+            return_exceptions=True,
+        )
+        results = []
+        for outcome in outcomes:
+            if isinstance(outcome, HTTPError):
+                results.append({"error": outcome.message})
+            elif isinstance(outcome, Exception):
+                results.append({"error": "API quota exceeded" if is_rate_limit_error(outcome) else "Evaluation error"})
+            else:
+                results.append(outcome)
+        return {"results": results}
+
+    async def dispatch(self, method: str, path: str, body: Optional[dict]) -> tuple[HTTPStatus, dict]:
+        if method == "GET" and path == "/healthz":
+            return HTTPStatus.OK, {"status": "ok"}
+        if method == "GET" and path == "/readyz":
+            if self.ready:
+                return HTTPStatus.OK, {"status": "ready"}
+            return HTTPStatus.SERVICE_UNAVAILABLE, {"status": "not ready"}
+        if method == "GET" and path == "/metrics":
+            if self.metrics is None:
+                raise HTTPError(HTTPStatus.NOT_FOUND, "Metrics are disabled")
+            return HTTPStatus.OK, self.metrics.snapshot()
+
+        routes = {"/evaluate": self.evaluate, "/evaluate/batch": self.evaluate_batch}
+        if path not in routes:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "Not found")
+        if method != "POST":
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, "Use POST")
+        if not self.ready:
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Shutting down")
+        if not isinstance(body, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Body must be a JSON object")
+
+        self.in_flight += 1
+        self._idle.clear()
+        try:
+            return HTTPStatus.OK, await routes[path](body)
+        finally:
+            self.in_flight -= 1
+            if not self.in_flight:
+                self._idle.set()
+
+    async def drain(self, timeout: float):
+        self.ready = False
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Shutting down with %d evaluations still running", self.in_flight)
+
+
+async def read_request(reader: asyncio.StreamReader) -> Optional[tuple[str, str, dict, bytes]]:
+    request_line = await reader.readline()
+    if not request_line:
+        return None
+    try:
+        method, path, _ = request_line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    try:
+        length = int(headers.get("content-length", 0) or 0)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed Content-Length")
+    if length < 0 or length > MAX_BODY:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), path.split("?", 1)[0], headers, body
+
+
+def write_response(writer: asyncio.StreamWriter, status: HTTPStatus, payload: dict, keep_alive: bool):
+    data = json.dumps(payload).encode("utf8")
+    head = (
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(data)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + data)
+
+
+async def handle_connection(service: JudgeService, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        while True:
+            keep_alive = False
+            try:
+                try:
+                    request = await asyncio.wait_for(read_request(reader), READ_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if request is None:
+                    break
+                method, path, headers, raw = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                try:
+                    body = json.loads(raw) if raw else None
+                except json.JSONDecodeError:
+                    raise HTTPError(HTTPStatus.BAD_REQUEST, "Body is not valid JSON")
+                status, payload = await service.dispatch(method, path, body)
+            except HTTPError as e:
+                status, payload = e.status, {"error": e.message}
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            except Exception as e:
+                logger.error("Evaluation error: %s", e)
+                status = HTTPStatus.TOO_MANY_REQUESTS if is_rate_limit_error(e) else HTTPStatus.INTERNAL_SERVER_ERROR
+                payload = {"error": "API quota exceeded" if is_rate_limit_error(e) else "Evaluation error"}
+
+            keep_alive = keep_alive and service.ready
+            write_response(writer, status, payload, keep_alive)
+            await writer.drain()
+            if not keep_alive:
+                break
+    finally:
+        writer.close()
+
+
+def build_service() -> JudgeService:
+    client = client_from_env()
+    cache = VerdictCache(maxsize=16384, ttl=600)
+    flights = SingleFlight()
+    limiter = limiter_for(MODEL, max_concurrency=32)
+    registry = PolicyRegistry("policy.json", cache=cache)
+    slms = {}
+
+    def bind(policies: dict[str, Policy]):
+        # wrappers only carry the policy name; a reloaded instruction reuses them
+        for alias, policy in policies.items():
+            if alias not in slms or slms[alias].name != policy.name:
+                slms[alias] = SLMWrapper(policy.name, client, MODEL, cache=cache, limiter=limiter,
+                                          single_flight=flights)
+
+    bind(registry.policies)
+    registry.subscribe(bind)
+    metrics = Metrics()
+    return JudgeService(registry.policies, slms, EvaluationEngine(metrics=metrics), STATEMENTS,
+                        metrics=metrics, registry=registry)
+
+
+async def serve(host: str, port: int, shutdown_timeout: float):
+    service = build_service()
+    service.warm_up()
+    watcher = asyncio.create_task(service.registry.watch())
+
+    server = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), host, port)
+    logger.info("Judge listening on %s:%s", host, port)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+
+    async with server:
+        await stop.wait()
+        logger.info("Shutting down, draining in-flight evaluations...")
+        server.close()
+        await service.drain(shutdown_timeout)
+        watcher.cancel()
+    logger.info("Judge stopped.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Judge HTTP evaluation service")
+    parser.add_argument("--host", default=os.getenv("JUDGE_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("JUDGE_PORT", "8080")))
+    parser.add_argument("--shutdown-timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.host, args.port, args.shutdown_timeout))
+
+
+if __name__ == "__main__":
+    main()
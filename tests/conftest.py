@@ -0,0 +1,52 @@
+import asyncio
+import os
+import sys
+from typing import Optional
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.run_bench import make_policies  # noqa: E402
+
+
+class Scripted:
+    """
+    Leaf evaluator answering each policy with a fixed verdict after a fixed
+    delay, recording which calls were made and which were cancelled.
+    """
+    def __init__(self, name: str, verdict: str = "compliant", delay: float = 0.0,
+                 error: Optional[Exception] = None):
+        self.name = name
+        self.verdict = verdict
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.cancelled = 0
+
+    async def __call__(self, policy, user_input, context=None):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.error is not None:
+            raise self.error
+        return policy.name, self.verdict
+
+
+@pytest.fixture
+def policies():
+    return make_policies(3)
+
+
+@pytest.fixture
+def scripted(policies):
+    """Builds an alias -> `Scripted` map, e.g. `scripted(PolicyA="violation")`."""
+    def build(delays: Optional[dict] = None, **verdicts):
+        return {
+            alias: Scripted(policy.name, verdicts.get(alias, "compliant"), (delays or {}).get(alias, 0.0))
+            for alias, policy in policies.items()
+        }
+    return build
@@ -0,0 +1,96 @@
+import asyncio
+import json
+
+import pytest
+
+from benchmarks.fake_client import FakeAPIError, FakeClient, constant
+from core.batcher import MicroBatcher
+from core.policy import render_context
+from core.slm_wrapper import SLMWrapper, strip_json
+
+
+class PartialClient(FakeClient):
+    """Leaves the last text out of every batched answer."""
+    def respond(self, prompt: str) -> str:
+        text = super().respond(prompt)
+        if "Input/Output Text 0" not in prompt:
+            return text
+        return json.dumps(json.loads(strip_json(text, "[", "]"))[:-1])
+
+
+def batcher(client=None, **kwargs):
+    client = client or FakeClient(latency=constant(0.001), violation_rate=0.5)
+    return client, MicroBatcher(SLMWrapper("a", client, "fake-slm"), **kwargs)
+
+
+def expected(client, policy, texts):
+    return [(policy.name, "violation" if client.is_violation(policy.name, text) else "compliant") for text in texts]
+
+
+def gather(batch, policy, texts, context=None):
+    async def main():
+        return await asyncio.gather(*(batch(policy, text, context=context) for text in texts))
+    return asyncio.run(main())
+
+
+def test_concurrent_calls_share_one_request(policies):
+    client, batch = batcher()
+    texts = [f"text {i}" for i in range(5)]
+    assert gather(batch, policies["PolicyA"], texts) == expected(client, policies["PolicyA"], texts)
+    assert client.calls == 1
+
+
+def test_identical_inputs_share_a_slot(policies):
+    client, batch = batcher(max_batch=2)
+    texts = ["same", "same", "same", "other"]
+    assert gather(batch, policies["PolicyA"], texts) == expected(client, policies["PolicyA"], texts)
+    assert client.calls == 1
+
+
+def test_full_batches_are_sent_at_once(policies):
+    client, batch = batcher(window=5.0, max_batch=3)
+    texts = [f"text {i}" for i in range(6)]
+    assert gather(batch, policies["PolicyA"], texts) == expected(client, policies["PolicyA"], texts)
+    assert client.calls == 2
+
+
+def test_missed_inputs_fall_back_to_single_calls(policies):
+    client, batch = batcher(PartialClient(latency=constant(0.001), violation_rate=0.5))
+    texts = [f"text {i}" for i in range(4)]
+    assert gather(batch, policies["PolicyA"], texts) == expected(client, policies["PolicyA"], texts)
+    assert client.calls == 2
+
+
+def test_failures_reach_every_waiter(policies):
+    _, batch = batcher(FakeClient(latency=constant(0.001), error_rate=1.0))
+
+    async def main():
+        return await asyncio.gather(*(batch(policies["PolicyA"], f"text {i}") for i in range(3)),
+                                    return_exceptions=True)
+    assert all(isinstance(outcome, FakeAPIError) for outcome in asyncio.run(main()))
+
+
+def test_batched_prompt_carries_the_context(policies):
+    client, batch = batcher()
+    prompts = []
+    request = batch.slm.request
+
+    async def recording(contents, **kwargs):
+        prompts.append(contents[0])
+        return await request(contents, **kwargs)
+    batch.slm.request = recording
+
+    context = {"role": "admin"}
+    gather(batch, policies["PolicyA"], ["one", "two"], context=context)
+    assert len(prompts) == 1
+    assert prompts[0].endswith(render_context(context))
+
+
+@pytest.mark.parametrize("contexts", [({"role": "admin"}, {"role": "guest"}), ({"role": "admin"}, None)])
+def test_different_contexts_are_not_batched_together(policies, contexts):
+    client, batch = batcher()
+
+    async def main():
+        return await asyncio.gather(*(batch(policies["PolicyA"], "text", context=context) for context in contexts))
+    asyncio.run(main())
+    assert client.calls == 2
@@ -0,0 +1,99 @@
+import asyncio
+import json
+
+import pytest
+
+from benchmarks.fake_client import FakeClient, constant
+from benchmarks.run_bench import plain_slms
+from core.bulk import evaluate_file
+from core.engine import EvaluationEngine
+from core.plan import compile_statement
+from core.policy import Policy
+
+STATEMENT = "PolicyA AND PolicyB AND PolicyC"
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    path = tmp_path / "inputs.jsonl"
+    lines = [json.dumps({"id": f"r{i}", "input": f"prompt {i}"}) for i in range(40)]
+    lines[5] = "not json"
+    lines[9] = ""
+    lines[12] = json.dumps({"id": "bad", "input": 12})
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+
+def setup(policies, statement=STATEMENT):
+    client = FakeClient(latency=constant(0.001))
+    plan = compile_statement(statement, policies, plain_slms(client, policies, None))
+    return client, plan
+
+
+def read_rows(path):
+    header, *rows = [json.loads(line) for line in path.read_text().splitlines()]
+    return header, rows
+
+
+def run(plan, corpus, output, **kwargs):
+    return asyncio.run(evaluate_file(EvaluationEngine(), plan, str(corpus), str(output), **kwargs))
+
+
+def test_every_line_gets_one_row(policies, corpus, tmp_path):
+    output = tmp_path / "out.jsonl"
+    _, plan = setup(policies)
+    summary = run(plan, corpus, output, concurrency=4, ordered=True)
+
+    header, rows = read_rows(output)
+    assert header["run"]["statement"] == STATEMENT
+    assert [row["line"] for row in rows] == [line for line in range(1, 41) if line != 10]
+    assert summary["evaluated"] == 39
+    errors = {row["line"]: row["error"] for row in rows if "error" in row}
+    assert set(errors) == {6, 13}
+
+
+def test_resume_skips_finished_rows_and_drops_a_torn_tail(policies, corpus, tmp_path):
+    output = tmp_path / "out.jsonl"
+    _, plan = setup(policies)
+    run(plan, corpus, output, ordered=True)
+    lines = output.read_text().splitlines(keepends=True)
+    # a crash part-way: the first 20 rows survived and the 21st was half written
+    output.write_text("".join(lines[:21]) + lines[21][:15])
+
+    client, plan = setup(policies)
+    summary = run(plan, corpus, output)
+
+    _, rows = read_rows(output)
+    assert summary["resumed"] == 20
+    assert summary["evaluated"] == 19
+    assert sorted(row["line"] for row in rows) == [line for line in range(1, 41) if line != 10]
+    # only the unfinished rows were sent again, one call per policy each
+    assert client.calls == 3 * 19
+
+
+def test_retry_errors_evaluates_failed_rows_again(policies, corpus, tmp_path):
+    output = tmp_path / "out.jsonl"
+    _, plan = setup(policies)
+    run(plan, corpus, output)
+    summary = run(plan, corpus, output, retry_errors=True)
+    assert summary["resumed"] == 37
+    assert summary["evaluated"] == 2
+
+
+def test_resume_refuses_another_statement(policies, corpus, tmp_path):
+    output = tmp_path / "out.jsonl"
+    _, plan = setup(policies)
+    run(plan, corpus, output)
+    _, other = setup(policies, "PolicyA OR PolicyB")
+    with pytest.raises(ValueError, match="different statement or policy version"):
+        run(other, corpus, output)
+
+
+def test_resume_refuses_an_edited_policy(policies, corpus, tmp_path):
+    output = tmp_path / "out.jsonl"
+    _, plan = setup(policies)
+    run(plan, corpus, output)
+    edited = dict(policies, PolicyB=Policy("p1", "PolicyB", policies["PolicyB"].instruction + " Stricter."))
+    _, plan = setup(edited)
+    with pytest.raises(ValueError):
+        run(plan, corpus, output)
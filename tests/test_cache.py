@@ -0,0 +1,142 @@
+import asyncio
+import time
+
+from benchmarks.fake_client import FakeClient, constant
+from core.cache import SingleFlight, VerdictCache
+from core.hedging import Hedger
+from core.slm_wrapper import SLMWrapper
+
+
+def test_verdict_cache_keys_on_instruction_and_normalized_input(policies):
+    cache = VerdictCache()
+    policy = policies["PolicyA"]
+    cache.set(VerdictCache.make_key("m", policy, "hello   world"), "violation")
+
+    assert cache.get(VerdictCache.make_key("m", policy, " hello world ")) == "violation"
+    assert cache.get(VerdictCache.make_key("other", policy, "hello world")) is None
+    assert cache.get(VerdictCache.make_key("m", policy, "hello world", {"role": "admin"})) is None
+
+
+def test_verdict_cache_expires_and_evicts(policies):
+    cache = VerdictCache(maxsize=2, ttl=0.01)
+    keys = [VerdictCache.make_key("m", policies["PolicyA"], str(i)) for i in range(3)]
+    for key in keys:
+        cache.set(key, "compliant")
+    assert len(cache) == 2 and cache.evictions == 1
+    time.sleep(0.02)
+    assert cache.get(keys[2]) is None
+
+
+def test_verdict_cache_invalidates_one_policy(policies):
+    cache = VerdictCache()
+    for policy in policies.values():
+        cache.set(VerdictCache.make_key("m", policy, "x"), "compliant")
+    assert cache.invalidate("p0") == 1
+    assert cache.invalidate("p1", keep_hash=policies["PolicyB"].instruction_hash) == 0
+    assert len(cache) == 2
+
+
+def test_wrapper_caches_verdicts(policies):
+    client = FakeClient(latency=constant(0.001))
+    wrapper = SLMWrapper("a", client, "fake-slm", cache=VerdictCache())
+
+    async def twice():
+        return [await wrapper(policies["PolicyA"], "same input") for _ in range(2)]
+
+    first, second = asyncio.run(twice())
+    assert first == second
+    assert client.calls == 1
+
+
+class Call:
+    def __init__(self, delay: float = 0.05, result: str = "compliant"):
+        self.delay = delay
+        self.result = result
+        self.started = 0
+        self.cancelled = False
+
+    async def __call__(self):
+        self.started += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return self.result
+
+
+def test_single_flight_shares_one_call():
+    flights = SingleFlight()
+    call = Call()
+
+    async def main():
+        return await asyncio.gather(*(flights.run(("key",), call) for _ in range(5)))
+
+    assert asyncio.run(main()) == ["compliant"] * 5
+    assert call.started == 1
+    assert flights.stats() == {"calls": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_cancelled_waiter_leaves_the_shared_call_running():
+    flights = SingleFlight()
+    call = Call()
+
+    async def main():
+        first = asyncio.ensure_future(flights.run(("key",), call))
+        second = asyncio.ensure_future(flights.run(("key",), call))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second, first.cancelled()
+
+    assert asyncio.run(main()) == ("compliant", True)
+    assert call.started == 1
+    assert not call.cancelled
+
+
+def test_last_waiter_cancelling_cancels_the_call():
+    flights = SingleFlight()
+    call = Call(delay=5.0)
+
+    async def main():
+        waiters = [asyncio.ensure_future(flights.run(("key",), call)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0)
+
+    asyncio.run(main())
+    assert call.cancelled
+    assert len(flights) == 0
+
+
+def test_failure_reaches_every_waiter_and_is_not_remembered():
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def main():
+        outcomes = await asyncio.gather(*(flights.run(("key",), fail) for _ in range(3)), return_exceptions=True)
+        retried = await flights.run(("key",), Call(delay=0))
+        return outcomes, retried
+
+    outcomes, retried = asyncio.run(main())
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+    assert retried == "compliant"
+
+
+def test_wrapper_joins_identical_calls_but_not_hedges(policies):
+    client = FakeClient(latency=constant(0.02))
+    wrapper = SLMWrapper("a", client, "fake-slm", single_flight=SingleFlight())
+
+    async def main():
+        await asyncio.gather(wrapper(policies["PolicyA"], "x"), wrapper(policies["PolicyA"], "x"))
+        calls = client.calls
+        # a hedge exists to race the first attempt, so it must make its own call
+        await asyncio.gather(wrapper(policies["PolicyA"], "y"), Hedger._hedge(lambda: wrapper(policies["PolicyA"], "y")))
+        return calls
+
+    assert asyncio.run(main()) == 1
+    assert client.calls == 3
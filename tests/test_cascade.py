@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from conftest import Scripted
+from core.cascade import ModelCascade
+
+
+def cascade(small_verdict: str, **kwargs):
+    small, large = Scripted("small", small_verdict), Scripted("large", "violation")
+    return ModelCascade([small, large], **kwargs), small, large
+
+
+def test_clear_answers_settle_on_the_small_model(policies):
+    models, small, large = cascade("compliant")
+    assert asyncio.run(models(policies["PolicyA"], "x")) == ("p0", "compliant")
+    assert (small.calls, large.calls) == (1, 0)
+    assert models.escalations == 0
+
+
+def test_unknown_is_escalated(policies):
+    models, small, large = cascade("unknown")
+    assert asyncio.run(models(policies["PolicyA"], "x")) == ("p0", "violation")
+    assert (small.calls, large.calls) == (1, 1)
+    assert models.stats()["p0"]["settled_by"] == {"large": {"count": 1, "share": 1.0}}
+
+
+def test_escalation_set_and_rules_are_configurable(policies):
+    models, _, large = cascade("violation", escalate_on=("unknown", "violation"), rules={"p1": ("unknown",)})
+    asyncio.run(models(policies["PolicyA"], "x"))
+    assert large.calls == 1
+    assert asyncio.run(models(policies["PolicyB"], "x")) == ("p1", "violation")
+    assert large.calls == 1
+
+
+def test_uncertain_answers_are_escalated(policies):
+    models, _, large = cascade("compliant", uncertain=lambda policy, text, verdict: "maybe" in text)
+    asyncio.run(models(policies["PolicyA"], "certainly"))
+    asyncio.run(models(policies["PolicyA"], "maybe"))
+    assert large.calls == 1
+
+
+def test_failing_tier_is_escalated_past_but_the_last_one_raises(policies):
+    small = Scripted("small", error=RuntimeError("503"))
+    large = Scripted("large", "compliant")
+    assert asyncio.run(ModelCascade([small, large])(policies["PolicyA"], "x")) == ("p0", "compliant")
+
+    large.error = RuntimeError("500")
+    with pytest.raises(RuntimeError):
+        asyncio.run(ModelCascade([small, large])(policies["PolicyA"], "x"))
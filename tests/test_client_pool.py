@@ -0,0 +1,83 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fake_client import FakeAPIError, FakeClient, _CachedContent, constant
+from core.client_pool import ClientPool
+from core.slm_wrapper import SLMWrapper
+
+
+def fake(**kwargs) -> FakeClient:
+    return FakeClient(latency=constant(0.01), **kwargs)
+
+
+class OwnCaches:
+    def __init__(self, name: str):
+        self.name = name
+
+    async def create(self, model, config):
+        return _CachedContent(f"cachedContents/{self.name}")
+
+
+def test_calls_spread_over_members(policies):
+    clients = [fake(), fake(), fake()]
+    wrapper = SLMWrapper("a", ClientPool(clients), "fake-slm")
+
+    async def main():
+        await asyncio.gather(*(wrapper(policies["PolicyA"], f"text {i}") for i in range(9)))
+
+    asyncio.run(main())
+    assert [client.calls for client in clients] == [3, 3, 3]
+
+
+def test_rate_limited_member_cools_down_and_the_call_moves_on(policies):
+    limited, healthy = fake(rate_limit_rate=1.0), fake()
+    pool = ClientPool([("limited", limited, 1.0), ("healthy", healthy, 1.0)], cooldown=60.0)
+    wrapper = SLMWrapper("a", pool, "fake-slm")
+
+    async def main():
+        for i in range(3):
+            await wrapper(policies["PolicyA"], f"text {i}")
+
+    asyncio.run(main())
+    assert (limited.calls, healthy.calls) == (1, 3)
+    stats = {member["name"]: member for member in pool.stats()}
+    assert stats["limited"]["rate_limited"] == 1
+    assert stats["limited"]["cooling_for"] > 50
+
+
+def test_429_reaches_the_caller_once_every_member_is_cooling(policies):
+    clients = [fake(rate_limit_rate=1.0), fake(rate_limit_rate=1.0)]
+    wrapper = SLMWrapper("a", ClientPool(clients), "fake-slm")
+    with pytest.raises(FakeAPIError) as error:
+        asyncio.run(wrapper(policies["PolicyA"], "text"))
+    assert error.value.code == 429
+    assert [client.calls for client in clients] == [1, 1]
+
+
+def test_other_errors_are_not_retried_on_another_member(policies):
+    clients = [fake(error_rate=1.0), fake(error_rate=1.0)]
+    with pytest.raises(FakeAPIError):
+        asyncio.run(SLMWrapper("a", ClientPool(clients), "fake-slm")(policies["PolicyA"], "text"))
+    assert sum(client.calls for client in clients) == 1
+
+
+def test_cached_content_stays_on_the_member_that_owns_it(policies):
+    clients = [fake(), fake()]
+    for i, client in enumerate(clients):
+        client.aio.caches = OwnCaches(str(i))
+    wrapper = SLMWrapper("a", ClientPool(clients), "fake-slm", context_cache=True)
+
+    async def main():
+        for i in range(4):
+            await wrapper(policies["PolicyA"], f"text {i}")
+
+    asyncio.run(main())
+    assert [client.calls for client in clients] == [4, 0]
+
+
+def test_pool_arguments_are_checked():
+    with pytest.raises(ValueError):
+        ClientPool([])
+    with pytest.raises(ValueError):
+        ClientPool([fake()], strategy="round_robin")
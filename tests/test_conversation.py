@@ -0,0 +1,86 @@
+import asyncio
+
+from conftest import Scripted
+from core.conversation import ConversationSession, Turn, flagged_summary
+from core.engine import EvaluationEngine
+from core.plan import compile_statement
+
+
+class Recording(Scripted):
+    """`Scripted` that keeps the text and context of every call, flagging texts containing "bad"."""
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.seen = []
+
+    async def __call__(self, policy, user_input, context=None):
+        self.seen.append((user_input, context))
+        return policy.name, "violation" if "bad" in user_input else "compliant"
+
+
+def session(policies, **kwargs):
+    leaf = Recording("a")
+    plan = compile_statement("PolicyA", policies, {"PolicyA": leaf})
+    return ConversationSession(EvaluationEngine(), plan, **kwargs), leaf
+
+
+def talk(conversation, *texts):
+    async def main():
+        return [(await conversation.add_turn(text)).verdict for text in texts]
+    return asyncio.run(main())
+
+
+def test_only_the_new_turn_is_checked(policies):
+    conversation, leaf = session(policies, window=2, context={"role": "admin"})
+    assert talk(conversation, "hello", "bad idea", "thanks") == ["compliant", "violation", "compliant"]
+
+    assert [text for text, _ in leaf.seen] == ["hello", "bad idea", "thanks"]
+    assert leaf.seen[0][1] == {"role": "admin"}
+    context = leaf.seen[2][1]
+    assert context["role"] == "admin"
+    assert context["previous_turns"] == "\n  [user] hello\n  [user] bad idea"
+    assert conversation.verdicts == ["compliant", "violation", "compliant"]
+    assert conversation.flagged == [1]
+
+
+def test_context_stays_bounded(policies):
+    conversation, leaf = session(policies, window=3, turn_chars=20, summary_chars=200)
+    talk(conversation, *[("bad " if i % 2 else "fine ") + "x" * 100 for i in range(50)])
+    sizes = [sum(len(value) for value in context.values()) for _, context in leaf.seen[10:]]
+    assert max(sizes) <= 3 * (20 + 12) + 200
+
+
+def test_turns_leaving_the_window_are_summarized(policies):
+    conversation, _ = session(policies, window=1)
+    talk(conversation, "bad one", "fine", "fine again")
+    assert conversation.summary == "turn 1 (user) violated a: bad one"
+    assert conversation.history_context()["conversation_summary"] == conversation.summary
+
+
+def test_recorded_turns_are_context_but_not_evaluated(policies):
+    conversation, leaf = session(policies)
+
+    async def main():
+        await conversation.record("a bad reply")
+        return await conversation.add_turn("ok")
+
+    assert asyncio.run(main()).verdict == "compliant"
+    assert len(leaf.seen) == 1
+    assert "[assistant] a bad reply" in leaf.seen[0][1]["previous_turns"]
+    assert conversation.verdicts == [None, "compliant"]
+
+
+def test_failing_summarizer_keeps_the_conversation_going(policies):
+    async def broken(summary, index, turn, limit):
+        raise RuntimeError("summarizer down")
+
+    conversation, _ = session(policies, window=1, summarizer=broken)
+    assert talk(conversation, "one", "two", "three") == ["compliant"] * 3
+    assert conversation.summary == ""
+
+
+def test_flagged_summary_keeps_the_newest_lines():
+    summary = ""
+    for i in range(10):
+        summary = asyncio.run(flagged_summary(summary, i, Turn("user", f"bad {i}", "violation", {"a": "violation"}), 80))
+    assert len(summary) <= 80
+    assert summary.endswith("turn 10 (user) violated a: bad 9")
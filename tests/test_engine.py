@@ -0,0 +1,173 @@
+import asyncio
+import itertools
+import re
+import time
+
+import pytest
+
+from benchmarks.fake_client import FakeClient, constant
+from benchmarks.run_bench import plain_slms
+from conftest import Scripted
+from core.engine import EvaluationEngine
+from core.plan import compile_statement, compile_statements
+from core.policy import Policy
+from core.slm_wrapper import MultiPolicySLMWrapper
+
+VERDICTS = ("compliant", "violation", "unknown")
+
+STATEMENTS = [
+    "PolicyA AND PolicyB AND PolicyC",
+    "PolicyA OR PolicyB OR PolicyC",
+    "(PolicyA OR PolicyB) AND NOT PolicyC",
+    "NOT (PolicyA AND PolicyB) OR PolicyC",
+    "NOT NOT PolicyA AND (PolicyB OR NOT PolicyC)",
+    "PolicyA AND PolicyA OR PolicyB",
+]
+
+
+def expected(statement: str, verdicts: dict[str, str]) -> str:
+    """
+    Reference verdict: only "violation" counts as a violation, so the
+    statement is plain boolean logic over "is not a violation".
+    """
+    formula = re.sub(r"\b(AND|OR|NOT)\b", lambda m: m.group(0).lower(), statement)
+    formula = re.sub(r"Policy[A-Z]", lambda m: str(verdicts[m.group(0)] != "violation"), formula)
+    return "compliant" if eval(formula) else "violation"
+
+
+@pytest.mark.parametrize("statement", STATEMENTS)
+@pytest.mark.parametrize("short_circuit", (False, True))
+def test_three_valued_semantics(policies, statement, short_circuit):
+    engine = EvaluationEngine(short_circuit=short_circuit)
+    for combination in itertools.product(VERDICTS, repeat=3):
+        verdicts = dict(zip(policies, combination))
+        slms = {alias: Scripted(policies[alias].name, verdict) for alias, verdict in verdicts.items()}
+        plan = compile_statement(statement, policies, slms)
+        result = asyncio.run(engine.run(plan, "text"))
+        assert result.verdict == expected(statement, verdicts), (statement, verdicts)
+
+
+def test_unoptimized_plan_agrees(policies):
+    for statement in STATEMENTS:
+        for combination in itertools.product(VERDICTS, repeat=3):
+            verdicts = dict(zip(policies, combination))
+            slms = {alias: Scripted(policies[alias].name, verdict) for alias, verdict in verdicts.items()}
+            plan = compile_statement(statement, policies, slms, optimize_tree=False)
+            assert asyncio.run(EvaluationEngine().run(plan, "text")).verdict == expected(statement, verdicts)
+
+
+def test_single_leaf_keeps_unknown(policies, scripted):
+    plan = compile_statement("PolicyA", policies, scripted(PolicyA="unknown"))
+    assert asyncio.run(EvaluationEngine().run(plan, "text")).verdict == "unknown"
+
+
+def test_short_circuit_returns_early_and_cancels(policies, scripted):
+    slms = scripted(delays={"PolicyB": 5.0, "PolicyC": 5.0}, PolicyA="violation")
+    plan = compile_statement("PolicyA AND PolicyB AND PolicyC", policies, slms)
+
+    started = time.perf_counter()
+    result = asyncio.run(EvaluationEngine(short_circuit=True).run(plan, "text"))
+
+    assert time.perf_counter() - started < 1.0
+    assert result.verdict == "violation"
+    assert result.results == {"p0": "violation"}
+    assert sorted(result.skipped) == ["p1", "p2"]
+    assert slms["PolicyB"].cancelled == slms["PolicyC"].cancelled == 1
+
+
+def test_without_short_circuit_every_leaf_reports(policies, scripted):
+    slms = scripted(delays={"PolicyB": 0.05}, PolicyA="violation")
+    plan = compile_statement("PolicyA AND PolicyB AND PolicyC", policies, slms)
+    result = asyncio.run(EvaluationEngine().run(plan, "text"))
+    assert result.verdict == "violation"
+    assert set(result.results) == {"p0", "p1", "p2"}
+    assert not result.skipped
+
+
+def test_short_circuit_waits_for_an_undecided_sibling(policies, scripted):
+    # an OR is only settled by a compliant child, so a violation alone must wait for the rest
+    slms = scripted(delays={"PolicyB": 0.05}, PolicyA="violation", PolicyB="compliant")
+    plan = compile_statement("PolicyA OR PolicyB", policies, slms)
+    result = asyncio.run(EvaluationEngine(short_circuit=True).run(plan, "text"))
+    assert result.verdict == "compliant"
+    assert result.results["p1"] == "compliant"
+
+
+def test_shared_leaf_is_called_once(policies, scripted):
+    slms = scripted()
+    plan = compile_statement("(PolicyA AND PolicyB) OR (PolicyA AND PolicyC)", policies, slms)
+    asyncio.run(EvaluationEngine().run(plan, "text"))
+    assert slms["PolicyA"].calls == 1
+
+
+def test_statements_get_their_own_verdicts(policies, scripted):
+    slms = scripted(PolicyC="violation")
+    plan = compile_statements({"first": "PolicyA AND PolicyB", "second": "PolicyB AND PolicyC"}, policies, slms)
+    result = asyncio.run(EvaluationEngine().run(plan, "text"))
+    assert result.statements == {"first": "compliant", "second": "violation"}
+    assert result.verdict == "violation"
+    assert slms["PolicyB"].calls == 1
+
+
+def test_leaf_timeout_uses_the_policy_timeout_verdict(policies, scripted):
+    policies["PolicyB"] = Policy("p1", "PolicyB", policies["PolicyB"].instruction, on_timeout="fail_open")
+    slms = scripted(delays={"PolicyB": 5.0})
+    plan = compile_statement("PolicyA AND PolicyB", policies, slms)
+    result = asyncio.run(EvaluationEngine(leaf_timeout=0.05).run(plan, "text"))
+    assert result.timed_out == ["p1"]
+    assert result.verdict == "compliant"
+
+
+def test_failed_leaf_raises(policies, scripted):
+    slms = scripted()
+    slms["PolicyB"].error = RuntimeError("boom")
+    plan = compile_statement("PolicyA AND PolicyB", policies, slms)
+    with pytest.raises(RuntimeError):
+        asyncio.run(EvaluationEngine().run(plan, "text"))
+
+
+class BrokenMultiPolicy(MultiPolicySLMWrapper):
+    async def evaluate_policies(self, policies, user_input, context=None):
+        raise RuntimeError("500 INTERNAL")
+
+
+def test_failed_combined_request_falls_back_to_single_calls(policies):
+    client = FakeClient(latency=constant(0.001), violation_rate=0.5)
+    slms = plain_slms(client, policies, None)
+    plan = compile_statement("PolicyA AND PolicyB AND PolicyC", policies, slms)
+    expected_result = asyncio.run(EvaluationEngine().run(plan, "some text"))
+
+    engine = EvaluationEngine(multi_policy=BrokenMultiPolicy("multi", client, "fake-slm"))
+    result = asyncio.run(engine.run(plan, "some text", trace=True))
+
+    assert result.verdict == expected_result.verdict
+    assert result.results == expected_result.results
+    assert [span.status for span in result.trace.groups] == ["error"]
+
+
+def test_collect_remaining_finishes_unneeded_leaves_in_the_background(policies, scripted):
+    slms = scripted(delays={"PolicyB": 0.05, "PolicyC": 0.05}, PolicyA="violation", PolicyC="violation")
+    plan = compile_statement("PolicyA AND PolicyB AND PolicyC", policies, slms)
+    engine = EvaluationEngine(short_circuit=True, collect_remaining=True)
+
+    async def main():
+        result = await engine.run(plan, "text", trace=True)
+        early = dict(result.results)
+        await result.audit
+        return result, early
+
+    result, early = asyncio.run(main())
+    assert result.verdict == "violation"
+    assert early == {"p0": "violation"}
+    assert not result.skipped
+    assert result.results == {"p0": "violation", "p1": "compliant", "p2": "violation"}
+    assert slms["PolicyB"].cancelled == slms["PolicyC"].cancelled == 0
+    assert {name: span.status for name, span in result.trace.leaves.items()} == {
+        "p0": "ok", "p1": "background", "p2": "background",
+    }
+
+
+def test_no_audit_when_every_leaf_was_needed(policies, scripted):
+    plan = compile_statement("PolicyA AND PolicyB", policies, scripted())
+    result = asyncio.run(EvaluationEngine(short_circuit=True, collect_remaining=True).run(plan, "text"))
+    assert result.audit is None
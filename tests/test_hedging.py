@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+import pytest
+
+from core.engine import EvaluationEngine
+from core.hedging import Hedger, LatencyTracker, is_hedge
+from core.plan import compile_statement
+
+
+class Attempts:
+    """A call whose n-th attempt takes `delays[n]` seconds (or raises `errors[n]`)."""
+    def __init__(self, *delays: float, errors: dict = None):
+        self.delays = delays
+        self.errors = errors or {}
+        self.started = 0
+        self.hedged = []
+
+    async def __call__(self):
+        attempt = self.started
+        self.started += 1
+        self.hedged.append(is_hedge())
+        await asyncio.sleep(self.delays[attempt])
+        if attempt in self.errors:
+            raise self.errors[attempt]
+        return attempt
+
+
+def trained(seconds: float = 0.01, samples: int = 20) -> Hedger:
+    tracker = LatencyTracker()
+    for _ in range(samples):
+        tracker.record("leaf", seconds)
+    return Hedger(percentile=0.95, min_samples=samples, tracker=tracker)
+
+
+def test_tracker_percentiles():
+    tracker = LatencyTracker(window=10)
+    for i in range(20):
+        tracker.record("leaf", float(i))
+    assert tracker.count("leaf") == 10
+    assert tracker.percentile("leaf", 0.5) == 15.0
+    assert tracker.percentile("other", 0.5) is None
+
+
+def test_no_hedging_before_enough_samples():
+    hedger = Hedger(min_samples=20)
+    call = Attempts(0.05)
+    assert asyncio.run(hedger.run("leaf", call)) == 0
+    assert call.started == 1 and hedger.hedged == 0
+
+
+def test_slow_call_is_hedged_and_the_hedge_wins():
+    hedger = trained()
+    call = Attempts(5.0, 0.01)
+    started = time.perf_counter()
+    assert asyncio.run(hedger.run("leaf", call)) == 1
+    assert time.perf_counter() - started < 1.0
+    assert call.hedged == [False, True]
+    assert (hedger.hedged, hedger.hedge_wins) == (1, 1)
+
+
+def test_failed_attempt_leaves_the_other_to_finish():
+    hedger = trained()
+    call = Attempts(0.03, 0.05, errors={0: RuntimeError("503")})
+    assert asyncio.run(hedger.run("leaf", call)) == 1
+
+
+def test_every_attempt_failing_raises():
+    hedger = trained()
+    call = Attempts(0.02, 0.02, errors={0: RuntimeError("first"), 1: RuntimeError("second")})
+    with pytest.raises(RuntimeError):
+        asyncio.run(hedger.run("leaf", call))
+
+
+def test_budget_times_out_the_leaves_still_running(policies, scripted):
+    slms = scripted(delays={"PolicyB": 5.0})
+    plan = compile_statement("PolicyA AND PolicyB", policies, slms)
+    started = time.perf_counter()
+    result = asyncio.run(EvaluationEngine(budget=0.05).run(plan, "text"))
+    assert time.perf_counter() - started < 1.0
+    assert result.timed_out == ["p1"]
+    # fail_closed by default
+    assert result.verdict == "violation"
+    assert slms["PolicyB"].cancelled == 1
+
+
+def test_engine_hedges_slow_leaves(policies, scripted):
+    slms = scripted()
+    hedger = Hedger(min_samples=3)
+    engine = EvaluationEngine(hedger=hedger)
+    plan = compile_statement("PolicyA", policies, slms)
+    for _ in range(3):
+        asyncio.run(engine.run(plan, "text"))
+    slms["PolicyA"].delay = 0.05
+    asyncio.run(engine.run(plan, "text"))
+    assert hedger.hedged == 1
+    assert slms["PolicyA"].calls == 5
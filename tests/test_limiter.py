@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+import pytest
+
+from benchmarks.fake_client import FakeAPIError
+from core.limiter import RateLimiter, is_rate_limit_error, limiter_for
+
+
+def flaky(failures: int, error: Exception = None):
+    """A call that raises `error` (a 429 by default) `failures` times, then succeeds."""
+    state = {"calls": 0}
+
+    async def call():
+        state["calls"] += 1
+        if state["calls"] <= failures:
+            raise error or FakeAPIError(429, "RESOURCE_EXHAUSTED")
+        return "ok"
+    call.state = state
+    return call
+
+
+class StatusError(Exception):
+    def __init__(self, status: str):
+        super().__init__(f"request 429 failed: {status}")
+        self.status = status
+
+
+def test_rate_limit_errors_are_recognised():
+    assert is_rate_limit_error(FakeAPIError(429, "RESOURCE_EXHAUSTED"))
+    assert is_rate_limit_error(StatusError("RESOURCE_EXHAUSTED"))
+    assert is_rate_limit_error(RuntimeError("HTTP 429 Too Many Requests"))
+    assert not is_rate_limit_error(FakeAPIError(500, "INTERNAL"))
+
+
+@pytest.mark.parametrize("error", [
+    FakeAPIError(500, "INTERNAL: upstream returned RESOURCE_EXHAUSTED"),
+    StatusError("UNAVAILABLE"),
+    RuntimeError("request 429 failed"),
+    RuntimeError("connection to port 8429 refused"),
+    RuntimeError("read 429 bytes"),
+])
+def test_a_429_in_the_message_alone_is_not_a_rate_limit(error):
+    assert not is_rate_limit_error(error)
+
+
+def test_burst_of_429s_halves_the_rate_once():
+    limiter = RateLimiter(rate=8.0, decrease_cooldown=60.0)
+    for _ in range(5):
+        limiter._on_rate_limited()
+    assert limiter.rate == 4.0
+    assert limiter.rate_limited == 5
+
+
+def test_each_cooldown_window_allows_one_decrease():
+    limiter = RateLimiter(rate=8.0, min_rate=0.5, decrease_cooldown=0.0)
+    for _ in range(6):
+        limiter._on_rate_limited()
+    assert limiter.rate == 0.5
+
+
+def test_first_429_starts_from_half_the_observed_rate():
+    limiter = RateLimiter(max_concurrency=32, base_delay=0.001)
+
+    async def main():
+        await asyncio.gather(*(limiter.call(flaky(0)) for _ in range(20)))
+        return await limiter.call(flaky(1))
+
+    assert asyncio.run(main()) == "ok"
+    # 20 completions in well under a second are read as 20/s, not thousands per second
+    assert limiter.max_rate == 20.0
+    # halved to 10/s, then nudged up by the retry's success
+    assert limiter.rate == pytest.approx(11.0)
+
+
+def test_bucket_paces_calls():
+    limiter = RateLimiter(rate=50.0, burst=1)
+
+    async def main():
+        started = time.perf_counter()
+        await asyncio.gather(*(limiter.call(flaky(0)) for _ in range(6)))
+        return time.perf_counter() - started
+
+    assert asyncio.run(main()) >= 0.09
+
+
+def test_other_errors_are_not_retried():
+    limiter = RateLimiter(base_delay=0.001)
+    call = flaky(1, FakeAPIError(500, "INTERNAL"))
+    with pytest.raises(FakeAPIError):
+        asyncio.run(limiter.call(call))
+    assert call.state["calls"] == 1
+
+
+def test_retries_give_up_after_max_retries():
+    limiter = RateLimiter(max_retries=2, base_delay=0.001)
+    call = flaky(10)
+    with pytest.raises(FakeAPIError):
+        asyncio.run(limiter.call(call))
+    assert call.state["calls"] == 3
+
+
+def test_limiter_for_shares_one_limiter_per_model():
+    limiter = limiter_for("test-shared-model", max_concurrency=4)
+    assert limiter_for("test-shared-model") is limiter
+    assert limiter_for("test-shared-model", max_concurrency=4) is limiter
+    with pytest.raises(ValueError):
+        limiter_for("test-shared-model", max_concurrency=8)
+    with pytest.raises(ValueError):
+        limiter_for("test-shared-model", rate=2.0)
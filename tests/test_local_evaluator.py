@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from conftest import Scripted
+from core.local_evaluator import (SQL_INJECTION_PATTERNS, AllowListEvaluator, CascadeEvaluator, LocalEvaluator,
+                                  PatternEvaluator)
+
+TOOLS = {"get_sites", "get_tasks", "delete_project"}
+
+
+@pytest.mark.parametrize("text", [
+    "show me projects where name = '' OR 1=1",
+    "x' UNION SELECT password FROM users",
+    "foo'; DROP TABLE sites",
+    "admin' --",
+    "1; exec xp_cmdshell 'dir'",
+    "id = 1 AND sleep(5)",
+])
+def test_sql_injection_is_flagged(policies, text):
+    rule = PatternEvaluator("sql", SQL_INJECTION_PATTERNS)
+    assert rule.evaluate_local(policies["PolicyA"], text) == "violation"
+
+
+@pytest.mark.parametrize("text", [
+    "show me the sites in Berlin",
+    "sprint 3 -- the urgent ones",
+    "select the tasks that are union-related",
+    "I need 1 = 1 more day",
+])
+def test_ordinary_input_abstains(policies, text):
+    rule = PatternEvaluator("sql", SQL_INJECTION_PATTERNS)
+    assert rule.evaluate_local(policies["PolicyA"], text) is None
+
+
+def test_keywords_match_whole_words(policies):
+    rule = PatternEvaluator.from_keywords("words", ["rm -rf", "token"])
+    assert rule.evaluate_local(policies["PolicyA"], "then run rm -rf /") == "violation"
+    assert rule.evaluate_local(policies["PolicyA"], "tokens are fine") is None
+
+
+def test_allow_list(policies):
+    rule = AllowListEvaluator("tools", TOOLS)
+    allowed = {"allowed_tools": ["get_sites", "get_tasks"]}
+    policy = policies["PolicyA"]
+    assert rule.evaluate_local(policy, "call delete_project now", allowed) == "violation"
+    assert rule.evaluate_local(policy, "call get_sites then get_tasks", allowed) is None
+    # snake_case words that are not tools are not mentions
+    assert rule.evaluate_local(policy, "my_favourite_site please", allowed) is None
+    # without an allow-list the rule abstains
+    assert rule.evaluate_local(policy, "call delete_project now") is None
+    trusting = AllowListEvaluator("tools", TOOLS, trust_allowed=True)
+    assert trusting.evaluate_local(policy, "call get_sites", allowed) == "compliant"
+
+
+def test_local_evaluator_is_abstract_and_unconfident_reports_unknown(policies):
+    with pytest.raises(TypeError):
+        LocalEvaluator("base")
+    rule = PatternEvaluator("sql", SQL_INJECTION_PATTERNS)
+    assert asyncio.run(rule(policies["PolicyA"], "show me the sites")) == ("p0", "unknown")
+
+
+def test_cascade_settles_locally_or_falls_back(policies):
+    fallback = Scripted("slm", "compliant")
+    cascade = CascadeEvaluator([PatternEvaluator("sql", SQL_INJECTION_PATTERNS)], fallback)
+    policy = policies["PolicyA"]
+
+    assert asyncio.run(cascade(policy, "x' OR 1=1 --")) == ("p0", "violation")
+    assert fallback.calls == 0
+    assert asyncio.run(cascade(policy, "show me the sites")) == ("p0", "compliant")
+    assert fallback.calls == 1
+    assert (cascade.local_hits, cascade.fallback_calls) == (1, 1)
+    assert cascade.name == "slm"
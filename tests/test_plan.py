@@ -0,0 +1,75 @@
+import asyncio
+import re
+
+import pytest
+
+from core.engine import EvaluationEngine
+from core.explain import normalize
+from core.plan import MAX_DEPTH, PlanCache, compile_statement
+from core.tracing import Metrics
+
+
+@pytest.mark.parametrize("statement, message", [
+    ("", "empty"),
+    ("   ", "empty"),
+    ("PolicyA PolicyB", "missing operator"),
+    ("PolicyA AND", "ends with an operator"),
+    ("AND PolicyA", "missing operand"),
+    ("PolicyA NOT PolicyB", "missing operator"),
+    ("(PolicyA", "unbalanced '('"),
+    ("PolicyA)", "unbalanced ')'"),
+    ("()", "missing operand"),
+    ("PolicyA AND Unknown", "unknown policy 'Unknown'"),
+    ("NOT " * (MAX_DEPTH + 1) + "PolicyA", "levels deep"),
+    ("(" * (MAX_DEPTH + 1) + "PolicyA AND PolicyB" + ")" * (MAX_DEPTH + 1), None),
+])
+def test_malformed_statements_raise_value_error(policies, scripted, statement, message):
+    if message is None:
+        # redundant parentheses add no depth
+        compile_statement(statement, policies, scripted())
+        return
+    with pytest.raises(ValueError, match=re.escape(message)):
+        compile_statement(statement, policies, scripted())
+
+
+def test_long_chains_stay_shallow(policies, scripted):
+    statement = " AND ".join(["PolicyA", "PolicyB", "PolicyC"] * MAX_DEPTH)
+    plan = compile_statement(statement, policies, scripted(), optimize_tree=False)
+    assert len(plan.root.children) == 3 * MAX_DEPTH
+
+
+def test_optimize_pushes_not_down_and_flattens(policies, scripted):
+    plan = compile_statement("NOT (PolicyA OR PolicyB) AND PolicyC", policies, scripted())
+    assert plan.root.value == "AND"
+    assert sorted(normalize(child) for child in plan.root.children) == ["NOT PolicyA", "NOT PolicyB", "PolicyC"]
+
+
+def record_history(policies, scripted, metrics, **verdicts):
+    engine = EvaluationEngine(metrics=metrics)
+    plan = compile_statement("PolicyA AND PolicyB AND PolicyC", policies, scripted(**verdicts), optimize_tree=False)
+    for _ in range(5):
+        asyncio.run(engine.run(plan, "text"))
+
+
+def test_plan_cache_orders_by_history_and_recompiles(policies, scripted):
+    metrics = Metrics()
+    plans = PlanCache(stats=metrics.snapshot, recompile_after=0.0)
+    slms = scripted()
+
+    record_history(policies, scripted, metrics, PolicyC="violation")
+    plan = plans.get("PolicyA AND PolicyB AND PolicyC", policies, slms)
+    assert plan.root.children[0].policy.name == "p2"
+
+    metrics.reset()
+    record_history(policies, scripted, metrics, PolicyA="violation")
+    recompiled = plans.get("PolicyA AND PolicyB AND PolicyC", policies, slms)
+    assert recompiled is not plan
+    assert recompiled.root.children[0].policy.name == "p0"
+
+
+def test_plan_cache_reuses_plans_without_stats(policies, scripted):
+    plans = PlanCache()
+    slms = scripted()
+    plan = plans.get("PolicyA AND PolicyB", policies, slms)
+    assert plans.get("PolicyA  AND PolicyB", policies, slms) is plan
+    assert plans.get("PolicyA AND PolicyB", policies, scripted()) is not plan
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from core.cache import VerdictCache
+from core.registry import PolicyRegistry, validate_config
+
+
+def config(**instructions) -> dict:
+    return {"policies": {
+        alias: {"name": alias.lower(), "alias": alias, "policy_instruction": instruction}
+        for alias, instruction in instructions.items()
+    }}
+
+
+def write(path, data):
+    path.write_text(json.dumps(data))
+    # make the change visible even within the filesystem's timestamp resolution
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / "policy.json"
+    write(path, config(Nsfw="No adult content.", Jailbreak="No jailbreaks."))
+    return path
+
+
+def test_unchanged_file_is_not_reloaded(path):
+    registry = PolicyRegistry(str(path))
+    assert registry.version == 1
+    assert not registry.reload()
+    write(path, json.loads(path.read_text()))
+    assert not registry.reload()
+    assert registry.version == 1
+
+
+def test_reload_swaps_only_changed_policies_and_their_cached_verdicts(path):
+    cache = VerdictCache()
+    registry = PolicyRegistry(str(path), cache=cache)
+    before = registry.policies
+    for policy in before.values():
+        cache.set(cache.make_key("m", policy, "x"), "compliant")
+    seen = []
+    registry.subscribe(seen.append)
+
+    write(path, config(Nsfw="No adult content.", Jailbreak="No jailbreaks or prompt injection."))
+    assert registry.reload()
+
+    after = registry.policies
+    assert after is not before and seen == [after]
+    assert after["Nsfw"] is before["Nsfw"]
+    assert after["Jailbreak"] is not before["Jailbreak"]
+    assert cache.get(cache.make_key("m", after["Nsfw"], "x")) == "compliant"
+    assert cache.get(cache.make_key("m", before["Jailbreak"], "x")) is None
+    assert registry.version == 2
+
+
+@pytest.mark.parametrize("data, message", [
+    ([], "'policies' object"),
+    ({"policies": {"a": {"name": "a", "alias": "A"}}}, "'policy_instruction'"),
+    (config(AND="x"), "alias 'AND'"),
+    ({"policies": {"a": {"name": "a", "alias": "A", "policy_instruction": "x", "on_timeout": "maybe"}}},
+     "'on_timeout'"),
+    ({"policies": {
+        "a": {"name": "a", "alias": "A", "policy_instruction": "x"},
+        "b": {"name": "b", "alias": "A", "policy_instruction": "y"},
+    }}, "duplicate alias"),
+])
+def test_invalid_configs_are_rejected(data, message):
+    with pytest.raises(ValueError, match=message):
+        validate_config(data)
+
+
+def test_bad_edit_keeps_the_current_policies(path):
+    registry = PolicyRegistry(str(path))
+    current = registry.policies
+    path.write_text("{ not json")
+    with pytest.raises(ValueError):
+        registry.reload()
+    assert registry.policies is current
+
+    def keep_nsfw(policies):
+        if "Nsfw" not in policies:
+            raise ValueError("Nsfw is still used")
+    registry.add_check(keep_nsfw)
+    write(path, config(Jailbreak="No jailbreaks."))
+    with pytest.raises(ValueError, match="still used"):
+        registry.reload()
+    assert registry.policies is current and registry.version == 1
+
+
+def test_watch_picks_up_edits(path):
+    registry = PolicyRegistry(str(path))
+
+    async def main():
+        watcher = asyncio.ensure_future(registry.watch(interval=0.01))
+        write(path, config(Nsfw="Stricter."))
+        for _ in range(100):
+            if registry.version == 2:
+                break
+            await asyncio.sleep(0.01)
+        watcher.cancel()
+
+    asyncio.run(main())
+    assert list(registry.policies) == ["Nsfw"]
+    assert registry.policies["Nsfw"].instruction == "Stricter."
@@ -0,0 +1,138 @@
+import asyncio
+import json
+from http import HTTPStatus
+
+import pytest
+
+import server
+from benchmarks.fake_client import FakeAPIError
+from conftest import Scripted
+from core.engine import EvaluationEngine
+from server import HTTPError, JudgeService, handle_connection
+
+STATEMENTS = {"all": "PolicyA AND PolicyB AND PolicyC", "any": "PolicyA OR PolicyB"}
+
+
+@pytest.fixture
+def service(policies, scripted):
+    service = JudgeService(policies, scripted(PolicyB="violation"), EvaluationEngine(), STATEMENTS)
+    service.warm_up()
+    return service
+
+
+def dispatch(service, body, path="/evaluate", method="POST"):
+    try:
+        return asyncio.run(service.dispatch(method, path, body))
+    except HTTPError as e:
+        return e.status, {"error": e.message}
+
+
+def test_evaluate_named_statement(service):
+    status, payload = dispatch(service, {"input": "hello", "statement": "all"})
+    assert status == HTTPStatus.OK
+    assert payload["verdict"] == "violation"
+
+
+def test_evaluate_several_statements(service):
+    status, payload = dispatch(service, {"input": "hello", "statements": ["all", "any"]})
+    assert status == HTTPStatus.OK
+    assert payload["statements"] == {"all": "violation", "any": "compliant"}
+
+
+@pytest.mark.parametrize("statement", [
+    "",
+    "PolicyA PolicyB",
+    "PolicyA AND",
+    "(PolicyA",
+    "Unknown",
+    "NOT " * 5000 + "PolicyA",
+    " AND ".join(["PolicyA"] * 100_000),
+])
+def test_malformed_statements_are_bad_requests(service, statement):
+    status, payload = dispatch(service, {"input": "hello", "statement": statement})
+    assert status == HTTPStatus.BAD_REQUEST
+    assert payload["error"].startswith("Invalid statement")
+
+
+@pytest.mark.parametrize("body", [
+    {"statement": "all"},
+    {"input": 5, "statement": "all"},
+    {"input": "x", "statement": "all", "context": []},
+    {"input": "x", "statements": []},
+    {"input": "x", "statements": "all"},
+    {"input": "x", "statement": 5},
+])
+def test_malformed_bodies_are_bad_requests(service, body):
+    assert dispatch(service, body)[0] == HTTPStatus.BAD_REQUEST
+
+
+def test_batch_reports_errors_per_item(service):
+    status, payload = dispatch(service, {"statement": "all", "items": [{"input": "a"}, {"input": 1}]},
+                               path="/evaluate/batch")
+    assert status == HTTPStatus.OK
+    assert payload["results"][0]["verdict"] == "violation"
+    assert payload["results"][1] == {"error": "'input' must be a string"}
+
+
+def test_routes(service):
+    assert dispatch(service, None, path="/healthz", method="GET")[0] == HTTPStatus.OK
+    assert dispatch(service, {}, path="/nope")[0] == HTTPStatus.NOT_FOUND
+    assert dispatch(service, {}, method="GET")[0] == HTTPStatus.METHOD_NOT_ALLOWED
+    service.ready = False
+    assert dispatch(service, {"input": "x"})[0] == HTTPStatus.SERVICE_UNAVAILABLE
+
+
+async def exchange(service, raw: bytes) -> tuple[int, dict]:
+    srv = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), "127.0.0.1", 0)
+    port = srv.sockets[0].getsockname()[1]
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(raw)
+        await writer.drain()
+        head = await reader.readuntil(b"\r\n\r\n")
+        length = int(head.split(b"Content-Length: ")[1].split(b"\r\n")[0])
+        body = await reader.readexactly(length)
+        writer.close()
+        return int(head.split(b" ")[1]), json.loads(body)
+    finally:
+        srv.close()
+
+
+def post(body: dict) -> bytes:
+    data = json.dumps(body).encode()
+    return b"POST /evaluate HTTP/1.1\r\nConnection: close\r\nContent-Length: %d\r\n\r\n%s" % (len(data), data)
+
+
+@pytest.mark.parametrize("error, status, message", [
+    (RuntimeError("boom"), 500, "Evaluation error"),
+    (FakeAPIError(429, "RESOURCE_EXHAUSTED"), 429, "API quota exceeded"),
+])
+def test_evaluation_failures_map_to_status(policies, scripted, error, status, message):
+    slms = scripted()
+    slms["PolicyA"] = Scripted("p0", error=error)
+    service = JudgeService(policies, slms, EvaluationEngine(), STATEMENTS)
+    service.warm_up()
+    assert asyncio.run(exchange(service, post({"input": "x", "statement": "all"}))) == (status, {"error": message})
+
+
+def test_protocol_errors_are_bad_requests(service):
+    assert asyncio.run(exchange(service, b"garbage\r\n\r\n"))[0] == 400
+    assert asyncio.run(exchange(service, b"POST /evaluate HTTP/1.1\r\nContent-Length: x\r\n\r\n"))[0] == 400
+    raw = b"POST /evaluate HTTP/1.1\r\nContent-Length: 3\r\n\r\n{x}"
+    assert asyncio.run(exchange(service, raw)) == (400, {"error": "Body is not valid JSON"})
+
+
+def test_idle_connections_are_closed(service, monkeypatch):
+    monkeypatch.setattr(server, "READ_TIMEOUT", 0.05)
+
+    async def main():
+        srv = await asyncio.start_server(lambda r, w: handle_connection(service, r, w), "127.0.0.1", 0)
+        port = srv.sockets[0].getsockname()[1]
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            return await asyncio.wait_for(reader.read(), 1.0)
+        finally:
+            writer.close()
+            srv.close()
+
+    assert asyncio.run(main()) == b""
@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fake_client import FakeAPIError, FakeClient, _CachedContent, constant
+from benchmarks.run_bench import plain_slms
+from core.engine import EvaluationEngine
+from core.plan import compile_statement
+from core.prompt import BATCH_INPUTS_PROMPT, INPUT_SECTION, MASTER_PROMPT, MULTI_POLICY_PROMPT
+from core.policy import render_context
+from core.slm_wrapper import MultiPolicySLMWrapper, SLMWrapper
+
+STATEMENT = "PolicyA AND PolicyB"
+
+
+def explained(policies, verdict_only: bool, violation_rate: float = 1.0):
+    client = FakeClient(latency=constant(0.001), violation_rate=violation_rate)
+    plan = compile_statement(STATEMENT, policies, plain_slms(client, policies, None, verdict_only=verdict_only))
+    return client, asyncio.run(EvaluationEngine().run(plan, "some text", explain=True))
+
+
+def test_verdict_only_asks_for_the_bare_verdict(policies):
+    client = FakeClient(latency=constant(0.001), violation_rate=1.0)
+    slms = plain_slms(client, policies, None, verdict_only=True)
+    plan = compile_statement(STATEMENT, policies, slms)
+    result = asyncio.run(EvaluationEngine().run(plan, "some text"))
+    assert result.verdict == "violation"
+    assert client.calls == 2
+    assert not result.explanations
+
+
+def test_full_answers_are_explained_without_another_call(policies):
+    client, result = explained(policies, verdict_only=False)
+    assert client.calls == 2
+    assert result.explanations["p0"]["violation_reason"] == "p0 flagged the text"
+    assert set(result.explanations) == {"p0", "p1"}
+
+
+def test_verdict_only_violations_are_asked_for_their_reasons(policies):
+    client, result = explained(policies, verdict_only=True)
+    assert client.calls == 4
+    assert result.explanations["p1"]["violation_reason"] == "p1 flagged the text"
+
+
+@pytest.mark.parametrize("verdict_only", (False, True))
+def test_compliant_leaves_are_not_explained(policies, verdict_only):
+    client, result = explained(policies, verdict_only=verdict_only, violation_rate=0.0)
+    assert client.calls == 2
+    assert result.verdict == "compliant"
+    assert not result.explanations
+
+
+class FlakyCaches:
+    """`caches.create` that fails `failures` times before it succeeds."""
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.attempts = 0
+
+    async def create(self, model, config):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise FakeAPIError(503, "UNAVAILABLE")
+        return _CachedContent(f"cachedContents/{self.attempts}")
+
+
+def cached_wrapper(retry: float, failures: int = 1):
+    client = FakeClient(latency=constant(0.001))
+    client.aio.caches = FlakyCaches(failures)
+    sent = []
+    wrapper = SLMWrapper("a", client, "fake-slm", context_cache=True, context_cache_retry=retry)
+    request = wrapper.request
+
+    async def recording(contents, **kwargs):
+        sent.append(kwargs.get("config", {}).get("cached_content"))
+        return await request(contents, **kwargs)
+    wrapper.request = recording
+    return wrapper, client.aio.caches, sent
+
+
+def evaluate(wrapper, policy, times: int):
+    async def main():
+        for i in range(times):
+            await wrapper(policy, f"input {i}")
+    asyncio.run(main())
+
+
+def test_prefix_is_cached_once_and_reused(policies):
+    wrapper, caches, sent = cached_wrapper(retry=60.0, failures=0)
+    evaluate(wrapper, policies["PolicyA"], 3)
+    assert caches.attempts == 1
+    assert sent == ["cachedContents/1"] * 3
+
+
+def test_failed_prefix_cache_is_not_retried_within_the_window(policies):
+    wrapper, caches, sent = cached_wrapper(retry=60.0)
+    evaluate(wrapper, policies["PolicyA"], 3)
+    assert caches.attempts == 1
+    assert sent == [None] * 3
+
+
+def test_failed_prefix_cache_is_retried_after_the_window(policies):
+    wrapper, caches, sent = cached_wrapper(retry=0.0)
+    evaluate(wrapper, policies["PolicyA"], 3)
+    assert caches.attempts == 2
+    assert sent == [None, "cachedContents/2", "cachedContents/2"]
+
+
+@pytest.mark.parametrize("prompt, placeholder", [
+    (MULTI_POLICY_PROMPT, '"{text_to_check}"'),
+    (BATCH_INPUTS_PROMPT, "{texts_to_check}"),
+    (MASTER_PROMPT + INPUT_SECTION, '"{text_to_check}"'),
+])
+def test_prompts_put_the_text_last(prompt, placeholder):
+    assert prompt.rstrip().endswith(placeholder)
+
+
+def test_single_and_combined_prompts_render_context_alike(policies):
+    context = {"role": "admin", "site": "Berlin"}
+    single = policies["PolicyA"]("the text", context=context)
+    combined = MultiPolicySLMWrapper("m", None, "fake-slm").build_prompt(list(policies.values()), "the text", context)
+    assert single.endswith(render_context(context))
+    assert combined.endswith(render_context(context))
+    assert render_context(None) == render_context({}) == ""
+
+
+def test_combined_request_scores_every_policy_in_one_call(policies):
+    client = FakeClient(latency=constant(0.001), violation_rate=0.5)
+    wrapper = MultiPolicySLMWrapper("m", client, "fake-slm")
+    verdicts = asyncio.run(wrapper.evaluate_policies(list(policies.values()), "some text"))
+    assert client.calls == 1
+    assert verdicts == {
+        policy.name: "violation" if client.is_violation(policy.name, "some text") else "compliant"
+        for policy in policies.values()
+    }
@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fake_client import FakeClient, constant
+from core.streaming import StreamingSLMWrapper, VerdictScanner
+
+
+@pytest.mark.parametrize("chunks, verdict", [
+    (['{"compliant": "false", "violation_reason": "x"}'], "violation"),
+    (['{"compl', 'iant"', ':  "tr', 'ue", "violation_reason": null}'], "compliant"),
+    (['{"compliant": tr', "ue}"], "compliant"),
+    (['{"violation_reason": "compliant", ', '"compliant": false}'], "violation"),
+])
+def test_scanner_reads_the_verdict_across_chunks(chunks, verdict):
+    scanner = VerdictScanner()
+    seen = [scanner.feed(chunk) for chunk in chunks]
+    assert seen[-1] == verdict
+    assert seen[:-1] == [None] * (len(chunks) - 1)
+
+
+def test_scanner_waits_for_the_whole_value():
+    scanner = VerdictScanner()
+    assert scanner.feed('{"compliant": "tr') is None
+    assert scanner.text == '{"compliant": "tr'
+
+
+def expected(client, policy, text):
+    return policy.name, "violation" if client.is_violation(policy.name, text) else "compliant"
+
+
+@pytest.mark.parametrize("verdict_only", (False, True))
+def test_streamed_verdicts_match_the_full_answer(policies, verdict_only):
+    client = FakeClient(latency=constant(0.001), violation_rate=0.5)
+    wrapper = StreamingSLMWrapper("a", client, "fake-slm", verdict_only=verdict_only)
+
+    async def main():
+        return [await wrapper(policy, f"text {i}") for i in range(5) for policy in policies.values()]
+
+    assert asyncio.run(main()) == [
+        expected(client, policy, f"text {i}") for i in range(5) for policy in policies.values()
+    ]
+
+
+def test_rest_of_the_stream_goes_to_on_explanation(policies):
+    client = FakeClient(latency=constant(0.01), violation_rate=1.0)
+    explanations = {}
+    wrapper = StreamingSLMWrapper("a", client, "fake-slm", on_explanation=explanations.__setitem__)
+
+    async def main():
+        verdict = await wrapper(policies["PolicyA"], "some text")
+        assert "p0" not in explanations
+        await asyncio.gather(*wrapper._background)
+        return verdict
+
+    assert asyncio.run(main()) == ("p0", "violation")
+    assert explanations["p0"]["violation_reason"] == "p0 flagged the text"
+
+
+def test_verdict_only_streams_are_not_explained(policies):
+    client = FakeClient(latency=constant(0.001), violation_rate=1.0)
+    explanations = {}
+    wrapper = StreamingSLMWrapper("a", client, "fake-slm", verdict_only=True, on_explanation=explanations.__setitem__)
+    assert asyncio.run(wrapper(policies["PolicyA"], "some text")) == ("p0", "violation")
+    assert not wrapper._background and not explanations